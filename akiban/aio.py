@@ -0,0 +1,318 @@
+"""asyncio support for Akiban nested results.
+
+Built on psycopg2's asynchronous connection mode, driving the
+connection's socket from the event loop.  Requires Python 3.5 or
+greater::
+
+    from akiban import aio
+
+    async def go():
+        connection = await aio.connect(host="localhost", port=15432)
+        cursor = connection.cursor()
+        await cursor.execute("select customer_id, "
+                    "(select order_id from orders where "
+                    "orders.customer_id=customers.customer_id) as orders "
+                    "from customers")
+        async for customer_id, orders in cursor:
+            async for order_id, in orders:
+                print(customer_id, order_id)
+
+A connection runs one statement at a time; statements executed
+concurrently on the same connection are queued.  Use a connection
+per concurrent task to run queries in parallel.
+
+If ``execute()`` is cancelled, e.g. by ``asyncio.wait_for()`` timing
+out, the statement is cancelled on the server, and the next
+statement on the connection waits for it to finish first.
+
+Rows, including those of nested cursors, are decoded by the same
+:mod:`akiban.impl` machinery as :mod:`akiban.psycopg2`.
+
+"""
+from __future__ import absolute_import
+
+import asyncio
+
+import psycopg2
+import psycopg2.extensions
+
+from .api import NestedCursor
+from .impl import _filter_row, _LRUCache, _output_format_sql, \
+            get_json_loads
+from .psycopg2 import Psycopg2ResultContext, fast_converters
+
+
+async def connect(dsn=None, loop=None, **kw):
+    """Connect to Akiban, returning an :class:`.AsyncConnection`.
+
+    Arguments are those of ``psycopg2.connect()``.
+
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    conn = psycopg2.connect(dsn, async_=True, **kw)
+    await _poll(conn, loop)
+    return AsyncConnection(conn, loop)
+
+
+def _poll(conn, loop):
+    """Return a future which completes when the connection's
+    current operation is done."""
+
+    future = loop.create_future()
+    fd = conn.fileno()
+
+    def callback():
+        if future.done():
+            return
+        loop.remove_reader(fd)
+        loop.remove_writer(fd)
+        try:
+            state = conn.poll()
+        except Exception as err:
+            future.set_exception(err)
+            return
+        if state == psycopg2.extensions.POLL_OK:
+            future.set_result(None)
+        elif state == psycopg2.extensions.POLL_READ:
+            loop.add_reader(fd, callback)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            loop.add_writer(fd, callback)
+        else:
+            future.set_exception(
+                psycopg2.OperationalError("bad poll state: %r" % state))
+
+    def done(future):
+        # if cancelled, stop listening, before a later poll of the
+        # same connection starts to
+        if future.cancelled():
+            loop.remove_reader(fd)
+            loop.remove_writer(fd)
+
+    future.add_done_callback(done)
+    callback()
+    return future
+
+
+class AsyncNestedCursor(NestedCursor):
+    """A :class:`.NestedCursor` which also supports ``async for``.
+
+    The rows of a nested cursor are already local, so its ``fetch``
+    methods remain plain methods.
+
+    """
+
+    __slots__ = ()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopAsyncIteration()
+        return row
+
+
+class AsyncResultContext(Psycopg2ResultContext):
+    nested_cursor_cls = AsyncNestedCursor
+
+    def __init__(self, cursor, firstrow, **kw):
+        # psycopg2's typecasters are given the psycopg2 cursor;
+        # nested cursors take the arraysize of the AsyncCursor
+        self.async_cursor = cursor
+        super(AsyncResultContext, self).__init__(
+                    cursor._cursor, firstrow, **kw)
+
+    @property
+    def arraysize(self):
+        return self.async_cursor.arraysize
+
+
+class AsyncConnection(object):
+    """An Akiban connection for use with asyncio.
+
+    psycopg2 asynchronous connections are always in autocommit mode;
+    run ``BEGIN`` / ``COMMIT`` explicitly for transactions.
+
+    """
+
+    pipeline_output_format = False
+    """See :attr:`akiban.psycopg2.Connection.pipeline_output_format`."""
+
+    def __init__(self, conn, loop):
+        self._conn = conn
+        self._loop = loop
+        self._lock = asyncio.Lock()
+        self._nested = False
+        # the recovery of a cancelled statement, if any
+        self._draining = None
+        self._akiban_fields_cache = _LRUCache(100)
+        self.output_format_switches = 0
+        self.json_backend = None
+        self.converters = dict(fast_converters)
+
+    @property
+    def json_backend(self):
+        """See :attr:`akiban.psycopg2.Connection.json_backend`."""
+        return self._json_backend
+
+    @json_backend.setter
+    def json_backend(self, name):
+        self._json_loads = get_json_loads(name)
+        self._json_backend = name
+
+    @property
+    def closed(self):
+        return self._conn.closed
+
+    def cursor(self, nested=True, lazy=False):
+        """Return a new :class:`.AsyncCursor`.
+
+        :param nested: if True, the cursor returns Akiban nested
+         results.
+        :param lazy: if True, nested cursors typecast their rows
+         only when first fetched.
+
+        """
+        return AsyncCursor(self, nested, lazy)
+
+    async def _execute(self, cursor, query, vars):
+        async with self._lock:
+            if self._draining is not None:
+                draining, self._draining = self._draining, None
+                await draining
+
+            nested = cursor._nested
+            if nested is not self._nested:
+                stmt = _output_format_sql(nested)
+                self.output_format_switches += 1
+                self._nested = None
+                if self.pipeline_output_format:
+                    query = stmt + ";\n" + query
+                else:
+                    cursor._cursor.execute(stmt)
+                    await self._wait()
+                    self._nested = nested
+
+            cursor._cursor.execute(query, vars)
+            await self._wait()
+            self._nested = nested
+
+    async def _wait(self):
+        try:
+            await _poll(self._conn, self._loop)
+        except asyncio.CancelledError:
+            # psycopg2 still has the statement in flight; cancel it,
+            # and have the next statement wait for the connection to
+            # be idle.  Its output format is unknown.
+            self._nested = None
+            self._draining = self._loop.create_task(self._drain())
+            raise
+
+    async def _drain(self):
+        try:
+            self._conn.cancel()
+        except psycopg2.Error:
+            pass
+        try:
+            await _poll(self._conn, self._loop)
+        except psycopg2.Error:
+            # e.g. QueryCanceledError; the connection is idle again
+            pass
+
+    def close(self):
+        self._conn.close()
+
+
+class AsyncCursor(object):
+    """A cursor for :class:`.AsyncConnection`.
+
+    ``execute()`` and the ``fetch`` methods are coroutines, and the
+    cursor supports ``async for``.  Results are buffered client side
+    once ``execute()`` completes.
+
+    """
+
+    def __init__(self, connection, nested, lazy):
+        self.connection = connection
+        self._cursor = connection._conn.cursor()
+        self._nested = nested
+        self._lazy = lazy
+        self._akiban_ctx = None
+        self.arraysize = 1
+
+    @property
+    def description(self):
+        if not self._nested:
+            return self._cursor.description
+        elif self._akiban_ctx:
+            return self._akiban_ctx.description
+        else:
+            return None
+
+    @property
+    def akiban_description(self):
+        if self._akiban_ctx:
+            return self._akiban_ctx.akiban_description
+        else:
+            return None
+
+    @property
+    def rowcount(self):
+        rowcount = self._cursor.rowcount
+        if self._akiban_ctx and rowcount > 0:
+            # don't count the metadata row
+            rowcount -= 1
+        return rowcount
+
+    async def execute(self, query, vars=None):
+        await self.connection._execute(self, query, vars)
+        self._setup_description()
+
+    def _setup_description(self):
+        if self._nested and self._cursor.description:
+            self._akiban_ctx = AsyncResultContext(
+                                self, self._cursor.fetchone(),
+                                lazy=self._lazy,
+                                fields_cache=
+                                    self.connection._akiban_fields_cache,
+                                loads=self.connection._json_loads,
+                                converters=self.connection.converters,
+                                exact_decimals=
+                                    self.connection.json_backend is None
+                            )
+        else:
+            self._akiban_ctx = None
+
+    async def fetchone(self):
+        row = self._cursor.fetchone()
+        if self._akiban_ctx:
+            row = _filter_row(row, self._akiban_ctx)
+        return row
+
+    async def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        rows = self._cursor.fetchmany(size)
+        if self._akiban_ctx:
+            rows = [_filter_row(row, self._akiban_ctx) for row in rows]
+        return rows
+
+    async def fetchall(self):
+        rows = self._cursor.fetchall()
+        if self._akiban_ctx:
+            rows = [_filter_row(row, self._akiban_ctx) for row in rows]
+        return rows
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        row = await self.fetchone()
+        if row is None:
+            raise StopAsyncIteration()
+        return row
+
+    def close(self):
+        self._cursor.close()
@@ -1,4 +1,4 @@
-import collections
+import itertools
 
 class NestedCursorType(object):
     def __eq__(self, other):
@@ -13,36 +13,161 @@ class NestedCursorType(object):
 NESTED_CURSOR = NestedCursorType()
 
 
+class _NestedLevel(object):
+    """What the nested cursors of one nested column have in common;
+    created once per result and shared by all of them."""
+
+    __slots__ = 'ctx', 'fields', 'description_factory', 'empty'
+
+    def __init__(self, ctx, fields, description_factory):
+        self.ctx = ctx
+        self.fields = fields
+        self.description_factory = description_factory
+        self.empty = None
+
+
 class NestedCursor(object):
 
+    __slots__ = ('_level', '_rows', '_pos', '_loader', '_stream',
+                    'arraysize', 'rownumber')
+
     def __init__(self, ctx, arraysize, fields, description_factory):
-        self.ctx = ctx
-        self._fields = fields
-        self._description_factory = description_factory
-        self._rows = collections.deque()
+        self._setup(_NestedLevel(ctx, fields, description_factory),
+                        arraysize)
+
+    @classmethod
+    def _for_level(cls, level, arraysize):
+        """Create a cursor for a :class:`._NestedLevel`, without
+        going through ``__init__()``."""
+
+        cursor = cls.__new__(cls)
+        cursor._setup(level, arraysize)
+        return cursor
+
+    @classmethod
+    def _empty(cls, level, arraysize):
+        """Return the empty cursor of a :class:`._NestedLevel`,
+        shared by all of its empty groups.
+
+        It has nothing to fetch, so fetching from it changes
+        nothing.
+
+        """
+        if level.empty is None:
+            level.empty = cls._for_level(level, arraysize)
+        return level.empty
+
+    def _setup(self, level, arraysize):
+        self._level = level
+        # rows are read from _pos onwards, rather than popped
+        self._rows = []
+        self._pos = 0
+        self._loader = None
+        self._stream = None
         self.arraysize = arraysize
+        self.rownumber = 0
+
+    @property
+    def ctx(self):
+        return self._level.ctx
+
+    @property
+    def _fields(self):
+        return self._level.fields
 
     @property
     def description(self):
-        return self._description_factory(self._fields)
+        level = self._level
+        return level.description_factory(level.fields)
+
+    @property
+    def akiban_description(self):
+        """The description, with the description of each nested
+        column's rows as an eighth element; see
+        :attr:`akiban.psycopg2.Cursor.akiban_description`."""
+
+        level = self._level
+        return level.ctx.gen_akiban_description(level.fields)
+
+    @property
+    def rowcount(self):
+        """The number of rows; -1 while the rows are still being
+        streamed, as they aren't known until all have been parsed."""
+
+        if self._loader is not None:
+            self._load()
+        if self._stream is not None:
+            return -1
+        return self.rownumber + len(self._rows) - self._pos
+
+    def _load(self):
+        # lazy mode; the rows are produced on first fetch
+        loader, self._loader = self._loader, None
+        self._rows.extend(loader())
+
+    def _fill(self, size):
+        # streaming mode; parse up to "size" more rows, discarding
+        # those already fetched
+        del self._rows[:self._pos]
+        self._pos = 0
+        rows = list(itertools.islice(self._stream, size))
+        if len(rows) < size:
+            self._stream = None
+        self._rows.extend(rows)
+
+    def _take(self, size):
+        pos = self._pos
+        rows = self._rows[pos:pos + size]
+        self.rownumber += len(rows)
+        if pos + size >= len(self._rows):
+            if self._rows:
+                del self._rows[:]
+            self._pos = 0
+        else:
+            self._pos = pos + size
+        return rows
 
     def fetchone(self):
-        if self._rows:
-            return self._rows.popleft()
+        if self._loader is not None:
+            self._load()
+        if self._stream is not None and self._pos == len(self._rows):
+            self._fill(self.arraysize)
+        if self._pos < len(self._rows):
+            row = self._rows[self._pos]
+            self.rownumber += 1
+            self._pos += 1
+            return row
         else:
             return None
 
     def fetchall(self):
-        r = list(self._rows)
-        self._rows.clear()
-        return r
+        if self._loader is not None:
+            self._load()
+        if self._stream is not None:
+            self._rows.extend(self._stream)
+            self._stream = None
+        return self._take(len(self._rows))
 
     def fetchmany(self, size=None):
         if size is None:
             size = self.arraysize
-        l = list(self._rows)
-        r, self._rows = l[0:size], collections.deque(l[size:])
-        return r
+        if self._loader is not None:
+            self._load()
+        if self._stream is not None and \
+                len(self._rows) - self._pos < size:
+            self._fill(size - len(self._rows) + self._pos)
+        return self._take(size)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration()
+        return row
+
+    next = __next__
 
     def close(self):
         pass
\ No newline at end of file
@@ -1,67 +1,1216 @@
+import io
+import re
 import json
-from .api import NestedCursor
+import time
+import pickle
+import array
+import decimal
+import functools
+import threading
+import collections
+from .api import NestedCursor, _NestedLevel
+
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 json_decoder = json.JSONDecoder()
 
+# parses non-integer numbers as written, for DECIMAL columns
+decimal_json_decoder = json.JSONDecoder(parse_float=decimal.Decimal)
+
+# for measuring durations
+_timer = getattr(time, 'perf_counter', time.time)
+
+_json_backends = {}
+
+# backends which parse UTF-8 encoded bytes directly
+_json_bytes_backends = set()
+
+# fastest first; see get_json_loads()
+_json_backend_preference = ['orjson', 'ujson', 'simdjson', 'json']
+
+def register_json_backend(name, loads, accepts_bytes=False):
+    """Register a function which parses a JSON string into
+    Python lists and dictionaries, for use as a JSON backend.
+
+    If ``accepts_bytes`` is True, the function also parses UTF-8
+    encoded bytes.
+
+    """
+    _json_backends[name] = loads
+    if accepts_bytes:
+        _json_bytes_backends.add(name)
+    else:
+        _json_bytes_backends.discard(name)
+
+def _decode_utf8(loads, value):
+    return loads(value.decode('utf-8'))
+
+# a run of 19 digits may be an integer outside the 64 bit range
+_long_digits = re.compile(r'\d{19}')
+_long_digits_bytes = re.compile(br'\d{19}')
+
+def _json_loads(value, decoder=json_decoder):
+    if isinstance(value, bytes) and bytes is not str:
+        value = value.decode('utf-8')
+    return decoder.decode(value)
+
+def _or_stdlib(loads, value):
+    # simdjson, and ujson before 5.2, reject integers outside the 64
+    # bit range, and simdjson numbers beyond the range of a double;
+    # such documents go to the stdlib parser instead
+    try:
+        return loads(value)
+    except (ValueError, RuntimeError):
+        return _json_loads(value)
+
+def _exact_ints(loads, value):
+    # orjson turns integers outside the 64 bit range into floats
+    # without complaint, so documents which may hold one are found
+    # beforehand
+    if isinstance(value, bytes):
+        long_digits = _long_digits_bytes.search(value)
+    else:
+        long_digits = _long_digits.search(value)
+    if long_digits is not None:
+        return _json_loads(value)
+    return _or_stdlib(loads, value)
+
+def get_json_loads(name=None, raw=False):
+    """Return the JSON parsing function for the given backend name.
+
+    If ``raw`` is True, the function returned parses UTF-8 encoded
+    bytes; backends which can't do so directly are given the
+    decoded string.
+
+    If ``name`` is None, the fastest of the installed backends is
+    returned; orjson, ujson and simdjson are used if present, with
+    the standard library ``json`` module as the fallback.   Documents
+    which the others can't parse exactly, such as those with integers
+    outside the 64 bit range, are given to the standard library
+    parser instead.
+
+    The ``'decimal'`` backend is the standard library parser with
+    every non-integer number parsed as a ``decimal.Decimal``, so that
+    DECIMAL values keep their full precision; note that it applies
+    to FLOAT and DOUBLE columns as well.   It's never chosen by
+    default.
+
+    """
+    if name is None:
+        for name in _json_backend_preference:
+            if name in _json_backends:
+                break
+    try:
+        loads = _json_backends[name]
+    except KeyError:
+        raise ValueError("JSON backend %r is not available; "
+                    "available backends are: %s" %
+                    (name, ", ".join(sorted(_json_backends))))
+    if raw and name not in _json_bytes_backends:
+        loads = functools.partial(_decode_utf8, loads)
+    return loads
+
+def _register_json_backends():
+    # on Python 2, the stdlib parser takes UTF-8 encoded str as is
+    py2k = bytes is str
+    register_json_backend('json', json_decoder.decode, py2k)
+    register_json_backend('decimal', decimal_json_decoder.decode, py2k)
+
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        register_json_backend('orjson',
+                functools.partial(_exact_ints, orjson.loads), True)
+
+    try:
+        import ujson
+    except ImportError:
+        pass
+    else:
+        # older ujson versions round floats unless asked not to
+        try:
+            ujson.loads("1.5", precise_float=True)
+        except TypeError:
+            register_json_backend('ujson',
+                    functools.partial(_or_stdlib, ujson.loads), True)
+        else:
+            register_json_backend('ujson',
+                    functools.partial(_or_stdlib, functools.partial(
+                            ujson.loads, precise_float=True)),
+                    True)
+
+    try:
+        import simdjson
+    except ImportError:
+        pass
+    else:
+        register_json_backend('simdjson',
+                functools.partial(_or_stdlib, simdjson.loads), True)
+
+_register_json_backends()
+
 _NESTED_OID = 5001
+_DECIMAL_OID = 1700
+
+def _output_format_sql(nested):
+    return "set OutputFormat='%s'" % (
+                'json_with_meta_data' if nested else 'table')
 
 class AkibanResultContext(object):
 
+    nested_cursor_cls = NestedCursor
+
     def gen_description(self, fields):  # pragma: no cover
         raise NotImplementedError()
 
+    def gen_akiban_description(self, fields):  # pragma: no cover
+        raise NotImplementedError()
+
     def typecast(self, value, oid):  # pragma: no cover
         raise NotImplementedError()
 
-    def __init__(self, cursor, firstrow):
+    def __init__(self, cursor, firstrow, lazy=False, fields_cache=None,
+                        loads=None, stream=False, stats=None,
+                        row_factory=None, intern_strings=False,
+                        intern_limit=10000, exact_decimals=False):
         self.cursor = cursor
-        self.fields = _fields_from_row(firstrow)
+        self.lazy = lazy
+        self.stream = stream
+        self.stats = stats
+        self.row_factory = row_factory
+        self.intern_strings = intern_strings
+        self.intern_limit = intern_limit
+        self.loads = loads or json_decoder.decode
+        self.fields = _fields_from_row(firstrow, fields_cache, self.loads)
+        self.json_decoder = json_decoder
+        if exact_decimals and _has_oid(self.fields, _DECIMAL_OID):
+            # parse non-integer numbers as Decimal, so that DECIMAL
+            # values keep their digits and scale; it's up to the
+            # converters of other types to make floats of them
+            self.json_decoder = decimal_json_decoder
+            self.loads = functools.partial(_json_loads,
+                                decoder=decimal_json_decoder)
+        if stats is not None:
+            self.loads = _timed_loads(self.loads, stats)
+        self._decoder = None
 
     @property
     def arraysize(self):
         return self.cursor.arraysize
 
-def _fields_from_row(row):
-    document = json_decoder.decode(row[0])
-    return _format_fields(document)
+    def converter(self, oid):
+        """Return a callable which converts a single value of the
+        given type oid, or None if values pass through unchanged.
+
+        """
+        typecast = self.typecast
+        def convert(value):
+            return typecast(value, oid)
+        return convert
+
+    def interns(self, field):
+        """Return True if equal values of the given field are to share
+        one object within this result.
+
+        ``intern_strings`` is False for none, True for every text
+        column at every level, or a collection of column names; only
+        the string values of a column are interned.
+
+        """
+        intern_strings = self.intern_strings
+        if not intern_strings:
+            return False
+        elif intern_strings is True:
+            return field['type_oid'] in _text_oids
+        else:
+            return field['name'] in intern_strings
+
+    @property
+    def decoder(self):
+        """The row decoder for the top level of this result,
+        compiled from ``self.fields`` on first access.
+
+        If ``self.stream`` is set, it decodes the JSON text of a row,
+        rather than the parsed document; see
+        :func:`._compile_stream_decoder`.
+
+        """
+        if self._decoder is None:
+            if self.stream:
+                decoder = _compile_stream_decoder(self.fields, self)
+            else:
+                decoder = _compile_decoder(self.fields, self)
+            if self.stats is not None:
+                decoder = _timed_decoder(decoder, self.stats, self.stream)
+            self._decoder = decoder
+        return self._decoder
+
+
+class ExecuteStats(object):
+    """Timings and counts for one result of a nested cursor.
+
+    Passed to the listeners of an :class:`akiban.psycopg2.Connection`
+    once the result has been fetched.   Times are in seconds:
+
+    * ``statement_time`` - running the statement, including receiving
+      its rows, unless the cursor is named
+    * ``fetch_time`` - fetching rows from psycopg2; for a named cursor,
+      this includes the round trips to the server
+    * ``parse_time`` - parsing the JSON of each top level row
+    * ``decode_time`` - converting the parsed JSON to rows, including
+      typecasting; when streaming, this includes the parsing as well
+
+    ``rows`` and ``json_bytes`` count the top level rows decoded and
+    the length of their JSON; ``nested_rows`` counts the rows of the
+    nested cursors created, other than those streamed.  ``typecasts``
+    counts the values converted, keyed on type oid.
+    ``output_format_switches`` counts the ``set OutputFormat``
+    statements the cursor needed, and ``cached`` is True if the rows
+    came from the connection's result cache.
+
+    Nested cursors decoded lazily, as they're fetched from, add to
+    ``nested_rows`` and ``typecasts`` but not to ``decode_time``.
+
+    """
+
+    __slots__ = ('statement', 'statement_time', 'fetch_time',
+                    'parse_time', 'decode_time', 'rows', 'nested_rows',
+                    'json_bytes', 'typecasts', 'output_format_switches',
+                    'cached')
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.statement_time = self.fetch_time = 0.0
+        self.parse_time = self.decode_time = 0.0
+        self.rows = self.nested_rows = self.json_bytes = 0
+        self.typecasts = {}
+        self.output_format_switches = 0
+        self.cached = False
+
+def _timed_loads(loads, stats):
+    def timed(text):
+        start = _timer()
+        document = loads(text)
+        stats.parse_time += _timer() - start
+        stats.rows += 1
+        stats.json_bytes += len(text)
+        return document
+    return timed
+
+def _timed_decoder(decode, stats, stream):
+    def timed(value):
+        start = _timer()
+        row = decode(value)
+        stats.decode_time += _timer() - start
+        if stream:
+            stats.rows += 1
+            stats.json_bytes += len(value)
+        return row
+    return timed
+
+def _converter(ctx, field):
+    """Return ``ctx.converter()`` for the type of a field, counting
+    its calls if the context is collecting statistics, and interning
+    its values if the context interns those of the field."""
+
+    oid = field['type_oid']
+    convert = ctx.converter(oid)
+    if convert is not None and ctx.stats is not None:
+        typecasts = ctx.stats.typecasts
+        typecasts.setdefault(oid, 0)
+        counted = convert
+
+        def convert(value):
+            typecasts[oid] += 1
+            return counted(value)
+    if ctx.interns(field):
+        convert = _interning(convert, ctx.intern_limit)
+    return convert
+
+# VARCHAR, CHAR, TEXT
+_text_oids = frozenset([1043, 1042, 25])
+
+_string_types = (str, type(u''))
+
+def _interning(convert, limit):
+    """Wrap a converter so that equal strings share one object.
+
+    Only strings are interned; equal values of other types, such as
+    ``Decimal('1.10')`` and ``Decimal('1.1')``, or ``1.0`` and ``1``,
+    aren't interchangeable, so pass through as they are.
+
+    The table is kept for as long as the converter; once it holds
+    more than ``limit`` values, it's emptied and values pass through
+    as they are from then on, as a column with that many distinct
+    values gains little from it.
+
+    """
+    table = {}
+    setdefault = table.setdefault
+    # emptied once over the limit
+    on = [True]
+
+    def intern(value):
+        if convert is not None:
+            value = convert(value)
+        if on and value.__class__ in _string_types:
+            value = setdefault(value, value)
+            if len(table) > limit:
+                table.clear()
+                del on[:]
+        return value
+    return intern
+
+class _LRUCache(object):
+    """A dictionary-like cache which discards its least recently
+    used entries once it holds more than ``capacity`` items."""
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self._data = collections.OrderedDict()
+
+    def __getitem__(self, key):
+        value = self._data.pop(key)
+        self._data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+row_factories = ('tuple', 'namedtuple', 'dict', 'record')
+"""The kinds of row accepted as the ``row_factory`` of a cursor;
+see :func:`.row_class`."""
+
+class Record(object):
+    """Base of the slotted row classes of the ``'record'`` row
+    factory.
+
+    Values are attributes, as with a namedtuple, and may also be
+    read by position; ``_fields`` names them in order.
+
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _names = ()
+
+    def __iter__(self):
+        for field in self._fields:
+            yield getattr(self, field)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        return getattr(self, self._fields[index])
+
+    def __eq__(self, other):
+        return isinstance(other, Record) and \
+            self._fields == other._fields and tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Row(%s)" % ", ".join(
+                "%s=%r" % (field, getattr(self, field))
+                for field in self._fields)
+
+    def _asdict(self):
+        return collections.OrderedDict(zip(self._fields, self))
+
+    def __reduce__(self):
+        return _restore_row, ('record', self._names, tuple(self))
+
+def _namedtuple_reduce(self):
+    return _restore_row, ('namedtuple', self._names, tuple(self))
+
+def _restore_row(row_factory, names, values):
+    return _row_maker(row_factory, names)(values)
+
+def _gen_row_class(row_factory, names):
+    # invalid or duplicate names are replaced by positional ones,
+    # as namedtuple(rename=True) does
+    base = collections.namedtuple('Row', names, rename=True)
+    if row_factory == 'namedtuple':
+        return type('Row', (base, ), {
+            '__slots__': (), '_names': names,
+            '__reduce__': _namedtuple_reduce})
+
+    fields = base._fields
+    code = "def _make(cls, values, new=object.__new__):\n" \
+            "    self = new(cls)\n"
+    if fields:
+        code += "    %s, = values\n" % ", ".join(
+                                "self.%s" % field for field in fields)
+    code += "    return self\n"
+    namespace = {}
+    exec(code, namespace)
+    return type('Row', (Record, ), {
+        '__slots__': fields, '_fields': fields, '_names': names,
+        '_make': classmethod(namespace['_make'])})
+
+# process wide, keyed on the row factory and tuple of column names
+_row_classes = _LRUCache(200)
+_row_classes_lock = threading.Lock()
+
+def row_class(row_factory, names):
+    """Return the class of rows with the given column names, for
+    one of the :data:`.row_factories`.
+
+    ``'tuple'`` and ``'dict'`` rows are plain tuples and
+    dictionaries.   ``'namedtuple'`` rows are namedtuples, and
+    ``'record'`` rows are :class:`.Record` objects, whose values are
+    held in slots; both are generated once per distinct list of
+    names, and cached for the process, up to a few hundred of them.
+    Names which aren't valid identifiers become ``_0``, ``_1`` etc.
+    as attributes.
+
+    """
+    if row_factory in (None, 'tuple'):
+        return tuple
+    elif row_factory == 'dict':
+        return dict
+    elif row_factory not in row_factories:
+        raise ValueError("row_factory must be one of %s" %
+                            ", ".join(row_factories))
+    key = (row_factory, tuple(names))
+    with _row_classes_lock:
+        try:
+            return _row_classes[key]
+        except KeyError:
+            cls = _row_classes[key] = _gen_row_class(*key)
+            return cls
+
+def _row_maker(row_factory, names):
+    """Return a callable which creates a row from a list of values,
+    in the order of ``names``."""
+
+    cls = row_class(row_factory, names)
+    if cls is tuple:
+        return tuple
+    elif cls is dict:
+        names = tuple(names)
+        return lambda values: dict(zip(names, values))
+    elif row_factory == 'namedtuple':
+        return functools.partial(tuple.__new__, cls)
+    else:
+        return cls._make
+
+# string literals, which are skipped, and identifiers, quoted or not
+_identifier = re.compile(r"""'(?:[^']|'')*'|"((?:[^"]|"")+)"|([A-Za-z_]\w*)""")
+
+_cacheable = re.compile(r'\s*(?:select|with)\b', re.I)
+
+def _table_key(name):
+    return name.split('.')[-1].strip('"').lower()
+
+def _table_names(query):
+    """Return the set of names in a statement which might be those of
+    tables, in lower case.
+
+    Rather than parse FROM lists, joins and subqueries, every
+    identifier is included, each part of a qualified name
+    separately; a table is never missed, at the cost of keywords
+    and column names coming along.
+
+    """
+    return frozenset(
+        (quoted.replace('""', '"') or word).lower()
+        for quoted, word in _identifier.findall(query)
+        if quoted or word
+    )
+
+
+class ResultCache(object):
+    """A client side cache of the raw rows of query results.
+
+    Entries are keyed on the statement with its parameters
+    interpolated, and hold the statement's metadata and JSON
+    documents as received, so that a hit is decoded just as a fresh
+    result would be.   Once more than ``capacity`` entries are held
+    the least recently used is discarded; if ``ttl`` is given,
+    entries expire that many seconds after being stored.
+
+    Entries are recorded against every name in their statement
+    which might be a table, for :meth:`.invalidate`; a column or
+    alias of the same name as a table invalidates needlessly, but
+    no table is missed.   ``hits`` and ``misses`` count lookups; an
+    expired entry counts as a miss.
+
+    """
+
+    _clock = staticmethod(getattr(time, 'monotonic', time.time))
+
+    def __init__(self, capacity=100, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the rows stored for ``key``, or None."""
+        with self._lock:
+            try:
+                rows, tables, expires = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires is not None and self._clock() >= expires:
+                self.misses += 1
+                return None
+            self._entries[key] = rows, tables, expires
+            self.hits += 1
+            return rows
+
+    def put(self, key, rows, query):
+        """Store a tuple of raw rows for ``key``, recorded against
+        the tables named in ``query``."""
+        if self.ttl is not None:
+            expires = self._clock() + self.ttl
+        else:
+            expires = None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = rows, _table_names(query), expires
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tables):
+        """Discard the entries of statements naming any of the given
+        tables; names may be schema qualified, and are matched
+        without regard to case."""
+        tables = set(_table_key(name) for name in tables)
+        with self._lock:
+            for key, (rows, names, expires) in list(self._entries.items()):
+                if not tables.isdisjoint(names):
+                    del self._entries[key]
+
+    def clear(self):
+        """Discard all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+def _has_oid(fields, oid):
+    for field in fields:
+        if field['type_oid'] == oid or (
+                'akiban.fields' in field and
+                _has_oid(field['akiban.fields'], oid)):
+            return True
+    return False
+
+def _fields_from_row(row, cache=None, loads=json_decoder.decode):
+    """Return the fields for a metadata row.
+
+    If a cache is given, it's keyed on the metadata JSON itself, so
+    that repeated executions of the same statement share a single
+    fields structure.
+
+    """
+    if cache is not None:
+        try:
+            return cache[row[0]]
+        except KeyError:
+            pass
+    document = loads(row[0])
+    fields = _format_fields(document)
+    if cache is not None:
+        cache[row[0]] = fields
+    return fields
 
 def _filter_row(row, ctx):
     if row is None:
         return None
-    document = json_decoder.decode(row[0])
-    return _format_row(document, ctx.fields, ctx)
+    if ctx.stream:
+        return (ctx._decoder or ctx.decoder)(row[0])
+    document = ctx.loads(row[0])
+    return (ctx._decoder or ctx.decoder)(document)
+
+def _iter_rows(fetchmany, size, ctx):
+    """Yield decoded rows from a DBAPI ``fetchmany()`` callable,
+    pulling ``size`` raw rows at a time.
+
+    Only one batch of raw rows is held at once, and each row is
+    decoded only as it is yielded.
+
+    """
+    while True:
+        rows = fetchmany(size)
+        if not rows:
+            break
+        for row in rows:
+            yield _filter_row(row, ctx)
+
+class _PrefetchError(object):
+    def __init__(self, error):
+        self.error = error
+
+class _Prefetcher(object):
+    """Fetches and decodes batches of rows from a DBAPI ``fetchmany()``
+    callable in a background thread, while the caller works on the
+    rows already delivered.
+
+    At most ``depth`` decoded batches of ``size`` rows wait in the
+    queue, plus the one the thread is working on.  An error in the
+    thread is raised from the fetch which would have returned the
+    rows.  :meth:`.close` stops the thread, after the fetch in
+    progress, if any, completes.
+
+    """
+
+    _done = object()
+
+    def __init__(self, fetchmany, size, ctx, depth=2):
+        self._fetchmany = fetchmany
+        self._size = size
+        self._ctx = ctx
+        self._queue = queue.Queue(depth)
+        self._stopped = threading.Event()
+        self._rows = collections.deque()
+        self._exhausted = False
+        self._thread = threading.Thread(target=self._run,
+                                name="akiban-prefetch")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        fetchmany, size, ctx = self._fetchmany, self._size, self._ctx
+        put = self._queue.put
+        try:
+            while not self._stopped.is_set():
+                rows = fetchmany(size)
+                if not rows:
+                    put(self._done)
+                    return
+                put([_filter_row(row, ctx) for row in rows])
+        except BaseException as err:
+            put(_PrefetchError(err))
+
+    def _next_batch(self):
+        if self._exhausted:
+            return False
+        batch = self._queue.get()
+        if batch is self._done:
+            self._exhausted = True
+            return False
+        elif batch.__class__ is _PrefetchError:
+            self._exhausted = True
+            raise batch.error
+        self._rows.extend(batch)
+        return True
+
+    def fetchone(self):
+        if not self._rows and not self._next_batch():
+            return None
+        return self._rows.popleft()
+
+    def fetchmany(self, size):
+        while len(self._rows) < size and self._next_batch():
+            pass
+        popleft = self._rows.popleft
+        return [popleft() for i in range(min(size, len(self._rows)))]
+
+    def fetchall(self):
+        while self._next_batch():
+            pass
+        rows = list(self._rows)
+        self._rows.clear()
+        return rows
+
+    def __iter__(self):
+        while self._rows or self._next_batch():
+            yield self._rows.popleft()
+
+    def close(self):
+        self._stopped.set()
+        # unblock the thread if it's waiting on a full queue; it
+        # then sees the stop flag, so puts at most one more batch.
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+        self._rows.clear()
+        self._exhausted = True
+
+def _nested_levels(fields, levels=None):
+    """Return the nested field lists within ``fields``, depth first;
+    a level's position in the list identifies it across processes."""
+
+    if levels is None:
+        levels = []
+    for field in fields:
+        if field['type_oid'] == _NESTED_OID:
+            levels.append(field['akiban.fields'])
+            _nested_levels(field['akiban.fields'], levels)
+    return levels
+
+def _nested_cursor(level, rows):  # pragma: no cover
+    raise TypeError("nested rows can only be unpickled "
+                    "by _DetachedUnpickler")
+
+def _typecast(value, oid):  # pragma: no cover
+    raise TypeError("deferred values can only be unpickled "
+                    "by _DetachedUnpickler")
+
+class _DeferredTypecast(object):
+    """Stands in for a value which can't be typecast in another
+    process, such as by a psycopg2 typecaster, which needs a real
+    cursor.   It pickles as its value and type oid, from which
+    :class:`._DetachedUnpickler` typecasts it with its context."""
+
+    __slots__ = 'value', 'oid'
+
+    def __init__(self, value, oid):
+        self.value = value
+        self.oid = oid
+
+    def __reduce__(self):
+        return _typecast, (self.value, self.oid)
+
+class _DetachedRows(list):
+    """Stands in for a :class:`.NestedCursor` when decoding in another
+    process.
+
+    The decoding context must have a ``level_ids`` dictionary,
+    mapping the ``id()`` of each nested field list to its position
+    in :func:`._nested_levels`.   It pickles as that position and
+    its rows, from which :class:`._DetachedUnpickler` creates the
+    nested cursor directly.
+
+    """
+
+    __slots__ = 'level',
+
+    def __init__(self, ctx, arraysize, fields, description_factory):
+        list.__init__(self)
+        self.level = ctx.level_ids[id(fields)]
+
+    @classmethod
+    def _for_level(cls, level, arraysize):
+        rows = list.__new__(cls)
+        rows.level = level.ctx.level_ids[id(level.fields)]
+        return rows
+
+    # empty groups are pickled once per chunk, then as references
+    _empty = NestedCursor.__dict__['_empty']
+
+    @property
+    def _rows(self):
+        return self
+
+    def __reduce__(self):
+        return _nested_cursor, (self.level, list(self))
+
+class _DetachedUnpickler(pickle.Unpickler):
+    """Unpickles rows decoded in another process, creating their
+    nested cursors, and typecasting :class:`._DeferredTypecast`
+    values, for the given context as it goes."""
+
+    def __init__(self, file, ctx, levels=None):
+        pickle.Unpickler.__init__(self, file)
+        if levels is None:
+            levels = _detached_levels(ctx)
+        new_cursor = ctx.nested_cursor_cls._for_level
+        empty = ctx.nested_cursor_cls._empty
+        arraysize = ctx.arraysize
+
+        def nested_cursor(level, rows):
+            if not rows:
+                return empty(levels[level], arraysize)
+            cursor = new_cursor(levels[level], arraysize)
+            cursor._rows.extend(rows)
+            return cursor
+        self._nested_cursor = nested_cursor
+        self._typecast = ctx.typecast
+
+    def find_class(self, module, name):
+        if module == __name__ and name == '_nested_cursor':
+            return self._nested_cursor
+        elif module == __name__ and name == '_typecast':
+            return self._typecast
+        return pickle.Unpickler.find_class(self, module, name)
+
+def _detached_levels(ctx):
+    return [_NestedLevel(ctx, fields, ctx.gen_description)
+                for fields in _nested_levels(ctx.fields)]
+
+def _parallel_decode(rows, ctx, executor, decode_chunk, chunksize):
+    """Decode raw rows in chunks of ``chunksize`` using a
+    ``concurrent.futures`` executor, preserving their order.
 
-def _create_rowset(document, fields, ctx):
+    ``decode_chunk`` is called in the executor with a list of JSON
+    texts, and returns the pickled list of decoded rows, with
+    nested rows as :class:`._DetachedRows`; for a process pool, it
+    must itself be picklable.   Unpickling the rows here creates
+    their nested cursors.
+
+    """
+    texts = [row[0] for row in rows]
+    chunks = [texts[i:i + chunksize]
+                for i in range(0, len(texts), chunksize)]
+    levels = _detached_levels(ctx)
+    result = []
+    for data in executor.map(decode_chunk, chunks):
+        result.extend(
+            _DetachedUnpickler(io.BytesIO(data), ctx, levels).load())
+    return result
+
+def _create_rowset(document, decode):
     return [
-        _format_row(row, fields, ctx)
+        decode(row)
         for row in document
     ]
 
-def _format_row(document, fields, ctx):
-    row = []
+def _compile_decoder(fields, ctx):
+    """Compile a list of fields as produced by :func:`._format_fields`
+    into a function which converts one JSON document into a row, of
+    the class given by ``ctx.row_factory``; see :func:`.row_class`.
+
+    Each field is resolved to a ``(key, converter)`` pair up front,
+    so that per-row work consists only of dictionary lookups and
+    converter calls.   Nested fields get their own decoder, compiled
+    here as well.
+
+    If ``ctx.lazy`` is set, nested cursors hold onto their list of
+    JSON documents and decode them only when first fetched from.
+
+    """
+    columns = []
+    for field in fields:
+        if field['type_oid'] == _NESTED_OID:
+            convert = _nested_converter(field['akiban.fields'], ctx)
+        else:
+            convert = _converter(ctx, field)
+        columns.append((field['name'], convert))
+    columns = tuple(columns)
+
+    if ctx.row_factory == 'dict':
+        def decode(document):
+            return {
+                key: document[key] if convert is None
+                        else convert(document[key])
+                for key, convert in columns
+            }
+        return decode
+
+    make = _row_maker(ctx.row_factory, [key for key, convert in columns])
+
+    def decode(document):
+        return make([
+            document[key] if convert is None else convert(document[key])
+            for key, convert in columns
+        ])
+    return decode
+
+_skip_whitespace = re.compile(r'[ \t\n\r]*').match
+
+# the incremental parser works on text; rows may arrive as bytes
+_py2k = bytes is str
+
+class _StreamStart(object):
+    """Marks where a streamed nested array starts in the JSON text."""
+
+    __slots__ = 'text', 'pos'
+
+    def __init__(self, text, pos):
+        self.text = text
+        self.pos = pos
+
+def _expect(text, pos, char):
+    pos = _skip_whitespace(text, pos).end()
+    if text[pos:pos + 1] != char:
+        raise ValueError("Expecting %r at char %d" % (char, pos))
+    return _skip_whitespace(text, pos + 1).end()
+
+def _stream_array(text, pos, decode, raw_decode):
+    """Yield the decoded rows of the JSON array at ``text[pos]``,
+    parsing one element at a time."""
+
+    pos = _expect(text, pos, '[')
+    if text[pos:pos + 1] == ']':
+        return
+    while True:
+        document, pos = raw_decode(text, pos)
+        yield decode(document)
+        pos = _skip_whitespace(text, pos).end()
+        if text[pos:pos + 1] == ']':
+            return
+        pos = _expect(text, pos, ',')
+
+def _compile_stream_decoder(fields, ctx):
+    """Compile a list of fields into a function which converts the
+    JSON text of one top level row into a row, streaming the
+    last column if it's nested.
+
+    The row's object is parsed key by key with the standard library
+    parser, ``ctx.json_decoder``.  If the nested column is the last
+    one, its array isn't parsed here at all; the
+    :class:`.NestedCursor` delivered for it parses its elements as
+    they're fetched, so only one batch of them is held at a time.
+    A nested column which isn't last is decoded in full, as without
+    streaming.
+
+    """
+    columns = []
     for field in fields:
         if field['type_oid'] == _NESTED_OID:
-            value = NestedCursor(
-                        ctx,
-                        ctx.arraysize,
-                        field['akiban.fields'],
-                        ctx.gen_description
-            )
-            value._rows.extend(
-                _create_rowset(
-                    document[field['name']],
-                    field['akiban.fields'],
-                    ctx
-                )
-            )
+            convert = _nested_converter(field['akiban.fields'], ctx)
+        else:
+            convert = _converter(ctx, field)
+        columns.append((field['name'], convert))
+
+    last = fields[-1] if fields else None
+    if last is not None and last['type_oid'] == _NESTED_OID:
+        stream_key = last['name']
+        columns[-1] = (stream_key, _stream_converter(
+                            last['akiban.fields'], ctx, columns[-1][1]))
+    else:
+        stream_key = None
+    columns = tuple(columns)
+    stream_after = len(columns) - 1
+    make = _row_maker(ctx.row_factory, [key for key, convert in columns])
+    raw_decode = ctx.json_decoder.raw_decode
+
+    def decode(text):
+        if not _py2k and text.__class__ is bytes:
+            text = text.decode('utf-8')
+        document = {}
+        pos = _expect(text, 0, '{')
+        if text[pos:pos + 1] != '}':
+            while True:
+                key, pos = raw_decode(text, pos)
+                pos = _expect(text, pos, ':')
+                if key == stream_key and len(document) == stream_after:
+                    document[key] = _StreamStart(text, pos)
+                    break
+                document[key], pos = raw_decode(text, pos)
+                pos = _skip_whitespace(text, pos).end()
+                if text[pos:pos + 1] == '}':
+                    break
+                pos = _expect(text, pos, ',')
+        return make([
+            document[key] if convert is None else convert(document[key])
+            for key, convert in columns
+        ])
+    return decode
+
+def _stream_converter(fields, ctx, buffered):
+    decode = _compile_decoder(fields, ctx)
+    raw_decode = ctx.json_decoder.raw_decode
+    level = _NestedLevel(ctx, fields, ctx.gen_description)
+    new_cursor = ctx.nested_cursor_cls._for_level
 
+    def convert(value):
+        if value.__class__ is not _StreamStart:
+            return buffered(value)
+        cursor = new_cursor(level, ctx.arraysize)
+        cursor._stream = _stream_array(value.text, value.pos, decode,
+                                        raw_decode)
+        return cursor
+    return convert
+
+def _nested_converter(fields, ctx):
+    """Return a converter from a nested JSON array to a nested
+    cursor.
+
+    The cursors of one column share a :class:`._NestedLevel`, and
+    empty arrays all become the level's one empty cursor.
+
+    """
+    decode = _compile_decoder(fields, ctx)
+    lazy = ctx.lazy
+    level = _NestedLevel(ctx, fields, ctx.gen_description)
+    new_cursor = ctx.nested_cursor_cls._for_level
+    empty = ctx.nested_cursor_cls._empty
+
+    def convert(document):
+        if not document:
+            return empty(level, ctx.arraysize)
+        value = new_cursor(level, ctx.arraysize)
+        if lazy:
+            value._loader = functools.partial(
+                                _create_rowset, document, decode)
+        else:
+            value._rows.extend(_create_rowset(document, decode))
+        return value
+
+    if ctx.stats is not None:
+        stats = ctx.stats
+        counted = convert
+
+        def convert(document):
+            stats.nested_rows += len(document)
+            return counted(document)
+    return convert
+
+try:
+    array.array('q')
+except ValueError:
+    # Python 2
+    _INT64 = 'l'
+else:
+    _INT64 = 'q'
+
+_column_typecodes = {
+    16: 'b',        # BOOLEAN
+    20: _INT64,     # BIGINT
+    21: 'h',        # SMALLINT
+    23: 'i',        # INTEGER
+    700: 'f',       # FLOAT
+    701: 'd',       # DOUBLE
+}
+
+class ColumnLevel(object):
+    """The rows at one nesting level of a result, held as columns.
+
+    ``path`` is the tuple of nested column names leading to this
+    level, empty for the top level.  ``columns`` maps each
+    non-nested column name, in order, to an array of its values.
+    ``parent`` holds, for each row, the index of its parent row in
+    the enclosing level; it's None for the top level.
+
+    Numeric columns are typed arrays - NumPy arrays if NumPy is
+    installed, otherwise ``array.array`` - unless they contain NULLs.
+    Other columns are lists, or NumPy object arrays.
+
+    """
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = fields
+        self.rowcount = 0
+        self.columns = collections.OrderedDict(
+            (field['name'], [])
+            for field in fields
+            if field['type_oid'] != _NESTED_OID
+        )
+        self.parent = [] if path else None
+
+    def __repr__(self):
+        return "<ColumnLevel %s: %d rows>" % (
+                    ".".join(self.path) or "(top)", self.rowcount)
+
+    def _finish(self):
+        oids = dict((field['name'], field['type_oid'])
+                        for field in self.fields)
+        for name, values in self.columns.items():
+            self.columns[name] = _column_array(
+                    _column_typecodes.get(oids[name]), values)
+        if self.parent is not None:
+            self.parent = _column_array(_INT64, self.parent)
+
+def _column_array(typecode, values):
+    if typecode is not None and None not in values:
+        # values which don't fit the type, e.g. from a custom
+        # converter, leave the column untyped
+        try:
+            if numpy is not None:
+                return numpy.array(values,
+                            dtype=bool if typecode == 'b' else typecode)
+            else:
+                return array.array(typecode, values)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    if numpy is not None:
+        ret = numpy.empty(len(values), dtype=object)
+        ret[:] = values
+        return ret
+    return values
+
+def _compile_columns(fields, ctx, path, levels):
+    """Compile a list of fields into a function which appends one
+    JSON document, and its nested documents, to a list of
+    :class:`.ColumnLevel` objects, which is built here as well."""
+
+    level = ColumnLevel(path, fields)
+    levels.append(level)
+    plain = []
+    nested = []
+    for field in fields:
+        if field['type_oid'] == _NESTED_OID:
+            nested.append((field['name'], _compile_columns(
+                                field['akiban.fields'], ctx,
+                                path + (field['name'], ), levels)))
         else:
-            value = ctx.typecast(
-                            document[field['name']],
-                            field['type_oid']
-                        )
-        row.append(value)
-    return tuple(row)
+            plain.append((field['name'], _converter(ctx, field),
+                            level.columns[field['name']].append))
+    plain = tuple(plain)
+    nested = tuple(nested)
+    add_parent = level.parent.append if path else None
+
+    def add(document, parent):
+        index = level.rowcount
+        level.rowcount += 1
+        for key, convert, append in plain:
+            value = document[key]
+            append(value if convert is None else convert(value))
+        if add_parent is not None:
+            add_parent(parent)
+        for key, add_child in nested:
+            for child in document[key]:
+                add_child(child, index)
+    return add
+
+def _fetch_columns(rows, ctx):
+    """Decode raw rows into one :class:`.ColumnLevel` per nesting
+    level, returned in a dictionary keyed on each level's path, in
+    the order of ``akiban_description``."""
+
+    levels = []
+    add = _compile_columns(ctx.fields, ctx, (), levels)
+    loads = ctx.loads
+    for row in rows:
+        add(loads(row[0]), None)
+    for level in levels:
+        level._finish()
+    return collections.OrderedDict(
+                (level.path, level) for level in levels)
+
+def _fetch_table_columns(rows, fields):
+    """As :func:`._fetch_columns`, for the rows of a result without
+    nested columns, received in "table" output format and so
+    already converted."""
+
+    level = ColumnLevel((), fields)
+    rows = list(rows)
+    level.rowcount = len(rows)
+    for values, column in zip(level.columns.values(), zip(*rows)):
+        values.extend(column)
+    level._finish()
+    return collections.OrderedDict([((), level)])
 
 def _format_fields(document):
     ret = []
@@ -0,0 +1,236 @@
+"""Bulk loading of table groups from nested documents.
+
+Documents are shaped like the rows of a ``json_with_meta_data``
+result, each table's rows nested in those of its parent under a
+key.  A :class:`.Table` tree describes the group; a
+:class:`.GroupLoader` splits chunks of documents into rows per
+table and inserts them with multi-row ``INSERT ... VALUES``
+statements, parents before children, as the GROUPING FOREIGN KEYs
+require::
+
+    from akiban.load import GroupLoader, Table
+
+    group = Table("customers", children=[
+                Table("orders", parent_columns=["customer_id"],
+                    children=[
+                        Table("items", parent_columns=["order_id"])
+                    ])
+            ])
+
+    loader = GroupLoader(connection, group, chunk_size=1000)
+    stats = loader.load([
+        {"customer_id": 1, "name": "David McFarlane", "orders": [
+            {"order_id": 101, "order_info": "apple related", "items": [
+                {"item_id": 1001, "price": 9.99, "quantity": 1}
+            ]}
+        ]},
+    ])
+    print(stats.rows_per_second)
+
+"""
+import time
+
+
+class Table(object):
+    """One table of a group.
+
+    :param name: the table name.
+    :param children: :class:`.Table` objects for the tables grouped
+     under this one.
+    :param key: the key of the list of this table's documents in its
+     parent's documents; defaults to ``name``.
+    :param columns: the columns to insert.  Defaults to the keys of
+     this table's documents in each chunk, other than those of child
+     tables, along with ``parent_columns``, sorted.
+    :param parent_columns: columns whose values are taken from the
+     parent document when a document doesn't have them, such as the
+     grouping foreign key.
+
+    A document with no value for one of the columns, which its
+    parent can't provide either, raises ``KeyError``.
+
+    Table and column names are double quoted in the ``INSERT``, so
+    are matched case sensitively, and may be reserved words; each
+    part of a schema qualified ``name`` is quoted separately.
+
+    """
+
+    def __init__(self, name, children=(), key=None, columns=None,
+                        parent_columns=()):
+        self.name = name
+        self.children = list(children)
+        self.key = key or name
+        self.columns = list(columns) if columns is not None else None
+        self.parent_columns = tuple(parent_columns)
+
+    def _tables(self):
+        # parents before children, as the grouping foreign keys
+        # require
+        yield self
+        for child in self.children:
+            for table in child._tables():
+                yield table
+
+
+class LoadStats(object):
+    """Progress of a :meth:`.GroupLoader.load`.
+
+    ``rows`` maps each table name to the rows inserted so far.
+
+    """
+
+    def __init__(self, tables):
+        self.groups = 0
+        self.chunks = 0
+        self.statements = 0
+        self.rows = dict((table.name, 0) for table in tables)
+        self.elapsed = 0.0
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self):
+        return self.total_rows / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return "<LoadStats %d groups, %d rows in %.3fs, %.0f rows/s>" % (
+                    self.groups, self.total_rows, self.elapsed,
+                    self.rows_per_second)
+
+
+class GroupLoader(object):
+    """Inserts nested documents into a group of tables.
+
+    :param connection: an :class:`akiban.psycopg2.Connection`, or
+     another DBAPI connection with the "format" paramstyle whose
+     ``cursor()`` accepts ``nested=False``.
+    :param table: the root :class:`.Table` of the group.
+    :param chunk_size: number of top level documents split into
+     rows and inserted at a time.
+    :param rows_per_statement: most rows sent in one ``INSERT``.
+    :param commit_every_chunk: if True, the connection is committed
+     after each chunk, so that a chunk is a transaction.  Otherwise
+     committing is left to the caller.
+    :param progress: a callable, called with the
+     :class:`.LoadStats` after each chunk.
+
+    """
+
+    def __init__(self, connection, table, chunk_size=1000,
+                    rows_per_statement=1000, commit_every_chunk=True,
+                    progress=None):
+        self.connection = connection
+        self.table = table
+        self.chunk_size = chunk_size
+        self.rows_per_statement = rows_per_statement
+        self.commit_every_chunk = commit_every_chunk
+        self.progress = progress
+        self._statements = {}
+
+    def load(self, documents):
+        """Insert an iterable of top level documents; returns the
+        :class:`.LoadStats`.
+
+        Documents are consumed a chunk at a time, so may come from
+        a generator.
+
+        """
+        tables = list(self.table._tables())
+        stats = LoadStats(tables)
+        cursor = self.connection.cursor(nested=False)
+        start = time.time()
+        try:
+            chunk = []
+            for document in documents:
+                chunk.append(document)
+                if len(chunk) == self.chunk_size:
+                    self._load_chunk(cursor, tables, chunk, stats, start)
+                    chunk = []
+            if chunk:
+                self._load_chunk(cursor, tables, chunk, stats, start)
+        finally:
+            cursor.close()
+        return stats
+
+    def _load_chunk(self, cursor, tables, chunk, stats, start):
+        batches = dict((table.name, []) for table in tables)
+        for document in chunk:
+            _split(self.table, document, None, batches)
+        for table in tables:
+            documents = batches[table.name]
+            columns = table.columns
+            if columns is None:
+                columns = _columns(table, documents)
+            rows = [_row(table, columns, document, parent)
+                        for document, parent in documents]
+            size = self.rows_per_statement
+            for i in range(0, len(rows), size):
+                page = rows[i:i + size]
+                cursor.execute(
+                            self._statement(table, columns, len(page)),
+                            [value for row in page for value in row])
+                stats.statements += 1
+            stats.rows[table.name] += len(rows)
+        if self.commit_every_chunk:
+            self.connection.commit()
+        stats.groups += len(chunk)
+        stats.chunks += 1
+        stats.elapsed = time.time() - start
+        if self.progress is not None:
+            self.progress(stats)
+
+    def _statement(self, table, columns, count):
+        key = (table.name, tuple(columns), count)
+        try:
+            return self._statements[key]
+        except KeyError:
+            row = "(%s)" % ", ".join(["%s"] * len(columns))
+            stmt = self._statements[key] = \
+                    "INSERT INTO %s (%s) VALUES %s" % (
+                        ".".join(_quote(part)
+                                    for part in table.name.split(".")),
+                        ", ".join(_quote(column) for column in columns),
+                        ", ".join([row] * count))
+            return stmt
+
+
+def _quote(name):
+    # "%" is doubled too, as the statement is run with parameters
+    return '"%s"' % name.replace('"', '""').replace('%', '%%')
+
+
+def _split(table, document, parent, batches):
+    """Append ``document`` along with its parent, and its nested
+    documents, to the per-table lists in ``batches``."""
+
+    batches[table.name].append((document, parent))
+    for child in table.children:
+        for child_document in document.get(child.key) or ():
+            _split(child, child_document, document, batches)
+
+
+def _columns(table, documents):
+    """Infer the columns of a table from the keys of its documents."""
+
+    child_keys = set(child.key for child in table.children)
+    columns = set(table.parent_columns)
+    for document, parent in documents:
+        columns.update(key for key in document if key not in child_keys)
+    return sorted(columns)
+
+
+def _row(table, columns, document, parent):
+    row = []
+    for column in columns:
+        if column in document:
+            row.append(document[column])
+        elif parent is not None and column in parent:
+            row.append(parent[column])
+        else:
+            raise KeyError(
+                    "No value for column %r of table %r in document %r%s" % (
+                        column, table.name, document,
+                        "" if parent is None else " or its parent"))
+    return tuple(row)
@@ -0,0 +1,216 @@
+"""A thread-safe pool of Akiban connections.
+
+The pool is aware of the OutputFormat state of each connection, as
+tracked by :class:`akiban.psycopg2.Connection`.  Since a connection
+switches its format only when a cursor executes, checking out a
+connection never costs a "set" statement; asking for a particular
+format instead prefers an idle connection which is already in that
+format, so that the switch is usually not needed at all::
+
+    from akiban.pool import Pool
+    from akiban.psycopg2 import Connection
+    import psycopg2
+
+    pool = Pool(lambda: psycopg2.connect(host="localhost", port=15432,
+                            connection_factory=Connection),
+                min_size=2, max_size=10, max_overflow=5)
+
+    with pool.connection(nested=True) as connection:
+        cursor = connection.cursor()
+        ...
+
+"""
+import collections
+import contextlib
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the
+    pool's timeout."""
+
+
+def _default_health_check(connection):
+    return not getattr(connection, 'closed', False)
+
+
+class Pool(object):
+    """A pool of connections.
+
+    :param creator: a callable returning a new DBAPI connection.
+    :param min_size: number of connections opened up front.
+    :param max_size: number of connections kept in the pool.
+    :param max_overflow: number of connections which may be opened
+     beyond ``max_size`` when the pool is exhausted; these are closed
+     when returned.
+    :param timeout: seconds to wait for a connection when the pool
+     and its overflow are exhausted, before raising
+     :class:`.PoolTimeout`.
+    :param health_check: a callable which receives an idle connection
+     at checkout and returns False, or raises, if it should be
+     discarded.  The default discards connections which have been
+     closed.
+
+    """
+
+    def __init__(self, creator, min_size=1, max_size=5, max_overflow=0,
+                    timeout=30, health_check=_default_health_check):
+        self._creator = creator
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self._health_check = health_check
+
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._size = 0
+        self._checkedout = 0
+
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.health_check_failures = 0
+
+        for i in range(min_size):
+            self._idle.append(self._creator())
+            self._size += 1
+
+    @contextlib.contextmanager
+    def connection(self, nested=None):
+        """Check out a connection for the duration of a ``with`` block."""
+
+        conn = self.checkout(nested)
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def checkout(self, nested=None):
+        """Check out a connection.
+
+        :param nested: if True or False, prefer an idle connection
+         whose OutputFormat is already nested or plain, respectively.
+         No "set" is issued either way; the connection switches format
+         when a cursor of the other kind executes.
+
+        """
+        start = time.time()
+        while True:
+            conn, create = self._reserve(nested, start)
+            if create:
+                try:
+                    conn = self._creator()
+                except:
+                    self._discard(None)
+                    raise
+                break
+            elif self._health_check is None or self._check(conn):
+                break
+            else:
+                with self._cond:
+                    self.health_check_failures += 1
+                self._discard(conn)
+
+        waited = time.time() - start
+        with self._cond:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+        return conn
+
+    def _check(self, conn):
+        try:
+            return self._health_check(conn)
+        except Exception:
+            return False
+
+    def _reserve(self, nested, start):
+        with self._cond:
+            while True:
+                if self._idle:
+                    self._checkedout += 1
+                    return self._take_idle(nested), False
+                elif self._size < self.max_size + self.max_overflow:
+                    self._checkedout += 1
+                    self._size += 1
+                    return None, True
+
+                remaining = start + self.timeout - time.time()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        "Pool of size %d overflow %d exhausted; "
+                        "timed out after %g seconds" %
+                        (self.max_size, self.max_overflow, self.timeout))
+                self._cond.wait(remaining)
+
+    def _take_idle(self, nested):
+        # most recently used first
+        if nested is not None:
+            for conn in reversed(self._idle):
+                if getattr(conn, '_nested', None) is nested:
+                    self._idle.remove(conn)
+                    return conn
+        return self._idle.pop()
+
+    def _discard(self, conn):
+        with self._cond:
+            self._checkedout -= 1
+            self._size -= 1
+            self._cond.notify()
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def checkin(self, conn):
+        """Return a connection to the pool.
+
+        Any transaction in progress is rolled back; a connection
+        which is closed, or fails to roll back, is discarded.
+
+        """
+        ok = not getattr(conn, 'closed', False)
+        if ok:
+            try:
+                conn.rollback()
+            except Exception:
+                ok = False
+
+        with self._cond:
+            if ok and self._size <= self.max_size:
+                self._checkedout -= 1
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+
+        self._discard(conn)
+
+    def dispose(self):
+        """Close all idle connections."""
+
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def status(self):
+        """Return a dictionary of pool metrics."""
+
+        with self._cond:
+            capacity = self.max_size + self.max_overflow
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'checked_out': self._checkedout,
+                'overflow': max(0, self._size - self.max_size),
+                'utilisation': float(self._checkedout) / capacity
+                                if capacity else 0.0,
+                'checkouts': self.checkouts,
+                'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time,
+                'health_check_failures': self.health_check_failures,
+            }
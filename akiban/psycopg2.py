@@ -1,51 +1,455 @@
 from __future__ import absolute_import
 
+import datetime
+import decimal
+import functools
+import itertools
+import pickle
+import re
+import threading
 import psycopg2
 import psycopg2.extensions
-from .impl import _filter_row, _NESTED_OID, AkibanResultContext
+from .impl import _filter_row, _iter_rows, _fetch_columns, _NESTED_OID, \
+            _fetch_table_columns, \
+            _Prefetcher, _DetachedRows, _DeferredTypecast, _nested_levels, \
+            _parallel_decode, \
+            AkibanResultContext, _LRUCache, _output_format_sql, \
+            get_json_loads, ResultCache, _cacheable, ExecuteStats, _timer, \
+            row_factories, _row_maker
 from .api import NESTED_CURSOR
 
+try:
+    _basestring = basestring
+except NameError:
+    _basestring = str
+
+_select = re.compile(r'\s*select\b', re.I)
+
 
 class Cursor(psycopg2.extensions.cursor):
 
-    def execute(self, *arg, **kw):
-        ret = self._super().execute(*arg, **kw)
-        self._setup_description()
+    _akiban_lazy = False
+    _akiban_raw = False
+    _akiban_stream = False
+    _akiban_ctx = None
+    _akiban_prefetch_depth = 0
+    _akiban_prefetcher = None
+    _akiban_executor = None
+    _akiban_chunksize = 1000
+    _akiban_cached = None
+    _akiban_stats = None
+    _akiban_flat = False
+    _akiban_text_caster = None
+    _akiban_row_factory = None
+    _akiban_make_row = None
+
+    def execute(self, query, vars=None):
+        self._stop_prefetch()
+        if self._akiban_stats is not None:
+            self._report()
+        if not self.connection._akiban_listeners:
+            return self._execute(query, vars)
+        stats = self._akiban_stats = ExecuteStats(query)
+        start = _timer()
+        try:
+            return self._execute(query, vars)
+        finally:
+            stats.statement_time = _timer() - start
+
+    def _execute(self, query, vars):
+        self._akiban_cached = None
+        connection = self.connection
+        metadata = None
+        if connection.adaptive_output_format and self.name is None:
+            shape = (self._akiban_raw, query)
+            if shape in connection._akiban_flat_statements:
+                metadata = connection._akiban_flat_statements[shape]
+        else:
+            shape = None
+        nested = metadata is None
+        self._akiban_flat = not nested
+        if shape is not None:
+            self._set_text_type(nested)
+
+        cache = connection.result_cache
+        if cache is not None and self.name is None and \
+                _cacheable.match(query):
+            key = (_output_format_sql(nested), self._akiban_raw,
+                            self.mogrify(query, vars))
+            rows = cache.get(key)
+            if rows is not None:
+                if self._akiban_stats is not None:
+                    self._akiban_stats.cached = True
+                self._use_cached(rows)
+                self._setup_description(metadata)
+                return None
+        else:
+            key = None
+        with connection._akiban_lock:
+            ret = self._super().execute(
+                    connection._set_output_format(self, nested, query), vars)
+            connection._nested = nested
+        if key is not None and self._super().description:
+            if nested:
+                rows = tuple(row[0] for row in self._super().fetchall())
+            else:
+                rows = tuple(self._super().fetchall())
+            cache.put(key, rows, query)
+            self._use_cached(rows)
+        self._setup_description(metadata)
+        if shape is not None and nested and self._akiban_ctx is not None \
+                and not any(field['type_oid'] == _NESTED_OID
+                            for field in self._akiban_ctx.fields):
+            connection._akiban_flat_statements[shape] = \
+                        self._akiban_metadata
         return ret
 
-    def executemany(self, *arg, **kw):
-        ret = self._super().executemany(*arg, **kw)
+    def _use_cached(self, rows):
+        if self._akiban_flat:
+            self._akiban_cached = iter(rows)
+        else:
+            self._akiban_cached = ((text, ) for text in rows)
+        self._akiban_cached_rowcount = len(rows)
+
+    def _set_text_type(self, nested):
+        # flat results are converted by psycopg2, so their text
+        # should arrive as strings, rather than as bytes
+        if not nested:
+            caster = psycopg2.extensions.UNICODE
+        elif self._akiban_raw:
+            caster = _BYTES
+        else:
+            return
+        if caster is not self._akiban_text_caster:
+            psycopg2.extensions.register_type(caster, self)
+            self._akiban_text_caster = caster
+
+    def executemany(self, query, vars_list):
+        self._stop_prefetch()
+        if self._akiban_stats is not None:
+            self._report()
+        self._akiban_cached = None
+        self._akiban_flat = False
+        self._set_text_type(True)
+        with self.connection._akiban_lock:
+            self.connection._set_output_format(self, True)
+            ret = self._super().executemany(query, vars_list)
         self._setup_description()
         return ret
 
+    def prefetch(self, depth=2):
+        """Fetch and decode rows ahead of the application, in a
+        background thread.
+
+        Up to ``depth`` batches are decoded ahead; a batch is
+        ``itersize`` rows for a named cursor, ``arraysize`` rows
+        otherwise.   Applies to the current result, if any, and to
+        those of later executions; ``prefetch(0)`` turns it off.
+        Errors raised in the background are raised from the fetch
+        method that would have returned the rows.
+
+        While prefetching, the cursor must only be used from one
+        thread, and should be closed when no longer needed, which
+        stops the background thread.   Other cursors of the
+        connection may be used meanwhile; for a named cursor, whose
+        rows are fetched from the server in the background, they
+        wait for each batch in progress.
+
+        """
+        if depth < 0:
+            raise ValueError("depth must be zero or more")
+        self._stop_prefetch()
+        self._akiban_prefetch_depth = depth
+        if depth and self._akiban_ctx is not None and \
+                not self._akiban_flat:
+            self._start_prefetch()
+
+    def _start_prefetch(self):
+        if self.name is not None:
+            size = self.itersize
+        else:
+            size = self.arraysize
+        self._akiban_prefetcher = _Prefetcher(
+                                    self._fetchmany_raw, size,
+                                    self._akiban_ctx,
+                                    self._akiban_prefetch_depth)
+
+    def _stop_prefetch(self):
+        if self._akiban_prefetcher is not None:
+            self._akiban_prefetcher.close()
+            self._akiban_prefetcher = None
+
+    def close(self):
+        self._stop_prefetch()
+        if self._akiban_stats is not None:
+            self._report()
+        return self._super().close()
+
+    def _report(self):
+        stats, self._akiban_stats = self._akiban_stats, None
+        for listener in self.connection._akiban_listeners:
+            listener(stats)
+
+    def _reporting(self, rows):
+        for row in rows:
+            yield row
+        if self._akiban_stats is not None:
+            self._report()
+
+    def parallel_decode(self, executor, chunksize=1000):
+        """Decode the rows of ``fetchall()``, ``fetchmany()`` and
+        iteration across a ``concurrent.futures`` executor, in chunks
+        of ``chunksize`` rows.
+
+        Meant for a ``ProcessPoolExecutor``, so that decoding isn't
+        held to one CPU by the GIL.   Each chunk is decoded in a
+        worker into plain rows, which are pickled back; nested
+        cursors are rebuilt here, in the original order.   Batches
+        of ``chunksize`` rows or fewer, such as those of
+        ``fetchone()``, are decoded here as usual; iterate with a
+        large ``arraysize`` (or ``itersize`` for a named cursor) for
+        iteration to benefit.
+
+        The connection's converters are sent to the workers, so
+        must be picklable, i.e. not lambdas.  Values left to
+        psycopg2's typecasters, which need the real cursor, are sent
+        back as they are and typecast here.  Doesn't apply to
+        ``stream=True`` cursors, nor while prefetching.   Pass None
+        to turn it off.
+
+        """
+        self._akiban_executor = executor
+        self._akiban_chunksize = chunksize
+
+    def _decode(self, rows):
+        if self._akiban_flat:
+            if self._akiban_stats is not None:
+                self._akiban_stats.rows += len(rows)
+            if self._akiban_make_row is not None:
+                return [self._akiban_make_row(row) for row in rows]
+            return rows
+        ctx = self._akiban_ctx
+        if self._akiban_executor is not None and ctx is not None and \
+                not ctx.stream and len(rows) > self._akiban_chunksize:
+            spec = (self._akiban_metadata,
+                        getattr(self.connection, 'json_backend', None),
+                        self._akiban_raw,
+                        tuple(sorted(ctx.converters.items())),
+                        self._akiban_row_factory,
+                        ctx.intern_strings if ctx.intern_strings in
+                            (True, False)
+                            else frozenset(ctx.intern_strings),
+                        ctx.intern_limit)
+            stats = self._akiban_stats
+            if stats is not None:
+                start = _timer()
+            decoded = _parallel_decode(rows, ctx, self._akiban_executor,
+                            functools.partial(_decode_chunk, spec),
+                            self._akiban_chunksize)
+            if stats is not None:
+                stats.decode_time += _timer() - start
+                stats.rows += len(rows)
+                stats.json_bytes += sum(len(row[0]) for row in rows)
+            return decoded
+        return [_filter_row(row, ctx) for row in rows]
+
     def _super(self):
         return super(Cursor, self)
 
-    def _setup_description(self):
-        if super(Cursor, self).description:
+    def _setup_description(self, metadata=None):
+        # a named (server side) cursor has no description until
+        # the first FETCH, which will deliver the metadata row
+        # along with the first batch of data rows.  A flat result
+        # has no metadata row; it's that of an earlier execution.
+        if metadata is not None:
+            firstrow = (metadata, )
+        elif self.name is not None:
+            # the format may have been switched since the execute
+            with self.connection._akiban_lock:
+                self.connection._set_output_format(self, True)
+                firstrow = self._fetchone_raw()
+        elif self._akiban_cached is not None or \
+                super(Cursor, self).description:
+            firstrow = self._fetchone_raw()
+        else:
+            firstrow = None
+
+        if firstrow is not None:
+            self._akiban_metadata = firstrow[0]
             self._akiban_ctx = Psycopg2ResultContext(
-                                self, self._super().fetchone()
+                                self, firstrow,
+                                lazy=self._akiban_lazy,
+                                stream=self._akiban_stream,
+                                fields_cache=getattr(self.connection,
+                                        '_akiban_fields_cache', None),
+                                loads=getattr(self.connection,
+                                        '_json_loads_raw'
+                                        if self._akiban_raw
+                                        else '_json_loads', None),
+                                converters=getattr(self.connection,
+                                        'converters', None),
+                                stats=self._akiban_stats,
+                                row_factory=self._akiban_row_factory,
+                                intern_strings=getattr(self.connection,
+                                        'intern_strings', False),
+                                intern_limit=getattr(self.connection,
+                                        'intern_limit', 10000),
+                                exact_decimals=getattr(self.connection,
+                                        'json_backend', None) is None
                             )
+            if self._akiban_flat and self._akiban_row_factory not in (
+                                                    None, 'tuple'):
+                # flat rows arrive from psycopg2 as tuples
+                self._akiban_make_row = _row_maker(
+                            self._akiban_row_factory,
+                            [field['name']
+                                for field in self._akiban_ctx.fields])
+            else:
+                self._akiban_make_row = None
+            if self._akiban_prefetch_depth and not self._akiban_flat:
+                self._start_prefetch()
         else:
             self._akiban_ctx = None
 
     def fetchone(self):
-        return _filter_row(
-                    self._super().fetchone(),
-                    self._akiban_ctx
-                )
+        if self._akiban_prefetcher is not None:
+            row = self._akiban_prefetcher.fetchone()
+        else:
+            with self.connection._akiban_lock:
+                if self.name is not None:
+                    self.connection._set_output_format(self, True)
+                row = self._fetchone_raw()
+            if not self._akiban_flat:
+                row = _filter_row(row, self._akiban_ctx)
+            elif row is not None:
+                if self._akiban_stats is not None:
+                    self._akiban_stats.rows += 1
+                if self._akiban_make_row is not None:
+                    row = self._akiban_make_row(row)
+        if row is None and self._akiban_stats is not None:
+            self._report()
+        return row
 
     def fetchall(self):
-        return [
-            _filter_row(row, self._akiban_ctx)
-            for row in self._super().fetchall()
-        ]
+        if self._akiban_prefetcher is not None:
+            rows = self._akiban_prefetcher.fetchall()
+        else:
+            with self.connection._akiban_lock:
+                if self.name is not None:
+                    self.connection._set_output_format(self, True)
+                rows = self._fetchall_raw()
+            rows = self._decode(rows)
+        if self._akiban_stats is not None:
+            self._report()
+        return rows
 
     def fetchmany(self, size=None):
-        return [
-            _filter_row(row, self._akiban_ctx)
-            for row in self._super().fetchmany(size)
-        ]
+        if size is None:
+            size = self.arraysize
+        if self._akiban_prefetcher is not None:
+            rows = self._akiban_prefetcher.fetchmany(size)
+        else:
+            rows = self._decode(self._fetchmany_raw(size))
+        if len(rows) < size and self._akiban_stats is not None:
+            self._report()
+        return rows
+
+    def fetch_columns(self):
+        """Fetch all remaining rows as columns rather than as rows.
+
+        Returns a dictionary with one :class:`akiban.impl.ColumnLevel`
+        per nesting level, keyed on the tuple of nested column names
+        leading to it, in the order of :attr:`.akiban_description`;
+        e.g. ``()``, ``('orders', )`` and ``('orders', 'items')``.
+        Each level's ``parent`` array links its rows to the rows of
+        the enclosing level.   No row tuples or nested cursors are
+        created.
+
+        Returns None if there's no result.   Can't be used while
+        prefetching.
+
+        """
+        if self._akiban_ctx is None:
+            return None
+        if self._akiban_prefetcher is not None:
+            raise psycopg2.ProgrammingError(
+                    "fetch_columns() can't be used while prefetching")
+        if self.name is not None:
+            size = self.itersize
+            rows = itertools.chain.from_iterable(
+                        iter(lambda: self._fetchmany_raw(size), []))
+        else:
+            rows = self._fetchall_raw()
+        if self._akiban_flat:
+            columns = _fetch_table_columns(rows, self._akiban_ctx.fields)
+        else:
+            columns = _fetch_columns(rows, self._akiban_ctx)
+        if self._akiban_stats is not None:
+            self._report()
+        return columns
+
+    def __iter__(self):
+        if self._akiban_stats is not None:
+            return self._reporting(self._iter())
+        return self._iter()
+
+    def _iter(self):
+        if self._akiban_prefetcher is not None:
+            return iter(self._akiban_prefetcher)
+        # a named cursor streams "itersize" rows per round trip;
+        # otherwise the rows are already buffered client side
+        if self.name is not None:
+            size = self.itersize
+        else:
+            size = self.arraysize
+        if self._akiban_executor is not None or self._akiban_flat:
+            return itertools.chain.from_iterable(
+                        self._decode(rows) for rows in
+                        iter(lambda: self._fetchmany_raw(size), []))
+        return _iter_rows(self._fetchmany_raw, size, self._akiban_ctx)
+
+    def _fetchone_raw(self):
+        if self._akiban_cached is not None:
+            return next(self._akiban_cached, None)
+        if self._akiban_stats is not None:
+            return self._timed_fetch(self._super().fetchone)
+        return self._super().fetchone()
+
+    def _fetchall_raw(self):
+        if self._akiban_cached is not None:
+            return list(self._akiban_cached)
+        if self._akiban_stats is not None:
+            return self._timed_fetch(self._super().fetchall)
+        return self._super().fetchall()
+
+    def _fetchmany_raw(self, size):
+        if self._akiban_cached is not None:
+            return list(itertools.islice(self._akiban_cached, size))
+        if self.name is None:
+            return self._fetchmany(size)
+        # the prefetch thread fetches through here; the format
+        # mustn't change between the "set" and the FETCH
+        with self.connection._akiban_lock:
+            self.connection._set_output_format(self, True)
+            return self._fetchmany(size)
+
+    def _fetchmany(self, size):
+        if self._akiban_stats is not None:
+            return self._timed_fetch(self._super().fetchmany, size)
+        return self._super().fetchmany(size)
+
+    def _timed_fetch(self, fetch, *arg):
+        stats = self._akiban_stats
+        start = _timer()
+        rows = fetch(*arg)
+        stats.fetch_time += _timer() - start
+        return rows
+
+    @property
+    def rowcount(self):
+        if self._akiban_cached is not None:
+            return self._akiban_cached_rowcount
+        return self._super().rowcount
 
     @property
     def akiban_description(self):
@@ -70,14 +474,79 @@ class Cursor(psycopg2.extensions.cursor):
 _psycopg2_adapter_cache = {
 }
 
+# psycopg2 2.8 and above
+_BYTES = getattr(psycopg2.extensions, 'BYTES', None)
+
+def _parse_decimal(value):
+    if value.__class__ is float:
+        # only with a JSON backend chosen explicitly, other than
+        # 'decimal'.  repr() is the shortest string which gives the
+        # same float; digits beyond 17, and trailing zeros, are lost
+        return decimal.Decimal(repr(value))
+    return decimal.Decimal(value)
+
+def _parse_float(value):
+    if value.__class__ is float:
+        return value
+    # a Decimal, from a result parsed for its DECIMAL columns
+    return float(value)
+
+fast_converters = {
+    # these already arrive as the right Python type
+    16: None,       # BOOLEAN
+    20: None,       # BIGINT
+    21: None,       # SMALLINT
+    23: None,       # INTEGER
+    25: None,       # TEXT
+    1042: None,     # CHAR
+    1043: None,     # VARCHAR
+    700: _parse_float,        # FLOAT
+    701: _parse_float,        # DOUBLE
+    1700: _parse_decimal,     # DECIMAL
+}
+"""The default converters for values in nested results, keyed
+on type oid.  Each is called with the value as parsed from the
+JSON, and may raise ``ValueError`` to hand the value to the
+psycopg2 typecaster instead.  A converter of None passes values
+through unchanged.
+
+Each :class:`.Connection` starts with a copy of these as its
+``converters`` attribute.
+
+"""
+
+if hasattr(datetime.date, 'fromisoformat'):
+    # Python 3.7 and above; otherwise psycopg2's typecasters are used
+    fast_converters.update({
+        1082: datetime.date.fromisoformat,      # DATE
+        1083: datetime.time.fromisoformat,      # TIME
+        1114: datetime.datetime.fromisoformat,  # DATETIME
+    })
+
 class Psycopg2ResultContext(AkibanResultContext):
 
+    def __init__(self, *arg, **kw):
+        converters = kw.pop('converters', None)
+        super(Psycopg2ResultContext, self).__init__(*arg, **kw)
+        if converters is None:
+            converters = fast_converters
+        self.converters = converters
+        # descriptions are generated once per field list, keyed
+        # on id() as the lists themselves are not hashable; they're
+        # kept alive by self.fields.
+        self._descriptions = {}
+        self._akiban_description = None
+
     def gen_description(self, fields):
-        return [
-            (rec['name'], rec['type_oid'],
-                    None, None, None, None, None)
-            for rec in fields
-        ]
+        try:
+            return self._descriptions[id(fields)]
+        except KeyError:
+            description = self._descriptions[id(fields)] = [
+                (rec['name'], rec['type_oid'],
+                        None, None, None, None, None)
+                for rec in fields
+            ]
+            return description
 
     @property
     def description(self):
@@ -85,7 +554,10 @@ class Psycopg2ResultContext(AkibanResultContext):
 
     @property
     def akiban_description(self):
-        return self.gen_akiban_description(self.fields)
+        if self._akiban_description is None:
+            self._akiban_description = \
+                    self.gen_akiban_description(self.fields)
+        return self._akiban_description
 
     def gen_akiban_description(self, fields):
         return [
@@ -98,6 +570,18 @@ class Psycopg2ResultContext(AkibanResultContext):
         ]
 
     def typecast(self, value, oid):
+        try:
+            parse = self.converters[oid]
+        except KeyError:
+            return self._adapt(value, oid)
+        if parse is None or value is None:
+            return value
+        try:
+            return parse(value)
+        except ValueError:
+            return self._adapt(value, oid)
+
+    def _adapt(self, value, oid):
         try:
             # return a cached "adpater" for this oid.
             # for a particular oid that's been seen before,
@@ -108,7 +592,7 @@ class Psycopg2ResultContext(AkibanResultContext):
             # calling isinstance() on every row so we cache whether or
             # not psycopg2 returns this particular oid as a string
             # or not, assuming it will be consistent per oid.
-            if isinstance(value, basestring):
+            if isinstance(value, _basestring):
                 adapter = _psycopg2_adapter_cache[oid] = \
                         psycopg2.extensions.string_types[oid]
             else:
@@ -122,36 +606,399 @@ class Psycopg2ResultContext(AkibanResultContext):
                 _psycopg2_adapter_cache[oid] = adapter = None
 
         if adapter:
-            # TODO: do we send the oid or the adapter
-            # as the argument here?
-            return adapter(value, adapter)
+            # typecasters are called with the cursor, from which
+            # they may use e.g. tzinfo_factory
+            return adapter(value, self.cursor)
         else:
             return value
 
+    def converter(self, oid):
+        try:
+            parse = self.converters[oid]
+        except KeyError:
+            pass
+        else:
+            if parse is None:
+                return None
+            adapt = self._adapt
+
+            def convert(value):
+                if value is None:
+                    return None
+                try:
+                    return parse(value)
+                except ValueError:
+                    return adapt(value, oid)
+            return convert
+
+        try:
+            adapter = _psycopg2_adapter_cache[oid]
+        except KeyError:
+            # not seen yet; typecast() will figure out the
+            # adapter from the first value and cache it.
+            return super(Psycopg2ResultContext, self).converter(oid)
+
+        if adapter:
+            cursor = self.cursor
+
+            def convert(value):
+                return adapter(value, cursor)
+            return convert
+        else:
+            return None
+
+
+class _WorkerResultContext(Psycopg2ResultContext):
+    """Decodes rows in a worker process, for
+    :meth:`.Cursor.parallel_decode`."""
+
+    nested_cursor_cls = _DetachedRows
+
+    def __init__(self, *arg, **kw):
+        super(_WorkerResultContext, self).__init__(*arg, **kw)
+        self.level_ids = dict(
+            (id(fields), level)
+            for level, fields in enumerate(_nested_levels(self.fields))
+        )
+
+    def _adapt(self, value, oid):
+        # psycopg2's typecasters take a real cursor, of which the
+        # worker has none; their values are typecast by the parent
+        if value is None:
+            return None
+        return _DeferredTypecast(value, oid)
+
+    def converter(self, oid):
+        if oid in self.converters:
+            return super(_WorkerResultContext, self).converter(oid)
+        # not from _psycopg2_adapter_cache, which a forked worker
+        # may have inherited
+        adapt = self._adapt
+
+        def convert(value):
+            return adapt(value, oid)
+        return convert
+
+
+class _WorkerCursor(object):
+    arraysize = 1
+
+# per worker process, keyed on the spec sent by Cursor._decode()
+_worker_contexts = _LRUCache(10)
+
+def _decode_chunk(spec, texts):
+    try:
+        ctx = _worker_contexts[spec]
+    except KeyError:
+        metadata, json_backend, raw, converters, row_factory, \
+                intern_strings, intern_limit = spec
+        ctx = _worker_contexts[spec] = _WorkerResultContext(
+                            _WorkerCursor(), (metadata, ),
+                            loads=get_json_loads(json_backend, raw=raw),
+                            converters=dict(converters),
+                            row_factory=row_factory,
+                            intern_strings=intern_strings,
+                            intern_limit=intern_limit,
+                            exact_decimals=json_backend is None)
+    decode = ctx.decoder
+    loads = ctx.loads
+    return pickle.dumps([decode(loads(text)) for text in texts],
+                            pickle.HIGHEST_PROTOCOL)
+
+
+class PlainCursor(psycopg2.extensions.cursor):
+    """A cursor which returns plain, non-nested results.
+
+    It's an ordinary psycopg2 cursor, except that it ensures the
+    connection is in "table" output format before each statement.
+
+    """
+
+    def execute(self, query, vars=None):
+        with self.connection._akiban_lock:
+            query = self.connection._set_output_format(self, False, query)
+            ret = super(PlainCursor, self).execute(query, vars)
+            self.connection._nested = False
+        return ret
+
+    def executemany(self, query, vars_list):
+        with self.connection._akiban_lock:
+            self.connection._set_output_format(self, False)
+            return super(PlainCursor, self).executemany(query, vars_list)
+
+    def _fetch(self, fn, *arg):
+        if self.name is None:
+            return fn(*arg)
+        with self.connection._akiban_lock:
+            self.connection._set_output_format(self, False)
+            return fn(*arg)
+
+    def fetchone(self):
+        return self._fetch(super(PlainCursor, self).fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super(PlainCursor, self).fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(super(PlainCursor, self).fetchall)
+
 
 class Connection(psycopg2.extensions.connection):
-    def __init__(self, dsn, async=0):
-        super(Connection, self).__init__(dsn, async=async)
+
+    pipeline_output_format = False
+    """If True, a change in OutputFormat is sent in the same
+    round trip as the statement which needs it, as
+    ``set OutputFormat='...';\n<statement>``, rather than as a
+    separate statement beforehand.
+
+    Applies only to ``execute()`` on unnamed cursors.
+
+    """
+
+    adaptive_output_format = False
+    """If True, statements run by nested cursors which turn out to
+    have no nested columns are run in "table" output format from
+    then on, so that psycopg2 converts their rows natively rather
+    than them being decoded from JSON.
+
+    Statements are recognized by their text, in the order of
+    their first execution; descriptions are those of the JSON
+    result, but values are converted by psycopg2's typecasters,
+    rather than ``converters``.   Changes in OutputFormat are
+    pipelined, as with :attr:`.pipeline_output_format`.   Applies
+    only to ``execute()`` on unnamed cursors.
+
+    """
+
+    result_cache = None
+    """A :class:`akiban.impl.ResultCache`, if set, caches the results
+    of SELECT statements run by nested, unnamed cursors; a hit is
+    decoded as usual without contacting the server.
+
+    Entries aren't invalidated by writes, on this connection or any
+    other, nor confined to a transaction; call
+    ``result_cache.invalidate(<table name>)`` when a table changes.
+
+    """
+
+    intern_strings = False
+    """If True, equal values of each text column of a nested result
+    share one string object, at every level of the result, so that
+    values repeated across many rows, such as status or category
+    names, are held once.   May also be a collection of column
+    names, to intern the string values of those columns only.
+
+    Each column of a result has its own table of values, which is
+    dropped for good once it holds more than :attr:`.intern_limit`
+    of them, as a column with that many distinct values gains little.
+    Doesn't apply to flat results of :attr:`.adaptive_output_format`.
+
+    """
+
+    intern_limit = 10000
+    """The most distinct values interned per column of a result; see
+    :attr:`.intern_strings`."""
+
+    raw_json = True
+    """If True, nested cursors receive the JSON of each row as
+    UTF-8 encoded bytes, which go straight to the JSON parser,
+    rather than having psycopg2 decode them into a string first.
+
+    Takes effect for cursors created afterwards; requires psycopg2
+    2.8 or above and a UTF-8 client encoding.
+
+    """
+
+    def __init__(self, dsn, *arg, **kw):
+        # "async" is a keyword on Python 3; pass it through as given
+        super(Connection, self).__init__(dsn, *arg, **kw)
         self._nested = False
+        # held around a change of OutputFormat and the statement or
+        # FETCH which relies on it, as a prefetching named cursor
+        # fetches from another thread
+        self._akiban_lock = threading.RLock()
+        self._akiban_fields_cache = _LRUCache(100)
+        self._akiban_flat_statements = _LRUCache(100)
+        self.output_format_switches = 0
+        self._akiban_listeners = []
+        self.json_backend = None
+        self.converters = dict(fast_converters)
+        """Converters for values in nested results, keyed on type
+        oid; see :data:`.fast_converters`.  Types not present are
+        converted by psycopg2's typecasters."""
+
+    @property
+    def json_backend(self):
+        """Name of the JSON backend used to parse nested results.
+
+        Defaults to None, for the fastest one installed, except that
+        results with DECIMAL columns are parsed by the standard library
+        with non-integer numbers as ``decimal.Decimal``, so that
+        DECIMAL values are exact.   Set to e.g. ``'json'`` to use the
+        standard library; a backend other than ``'decimal'`` parses
+        DECIMAL values as floats.   See
+        :func:`akiban.impl.get_json_loads`.
+
+        """
+        return self._json_backend
+
+    @json_backend.setter
+    def json_backend(self, name):
+        self._json_loads = get_json_loads(name)
+        self._json_loads_raw = get_json_loads(name, raw=True)
+        self._json_backend = name
+
+    def add_listener(self, listener):
+        """Add a callable, to be called with an
+        :class:`akiban.impl.ExecuteStats` for each result of
+        ``execute()`` on this connection's nested cursors.
+
+        It's called once the rows have all been fetched, or when the
+        cursor is executed again or closed, whichever comes first.
+        With no listeners, no statistics are collected.
+
+        """
+        self._akiban_listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Remove a callable added with :meth:`.add_listener`."""
+        self._akiban_listeners.remove(listener)
 
     def _super_cursor(self, *arg, **kw):
         return super(Connection, self).cursor(*arg, **kw)
 
-    def cursor(self, nested=True):
+    def cursor(self, nested=True, lazy=False, name=None, withhold=False,
+                        stream=False, row_factory=None):
+        """Return a new cursor.
+
+        The OutputFormat is tracked per cursor; each cursor
+        switches the connection to its own format, if needed, when
+        it executes, so nested and plain cursors may be used
+        together on one connection.
+
+        :param nested: if True, the cursor returns Akiban nested
+         results, delivering nested columns as
+         :class:`akiban.api.NestedCursor` objects.
+        :param lazy: if True, the rows of each nested cursor are
+         typecast only when first fetched, rather than when the
+         enclosing row is fetched.
+        :param name: if given, a named (server side) cursor is
+         created.  Rows are then streamed from the server in
+         batches of ``cursor.itersize`` when iterating, or of the
+         given size when calling ``fetchmany()``.
+        :param withhold: create a named cursor ``WITH HOLD``, so that
+         it can be used outside of the transaction which created it.
+        :param stream: if True, and the last column of the result is
+         nested, that column's JSON array is parsed incrementally as
+         its nested cursor is fetched from, ``arraysize`` rows at a
+         time, rather than all at once with the enclosing row.
+         Its ``rowcount`` is -1 until all rows have been fetched.
+        :param row_factory: the kind of row returned at every level
+         of a nested result: ``'tuple'``, the default, ``'namedtuple'``,
+         ``'dict'``, keyed on column name, or ``'record'``, an object
+         with a slot per column; see :func:`akiban.impl.row_class`.
+         Rows are built as they're decoded, without an intermediate
+         tuple.
+
+        """
+        if row_factory is not None and row_factory not in row_factories:
+            raise ValueError("row_factory must be one of %s" %
+                                ", ".join(row_factories))
         if nested:
-            cursor = self._super_cursor(cursor_factory=Cursor)
+            cursor = self._super_cursor(name, cursor_factory=Cursor,
+                                        withhold=withhold)
+            cursor._akiban_lazy = lazy
+            cursor._akiban_stream = stream
+            cursor._akiban_row_factory = row_factory
+            if self.raw_json and _BYTES is not None and \
+                    self.encoding in ('UTF8', 'UNICODE'):
+                psycopg2.extensions.register_type(_BYTES, cursor)
+                cursor._akiban_raw = True
+                cursor._akiban_text_caster = _BYTES
         else:
-            cursor = self._super_cursor()
-        return self._set_output_format(cursor, nested)
-
-    def _set_output_format(self, cursor, nested):
-        if nested is not self._nested:
-            cursor.execute("set OutputFormat='%s'" %
-                        ('json_with_meta_data' if nested else 'table')
-                    )
-            self._nested = nested
+            cursor = self._super_cursor(name, cursor_factory=PlainCursor,
+                                        withhold=withhold)
         return cursor
 
+    def execute_batch(self, statements, lazy=False):
+        """Run several SELECT statements in one round trip, returning
+        a :class:`akiban.api.NestedCursor` with the result of each.
+
+        Each statement is a string, or a tuple of a string and its
+        parameters.  They're sent as the nested columns of one
+        statement, ``select (<statement>) as "0", (<statement>) as
+        "1", ...``, so each must be a SELECT which Akiban accepts as
+        a subquery; results with no nested columns are returned as
+        nested cursors all the same.   Each result has its own
+        ``description`` and ``akiban_description``.
+
+        :param lazy: as for :meth:`.cursor`.
+
+        """
+        cursor = self.cursor(lazy=lazy)
+        try:
+            return self._execute_batch(cursor, statements)
+        finally:
+            # reports the result's stats to the listeners
+            cursor.close()
+
+    def _execute_batch(self, cursor, statements):
+        columns = []
+        for num, statement in enumerate(statements):
+            if isinstance(statement, _basestring):
+                query, params = statement, None
+            else:
+                query, params = statement
+            query = query.strip().rstrip(';')
+            if not _select.match(query):
+                raise psycopg2.ProgrammingError(
+                        "execute_batch() accepts only SELECT statements")
+            if params is not None:
+                query = cursor.mogrify(query, params)
+                if not isinstance(query, _basestring):
+                    query = query.decode(
+                            psycopg2.extensions.encodings[self.encoding])
+            columns.append('(%s) as "%d"' % (query, num))
+        if not columns:
+            return []
+        cursor.execute("select " + ", ".join(columns))
+        return list(cursor.fetchone())
+
+    def _set_output_format(self, cursor, nested, query=None):
+        """Ensure the OutputFormat is correct for the given cursor.
+
+        If a ``query`` is given, and :attr:`.pipeline_output_format`
+        is set, returns the query with the "set" prepended; the caller
+        then marks the format as applied once the query succeeds.
+        Otherwise the "set" is run here, and the query is returned
+        unchanged.
+
+        """
+        if nested is self._nested:
+            return query
+
+        stmt = _output_format_sql(nested)
+        self.output_format_switches += 1
+        stats = getattr(cursor, '_akiban_stats', None)
+        if stats is not None:
+            stats.output_format_switches += 1
+
+        # the format is unknown until the "set" succeeds.
+        self._nested = None
+
+        if query is not None and cursor.name is None and (
+                    self.pipeline_output_format or
+                    self.adaptive_output_format):
+            return stmt + ";\n" + query
+
+        # a named cursor can only be executed once, so
+        # use a plain cursor here.
+        setter = self._super_cursor()
+        setter.execute(stmt)
+        setter.close()
+        self._nested = nested
+        return query
+
 # TODO: need to get per-connection adapters going
 # (or get akiban to recognize bool, easier)
 psycopg2.extensions.register_adapter(
@@ -0,0 +1,63 @@
+"""Compare a result without nested columns decoded from JSON with the
+same result run in "table" output format by the adaptive mode, and
+by a plain psycopg2 cursor.
+
+Runs psycopg2 against the fake server in tests/fakeserver.py.  Only
+``fetchall()`` is timed; psycopg2 has received the rows by then, and
+converts them, or hands over their JSON to be decoded, as they're
+fetched.
+
+    python bench/adaptive_format.py [rows] [width]
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psycopg2
+
+from akiban.psycopg2 import Connection
+from bench import payloads
+from tests.fakeserver import FakeAkibanServer
+
+STATEMENT = "select wide_rows"
+
+
+def _run(connection, nested):
+    cursor = connection.cursor(nested=nested)
+    cursor.execute(STATEMENT)
+    now = timeit.default_timer()
+    cursor.fetchall()
+    elapsed = timeit.default_timer() - now
+    cursor.close()
+    return elapsed
+
+
+def main(argv):
+    rows, width = [int(arg) for arg in (argv + [5000, 20][len(argv):])]
+    payload = payloads.wide_rows(rows=rows, width=width)
+    server = FakeAkibanServer()
+    server.add_result(STATEMENT, payload.metadata, payload.documents)
+    server.start()
+    try:
+        connection = psycopg2.connect(host="127.0.0.1", port=server.port,
+                                connection_factory=Connection)
+        print("%d rows of %d columns" % (rows, width))
+        print("%-10s %10s" % ("mode", "rows/s"))
+        for mode in ("json", "adaptive", "plain"):
+            connection.adaptive_output_format = mode == "adaptive"
+            nested = mode != "plain"
+            # the first run of a statement finds out its shape
+            _run(connection, nested)
+            elapsed = min(_run(connection, nested) for i in range(3))
+            print("%-10s %10.0f" % (mode, rows / elapsed))
+        connection.close()
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
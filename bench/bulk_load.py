@@ -0,0 +1,89 @@
+"""Compare loading a customers / orders / items group with one
+``executemany()`` per table, i.e. a statement per row, with
+:class:`akiban.load.GroupLoader`.
+
+Runs psycopg2 against the fake server in tests/fakeserver.py, which
+accepts and discards the inserts, so the times are those of the
+client and the round trips over the loopback interface.
+
+    python bench/bulk_load.py [customers] [orders] [items] [chunk size]
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psycopg2
+
+from akiban.load import GroupLoader, Table
+from akiban.psycopg2 import Connection
+from bench import payloads
+from tests.fakeserver import FakeAkibanServer
+
+
+def _executemany(connection, documents):
+    cursor = connection.cursor(nested=False)
+    customers, orders, items = [], [], []
+    for customer in documents:
+        customers.append((customer["customer0"], customer["customer1"],
+                            customer["customer2"]))
+        for order in customer["orders"]:
+            orders.append((order["order0"], customer["customer0"],
+                            order["order1"], order["order2"]))
+            for item in order["items"]:
+                items.append((item["item0"], order["order0"],
+                            item["item1"], item["item2"]))
+    cursor.executemany(
+            "INSERT INTO customers VALUES (%s, %s, %s)", customers)
+    cursor.executemany(
+            "INSERT INTO orders VALUES (%s, %s, %s, %s)", orders)
+    cursor.executemany(
+            "INSERT INTO items VALUES (%s, %s, %s, %s)", items)
+    connection.commit()
+    cursor.close()
+
+
+def _loader(connection, documents, chunk_size):
+    group = Table("customers", children=[
+                Table("orders", parent_columns=["customer0"], children=[
+                    Table("items", parent_columns=["order0"])
+                ])
+            ])
+    GroupLoader(connection, group, chunk_size=chunk_size).load(documents)
+
+
+def main(argv):
+    customers, orders, items, chunk_size = [
+        int(arg) for arg in (argv + [1000, 5, 3, 500][len(argv):])]
+    payload = payloads.customers_orders_items(customers, orders, items)
+    rows = customers * (1 + orders * (1 + items))
+
+    server = FakeAkibanServer()
+    server.start()
+    try:
+        connection = psycopg2.connect(host="127.0.0.1", port=server.port,
+                                connection_factory=Connection)
+        print("%d customers x %d orders x %d items, %d rows" % (
+                customers, orders, items, rows))
+        print("%-14s %10s %12s" % ("method", "rows/s", "statements"))
+        for name, fn in (
+                ("executemany", lambda: _executemany(
+                                    connection, payload.documents)),
+                ("GroupLoader", lambda: _loader(
+                            connection, payload.documents, chunk_size))):
+            before = len(server.statements)
+            now = timeit.default_timer()
+            fn()
+            elapsed = timeit.default_timer() - now
+            print("%-14s %10.0f %12d" % (name, rows / elapsed,
+                                len(server.statements) - before))
+        connection.close()
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
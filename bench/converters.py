@@ -0,0 +1,78 @@
+"""Compare the per-connection fast converters with psycopg2's
+typecasters, per value, for each type oid they cover.
+
+Requires psycopg2 for its typecasters; no server is needed.
+
+    python bench/converters.py [calls]
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban.psycopg2 import Psycopg2ResultContext, fast_converters
+from bench import payloads
+
+VALUES = [
+    (payloads.INTEGER, 12345),
+    (payloads.VARCHAR, u"some order info"),
+    (16, True),
+    (payloads.DATE, u"1982-07-16"),
+    (1083, u"17:24:12"),
+    (payloads.TIMESTAMP, u"2012-09-05 17:24:12"),
+    (payloads.DECIMAL, 9.99),
+]
+
+
+class _Cursor(object):
+    arraysize = 1
+
+
+def _time(convert, value, calls):
+    if convert is None:
+        return None
+    convert(value)
+    now = timeit.default_timer()
+    for i in range(calls):
+        convert(value)
+    return timeit.default_timer() - now
+
+
+def main(argv):
+    calls, = [int(arg) for arg in (argv + [200000][len(argv):])]
+    metadata = payloads.wide_rows(rows=1).metadata_row
+
+    fast = Psycopg2ResultContext(_Cursor(), metadata)
+    # an empty table sends every oid to psycopg2, as before
+    adapted = Psycopg2ResultContext(_Cursor(), metadata, converters={})
+
+    print("%d calls per value" % calls)
+    print("%-6s %-12s %14s %14s %8s" %
+            ("oid", "type", "psycopg2 ns", "fast ns", "speedup"))
+    for oid, value in VALUES:
+        adapted.typecast(value, oid)
+        before = _time(adapted.converter(oid), value, calls)
+        after = _time(fast.converter(oid), value, calls)
+        if oid not in fast_converters:
+            kind = "(psycopg2)"
+        else:
+            kind = type(fast.typecast(value, oid)).__name__
+
+        def ns(elapsed):
+            if elapsed is None:
+                return "%14s" % "pass"
+            return "%14.1f" % (elapsed / calls * 1e9)
+
+        if before and after:
+            speedup = "%7.1fx" % (before / after)
+        else:
+            speedup = "%8s" % "-"
+        print("%-6d %-12s %s %s %s" %
+                (oid, kind, ns(before), ns(after), speedup))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,120 @@
+"""Load test the whole Connection / Cursor path against the fake
+server in tests/fakeserver.py, with no Akiban Server needed.
+
+    python bench/end_to_end.py [--rows 2000] [--depth 2] [--fanout 5]
+            [--columns 4] [--latency 0.001] [--profile MODE]
+
+A generated result of the given size and depth is fetched and
+decoded in each of several ways, every nested row included.  For
+each, the time of ``execute()``, of the first row, and of the whole
+result are reported, with rows per second counting nested rows.
+The server encodes its response once, before timing, but runs in
+this process, so its sending of rows is part of what's measured.
+
+With ``--profile``, the given mode is run once more under cProfile,
+and its busiest functions printed.
+
+"""
+from __future__ import print_function
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psycopg2
+
+from akiban.api import NestedCursor
+from akiban.psycopg2 import Connection
+from tests.fakeserver import FakeAkibanServer
+
+SQL = "select generated"
+
+MODES = [
+    ("eager", {}),
+    ("lazy", {"lazy": True}),
+    ("stream", {"stream": True}),
+    ("named", {"name": "bench"}),
+    ("prefetch", {"name": "bench", "prefetch": 2}),
+    ("record", {"row_factory": "record"}),
+]
+
+
+def _walk(rows):
+    count = 0
+    for row in rows:
+        count += 1
+        for value in row:
+            if isinstance(value, NestedCursor):
+                count += _walk(value.fetchall())
+    return count
+
+
+def run(connection, options):
+    options = dict(options)
+    prefetch = options.pop("prefetch", 0)
+    cursor = connection.cursor(**options)
+    cursor.itersize = cursor.arraysize = 500
+    start = timeit.default_timer()
+    cursor.execute(SQL)
+    if prefetch:
+        cursor.prefetch(prefetch)
+    executed = timeit.default_timer()
+    first = cursor.fetchone()
+    first_row = timeit.default_timer()
+    count = _walk([first]) + _walk(cursor)
+    end = timeit.default_timer()
+    cursor.close()
+    connection.rollback()
+    return executed - start, first_row - start, end - start, count
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--columns", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=.001)
+    parser.add_argument("--profile", choices=[name for name, o in MODES])
+    args = parser.parse_args(argv)
+
+    server = FakeAkibanServer()
+    server.add_generated(SQL, rows=args.rows, depth=args.depth,
+                            fanout=args.fanout, columns=args.columns)
+    server.start()
+    try:
+        connection = psycopg2.connect(host="127.0.0.1", port=server.port,
+                                connection_factory=Connection)
+        # encode the response before the latency is added
+        run(connection, {})
+        server.latency = args.latency
+
+        print("%d rows, depth %d, fanout %d, %d columns, "
+                "%.1f ms per round trip" % (
+                    args.rows, args.depth, args.fanout, args.columns,
+                    args.latency * 1000))
+        print("%-10s %12s %12s %10s %12s" % (
+                "mode", "execute ms", "first ms", "total s", "rows/s"))
+        for name, options in MODES:
+            results = [run(connection, options) for i in range(3)]
+            execute, first, total, count = min(
+                            results, key=lambda result: result[2])
+            print("%-10s %12.2f %12.2f %10.3f %12.0f" % (
+                    name, execute * 1000, first * 1000, total,
+                    count / total))
+
+        if args.profile:
+            profile = cProfile.Profile()
+            profile.runcall(run, connection, dict(MODES)[args.profile])
+            pstats.Stats(profile).sort_stats("cumulative").print_stats(25)
+        connection.close()
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
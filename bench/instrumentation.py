@@ -0,0 +1,53 @@
+"""Measure the cost of collecting execution statistics when decoding
+nested rows, against decoding without them.
+
+Requires psycopg2 for its typecasters; no server is needed.
+
+    python bench/instrumentation.py [customers] [orders] [items]
+
+Without a listener on the connection, no statistics object is
+created, and the decoders are the same as before statistics
+existed; the "off" line is that path.
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban.impl import _filter_row, ExecuteStats
+from akiban.psycopg2 import Psycopg2ResultContext
+from bench import payloads
+
+
+class _Cursor(object):
+    arraysize = 1
+
+
+def run(payload, stats):
+    ctx = Psycopg2ResultContext(_Cursor(), payload.metadata_row,
+                                    stats=stats)
+    now = timeit.default_timer()
+    for row in payload.rows:
+        _filter_row(row, ctx)
+    return timeit.default_timer() - now
+
+
+def main(argv):
+    customers, orders, items = [
+        int(arg) for arg in (argv + [5000, 5, 3][len(argv):])]
+    payload = payloads.customers_orders_items(customers, orders, items)
+    run(payload, None)
+
+    print("%d customers x %d orders x %d items" %
+            (customers, orders, items))
+    off = min(run(payload, None) for i in range(3))
+    on = min(run(payload, ExecuteStats("select")) for i in range(3))
+    print("off: %.3fs" % off)
+    print("on:  %.3fs (%+.1f%%)" % (on, (on / off - 1) * 100))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
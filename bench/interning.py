@@ -0,0 +1,71 @@
+"""Measure the memory held by decoded rows, and the time to decode
+them, with and without interning of text values.
+
+Requires psycopg2 for its typecasters; no server is needed.  Memory
+is measured with tracemalloc, so requires Python 3.
+
+    python bench/interning.py [customers] [orders] [distinct values]
+
+Orders have three text columns with few distinct values, and one
+with a different value per order, on which interning gives up once
+``intern_limit`` values are seen.  Each row is parsed and decoded,
+as when fetched; what's measured is what the decoded rows hold on
+to, once their parsed documents are gone.
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import gc
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban.psycopg2 import Psycopg2ResultContext
+from bench import payloads
+
+
+class _Cursor(object):
+    arraysize = 1
+
+
+def run(payload, intern_strings, trace):
+    ctx = Psycopg2ResultContext(_Cursor(), payload.metadata_row,
+                                intern_strings=intern_strings)
+    decode = ctx.decoder
+    loads = ctx.loads
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    now = timeit.default_timer()
+    rows = [decode(loads(row[0])) for row in payload.rows]
+    elapsed = timeit.default_timer() - now
+    if trace:
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        size = None
+    del rows
+    return elapsed, size
+
+
+def main(argv):
+    customers, orders, distinct = [
+        int(arg) for arg in (argv + [20000, 20, 10][len(argv):])]
+    payload = payloads.repeated_values(customers, orders, distinct)
+    del payload.documents[:]
+
+    print("%d customers x %d orders, %d distinct values" % (
+                customers, orders, distinct))
+    print("%-22s %10s %10s" % ("intern_strings", "seconds", "MB"))
+    for intern_strings in (False, True, ["status", "currency"]):
+        elapsed = min(run(payload, intern_strings, False)[0]
+                        for i in range(3))
+        size = run(payload, intern_strings, True)[1]
+        print("%-22s %10.3f %10.1f" % (
+                intern_strings, elapsed, size / 1048576.0))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,53 @@
+"""Compare the installed JSON backends on deeply nested documents,
+both parsing alone and through the full row decode.
+
+Requires psycopg2 for its typecasters; no server is needed.
+
+    python bench/json_backends.py [rows] [depth] [fanout]
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban import impl
+from akiban.psycopg2 import Psycopg2ResultContext
+from bench import payloads
+
+
+class _Cursor(object):
+    arraysize = 1
+
+
+def _time(fn, rows):
+    now = time.time()
+    for row in rows:
+        fn(row)
+    return time.time() - now
+
+
+def main(argv):
+    count, depth, fanout = [
+        int(arg) for arg in (argv + [200, 4, 4][len(argv):])]
+    payload = payloads.deep_nesting(count, depth, fanout)
+    metadata, rows, size = payload.metadata_row, payload.rows, payload.nbytes
+
+    print("%d rows, depth %d, fanout %d, %.1f MB of JSON" %
+            (count, depth, fanout, size / 1048576.0))
+    print("%-10s %12s %12s" % ("backend", "parse MB/s", "decode rows/s"))
+    for name in sorted(impl._json_backends):
+        loads = impl.get_json_loads(name)
+        parse = _time(lambda row: loads(row[0]), rows)
+
+        ctx = Psycopg2ResultContext(_Cursor(), metadata, loads=loads)
+        impl._filter_row(rows[0], ctx)
+        decode = _time(lambda row: impl._filter_row(row, ctx), rows)
+        print("%-10s %12.1f %12.1f" %
+                (name, size / 1048576.0 / parse, count / decode))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,55 @@
+"""Compare eager and lazy nested cursors when only a few
+nested rowsets are actually read.
+
+Requires psycopg2 for its typecasters; no server is needed.
+
+    python bench/lazy_nested.py [customers] [orders] [items] [every]
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban.impl import _filter_row
+from akiban.psycopg2 import Psycopg2ResultContext
+from bench import payloads
+
+
+class _Cursor(object):
+    arraysize = 1
+
+
+def run(payload, rows, lazy, every):
+    ctx = Psycopg2ResultContext(
+                _Cursor(), payload.metadata_row, lazy=lazy)
+    now = time.time()
+    for num, row in enumerate(rows):
+        row = _filter_row(row, ctx)
+        if num % every == 0:
+            for order in row[3].fetchall():
+                order[3].fetchall()
+    return time.time() - now
+
+
+def main(argv):
+    customers, orders, items, every = [
+        int(arg) for arg in (argv + [2000, 10, 5, 20][len(argv):])]
+    payload = payloads.customers_orders_items(customers, orders, items)
+    rows = payload.rows
+
+    # warm up the adapter cache
+    run(payload, rows[0:1], False, 1)
+
+    eager = run(payload, rows, False, every)
+    lazy = run(payload, rows, True, every)
+    print("%d customers x %d orders x %d items, reading every %dth "
+            "customer's orders" % (customers, orders, items, every))
+    print("eager: %.3fs" % eager)
+    print("lazy:  %.3fs (%.1fx)" % (lazy, eager / lazy))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
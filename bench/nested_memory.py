@@ -0,0 +1,63 @@
+"""Measure the memory held by decoded rows with many small nested
+groups, per row and per nested cursor.
+
+Requires psycopg2 for its typecasters; no server is needed.  Memory
+is measured with tracemalloc, so requires Python 3.
+
+    python bench/nested_memory.py [customers] [orders]
+
+Each customer has ``orders`` orders, of one item each, then again of
+no items, so that the nested cursors outnumber the values they hold.
+The JSON documents are parsed before measuring; what's measured is
+what the decoded rows hold on to, nested cursors included.
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import gc
+import json
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban.psycopg2 import Psycopg2ResultContext
+from bench import payloads
+
+
+class _Cursor(object):
+    arraysize = 1
+
+
+def run(payload):
+    ctx = Psycopg2ResultContext(_Cursor(), payload.metadata_row)
+    documents = [json.loads(row[0]) for row in payload.rows]
+    decode = ctx.decoder
+    decode(documents[0])
+    gc.collect()
+    tracemalloc.start()
+    rows = [decode(document) for document in documents]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+    return size
+
+
+def main(argv):
+    customers, orders = [
+        int(arg) for arg in (argv + [20000, 10][len(argv):])]
+
+    print("%d customers x %d orders" % (customers, orders))
+    print("%-10s %10s %14s %12s" %
+            ("items", "MB", "bytes/customer", "bytes/cursor"))
+    for items in (1, 0):
+        payload = payloads.customers_orders_items(customers, orders, items)
+        size = run(payload)
+        cursors = customers * (orders + 1)
+        print("%-10d %10.1f %14.0f %12.0f" % (
+                items, size / 1048576.0, size / float(customers),
+                size / float(cursors)))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,97 @@
+"""Measure how decoding nested rows across a process pool scales with
+the number of workers, against decoding in process.
+
+Requires psycopg2 for its typecasters, and Python 3 for
+concurrent.futures; no server is needed.
+
+    python bench/parallel_decode.py [customers] [chunksize] [max workers]
+
+Each chunk of JSON texts is pickled out to a worker, and its
+decoded rows pickled back, so with small documents or too few
+CPUs the pickling costs more than the decoding it spreads out.
+The "ceiling" line is the best speedup possible with unlimited
+CPUs: decoding in process, divided by the work left to the
+parent process - unpickling the rows and rebuilding nested cursors.
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import functools
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban.impl import _filter_row, _parallel_decode
+from akiban.psycopg2 import Psycopg2ResultContext, _decode_chunk
+from bench import payloads
+
+
+class _Cursor(object):
+    arraysize = 1
+
+
+class _Done(object):
+    """Stands in for a pool whose workers have already decoded
+    every chunk."""
+
+    def __init__(self, results):
+        self.results = results
+
+    def map(self, fn, chunks):
+        return iter(self.results)
+
+
+def _serial(ctx, rows):
+    return [_filter_row(row, ctx) for row in rows]
+
+
+def _best(fn, *arg):
+    return min(timeit.repeat(lambda: fn(*arg), number=1, repeat=3))
+
+
+def main(argv):
+    customers, chunksize, max_workers = [
+        int(arg) for arg in (argv + [20000, 1000, os.cpu_count() or 1]
+                                [len(argv):])]
+    payload = payloads.customers_orders_items(customers, 5, 3)
+    rows = payload.rows
+    ctx = Psycopg2ResultContext(_Cursor(), payload.metadata_row)
+    decode_chunk = functools.partial(_decode_chunk, (
+                        payload.metadata_row[0], None, False,
+                        tuple(sorted(ctx.converters.items()))))
+    _serial(ctx, rows[0:10])
+
+    print("%d customers, %d nested rows, %.1f MB of JSON, "
+            "chunks of %d, %d CPUs" % (
+                customers, payload.nested_rows,
+                payload.nbytes / 1048576.0, chunksize,
+                os.cpu_count() or 1))
+    serial = _best(_serial, ctx, rows)
+    print("%-12s %10s %10s" % ("workers", "rows/s", "speedup"))
+    print("%-12s %10.0f %10s" % ("in process", customers / serial, "-"))
+
+    done = _Done([
+        decode_chunk([row[0] for row in rows[i:i + chunksize]])
+        for i in range(0, len(rows), chunksize)
+    ])
+    parent = _best(_parallel_decode, rows, ctx, done,
+                        decode_chunk, chunksize)
+    print("%-12s %10.0f %9.2fx" % (
+            "ceiling", customers / parent, serial / parent))
+
+    workers = 1
+    while workers <= max_workers:
+        with ProcessPoolExecutor(workers) as executor:
+            # start the workers up front
+            list(executor.map(abs, range(workers)))
+            elapsed = _best(_parallel_decode, rows, ctx, executor,
+                            decode_chunk, chunksize)
+        print("%-12d %10.0f %9.2fx" % (
+                workers, customers / elapsed, serial / elapsed))
+        workers *= 2
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
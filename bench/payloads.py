@@ -0,0 +1,175 @@
+"""Synthetic ``json_with_meta_data`` results.
+
+Each generator returns a :class:`.Payload`, whose ``rows`` are what
+psycopg2 would hand to :mod:`akiban.impl` - the metadata row first,
+then one single-column row per top level JSON document.
+
+"""
+import json
+
+INTEGER = 23
+VARCHAR = 1043
+DATE = 1082
+TIMESTAMP = 1114
+DECIMAL = 1700
+
+_values = {
+    INTEGER: lambda i: i,
+    VARCHAR: lambda i: "value number %d" % i,
+    DATE: lambda i: "1982-07-16",
+    TIMESTAMP: lambda i: "2012-09-05 17:24:12",
+    DECIMAL: lambda i: 9.99,
+}
+
+_types = [INTEGER, VARCHAR, DATE, TIMESTAMP, DECIMAL]
+
+
+class Payload(object):
+    def __init__(self, name, metadata, documents):
+        self.name = name
+        self.metadata = metadata
+        self.documents = documents
+        self.metadata_row = (json.dumps(metadata), )
+        self.rows = [(json.dumps(doc), ) for doc in documents]
+        self.nbytes = sum(len(row[0]) for row in self.rows)
+        self.nrows = len(self.rows)
+        self.nested_rows = sum(_count_nested(doc) for doc in documents)
+
+
+def _count_nested(document):
+    count = 0
+    for value in document.values():
+        if isinstance(value, list):
+            count += len(value)
+            for child in value:
+                count += _count_nested(child)
+    return count
+
+
+def _columns(prefix, types):
+    return [
+        {"name": "%s%d" % (prefix, num), "oid": oid}
+        for num, oid in enumerate(types)
+    ]
+
+
+def _document(columns, ident):
+    return dict(
+        (col['name'], _values[col['oid']](ident))
+        for col in columns
+        if 'oid' in col
+    )
+
+
+def wide_rows(rows=5000, width=100):
+    """Many columns, no nesting."""
+
+    columns = _columns("col", [_types[i % len(_types)]
+                                for i in range(width)])
+    return Payload("wide_rows", columns, [
+        _document(columns, i) for i in range(rows)
+    ])
+
+
+def deep_nesting(rows=500, depth=5, fanout=2):
+    """Every row nests ``depth`` levels, with ``fanout`` rows
+    at each level."""
+
+    def metadata(level):
+        columns = _columns("l%d_" % level, _types)
+        if level < depth:
+            columns.append(
+                {"name": "children", "columns": metadata(level + 1)})
+        return columns
+
+    def document(columns, level, ident):
+        doc = _document(columns, ident)
+        if level < depth:
+            doc["children"] = [
+                document(columns[-1]["columns"], level + 1,
+                            ident * fanout + i)
+                for i in range(fanout)
+            ]
+        return doc
+
+    columns = metadata(0)
+    return Payload("deep_nesting", columns, [
+        document(columns, 0, i) for i in range(rows)
+    ])
+
+
+def _customers_orders(name, rows, orders, items):
+    item_columns = _columns("item", [INTEGER, DECIMAL, INTEGER])
+    order_columns = _columns("order", [INTEGER, VARCHAR, TIMESTAMP])
+    customer_columns = _columns("customer", [INTEGER, VARCHAR, DATE])
+    order_columns.append({"name": "items", "columns": item_columns})
+    customer_columns.append({"name": "orders", "columns": order_columns})
+
+    def order(ident):
+        doc = _document(order_columns, ident)
+        doc["items"] = [
+            _document(item_columns, ident * items + i)
+            for i in range(items)
+        ]
+        return doc
+
+    def customer(ident):
+        doc = _document(customer_columns, ident)
+        doc["orders"] = [order(ident * orders + i) for i in range(orders)]
+        return doc
+
+    return Payload(name, customer_columns, [
+        customer(i) for i in range(rows)
+    ])
+
+
+def large_groups(rows=5, orders=10000):
+    """A few customers, each with a great many orders."""
+
+    return _customers_orders("large_groups", rows, orders, 1)
+
+
+def many_small_groups(rows=20000):
+    """Many customers, each with one order of one item."""
+
+    return _customers_orders("many_small_groups", rows, 1, 1)
+
+
+def customers_orders_items(rows=2000, orders=10, items=5):
+    """The customers / orders / items example from the README."""
+
+    return _customers_orders("customers_orders_items", rows, orders, items)
+
+
+def repeated_values(rows=2000, orders=50, distinct=10):
+    """Customers whose orders have text columns with ``distinct``
+    values between them, such as status and currency codes, as well
+    as a column whose every value is different."""
+
+    order_columns = [
+        {"name": "order_id", "oid": INTEGER},
+        {"name": "status", "oid": VARCHAR},
+        {"name": "currency", "oid": VARCHAR},
+        {"name": "category", "oid": VARCHAR},
+        {"name": "note", "oid": VARCHAR},
+    ]
+    customer_columns = [
+        {"name": "customer_id", "oid": INTEGER},
+        {"name": "title", "oid": VARCHAR},
+        {"name": "orders", "columns": order_columns},
+    ]
+
+    def order(ident):
+        return {
+            "order_id": ident,
+            "status": "status %d" % (ident % distinct),
+            "currency": "currency %d" % (ident % 3),
+            "category": "category number %d" % (ident % distinct),
+            "note": "order note %d" % ident,
+        }
+
+    return Payload("repeated_values", customer_columns, [
+        {"customer_id": i, "title": "Software Engineer",
+            "orders": [order(i * orders + o) for o in range(orders)]}
+        for i in range(rows)
+    ])
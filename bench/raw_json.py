@@ -0,0 +1,108 @@
+"""Compare fetching the JSON of nested results as bytes, passed
+straight to the JSON parser, with having psycopg2 decode it into a
+string first, on multi-megabyte group documents.
+
+Runs psycopg2 against the fake server in tests/fakeserver.py.  Only
+the fetches are timed, as that's where psycopg2 converts the column
+values; nested cursors are lazy, so the time is that of the string
+conversion and JSON parsing alone.  Rows are fetched one at a time
+and discarded, so the peak is that of a single group.
+
+Each run is made with ASCII text, and again with accented and CJK
+text, which psycopg2 decodes into larger, slower to build strings.
+
+    python bench/raw_json.py [groups] [orders per group] [backend]
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import gc
+import json
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import psycopg2
+
+from akiban.psycopg2 import Connection
+from bench import payloads
+from tests.fakeserver import FakeAkibanServer
+
+
+def _fetch(connection, raw, trace):
+    connection.raw_json = raw
+    cursor = connection.cursor(lazy=True)
+    cursor.execute("select groups")
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    now = timeit.default_timer()
+    for row in iter(cursor.fetchone, None):
+        pass
+    elapsed = timeit.default_timer() - now
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        peak = None
+    cursor.close()
+    return elapsed, peak
+
+
+def _unicode(payload):
+    for document in payload.documents:
+        for order in document["orders"]:
+            order["order1"] = u"dr\xf4le m\u2019a r\xe9veill\xe9 " \
+                        u"\u4e2d\u6587 %s" % order["order0"]
+    return payloads.Payload(payload.name, payload.metadata,
+                                payload.documents)
+
+
+def main(argv):
+    groups, orders = [
+        int(arg) for arg in (argv[0:2] + [10, 20000][len(argv[0:2]):])]
+    backend = argv[2] if len(argv) > 2 else None
+
+    payload = payloads.large_groups(rows=groups, orders=orders)
+    server = FakeAkibanServer()
+    server.start()
+    try:
+        connection = psycopg2.connect(host="127.0.0.1", port=server.port,
+                                connection_factory=Connection)
+        connection.json_backend = backend
+        print("%d groups of %d orders, %s backend" % (
+                groups, orders, backend or "default"))
+        print("%-8s %-6s %10s %14s" %
+                ("text", "json", "MB/s", "peak memory"))
+        for text in ("ascii", "unicode"):
+            if text == "unicode":
+                payload = _unicode(payload)
+            server.add_result("select groups",
+                            payload.metadata, payload.documents)
+            size = sum(
+                len(json.dumps(doc, ensure_ascii=False).encode('utf-8'))
+                for doc in payload.documents)
+            for raw in (False, True):
+                elapsed = min(_fetch(connection, raw, False)[0]
+                                for i in range(3))
+                if tracemalloc is not None:
+                    peak = "%11.1f MB" % (
+                            _fetch(connection, raw, True)[1] / 1048576.0)
+                else:
+                    peak = "%14s" % "-"
+                print("%-8s %-6s %10.1f %s" % (
+                        text, "bytes" if raw else "str",
+                        size / 1048576.0 / elapsed, peak))
+        connection.close()
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,93 @@
+"""Compare the time and memory of decoding rows, at every level,
+into each kind of row of ``row_factory``, with decoding tuples and
+converting them to dictionaries afterwards by zipping each with
+its ``description``.
+
+Requires psycopg2 for its typecasters; no server is needed.  Memory
+is measured with tracemalloc, so requires Python 3.
+
+    python bench/row_factory.py [customers]
+
+Memory is the peak while decoding and fetching every row; nested
+cursors let go of their rows once fetched, while the dictionaries
+of "tuple+zip" are held alongside the rows they're made from.
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import gc
+import json
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban.api import NestedCursor
+from akiban.psycopg2 import Psycopg2ResultContext
+from bench import payloads
+
+
+class _Cursor(object):
+    arraysize = 1
+
+
+def _fetch(rows):
+    # fetch every nested row, as an application would
+    for row in rows:
+        for value in (row.values() if isinstance(row, dict) else row):
+            if isinstance(value, NestedCursor):
+                _fetch(value.fetchall())
+    return rows
+
+
+def _zip(rows, description):
+    names = [column[0] for column in description]
+    return [
+        dict((name, _zip(value.fetchall(), value.description)
+                        if isinstance(value, NestedCursor) else value)
+                for name, value in zip(names, row))
+        for row in rows
+    ]
+
+
+def run(payload, documents, mode, trace):
+    ctx = Psycopg2ResultContext(_Cursor(), payload.metadata_row,
+                    row_factory=None if mode == "tuple+zip" else mode)
+    decode = ctx.decoder
+    decode(documents[0])
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    now = timeit.default_timer()
+    rows = [decode(document) for document in documents]
+    if mode == "tuple+zip":
+        rows = _zip(rows, ctx.description)
+    else:
+        _fetch(rows)
+    elapsed = timeit.default_timer() - now
+    size = None
+    if trace:
+        size = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    del rows
+    return elapsed, size
+
+
+def main(argv):
+    customers, = [int(arg) for arg in (argv + [20000][len(argv):])]
+    payload = payloads.customers_orders_items(customers, 5, 3)
+    documents = [json.loads(row[0]) for row in payload.rows]
+
+    print("%d customers, %d nested rows" % (
+                customers, payload.nested_rows))
+    print("%-12s %10s %10s" % ("rows", "seconds", "peak MB"))
+    for mode in ("tuple", "tuple+zip", "dict", "namedtuple", "record"):
+        elapsed = min(run(payload, documents, mode, False)[0]
+                        for i in range(3))
+        size = run(payload, documents, mode, True)[1]
+        print("%-12s %10.3f %10.1f" % (mode, elapsed, size / 1048576.0))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,68 @@
+"""Compare peak memory and time, eager versus streamed, when reading
+one very large group in batches.
+
+Requires psycopg2 for its typecasters; no server is needed.  Peak
+memory is measured with tracemalloc, so requires Python 3.
+
+    python bench/streaming.py [orders] [batch size]
+
+"""
+from __future__ import print_function
+
+import sys
+import os
+import gc
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from akiban.impl import _filter_row
+from akiban.psycopg2 import Psycopg2ResultContext
+from bench import payloads
+
+
+class _Cursor(object):
+    def __init__(self, arraysize):
+        self.arraysize = arraysize
+
+
+def run(payload, stream, batch, trace):
+    ctx = Psycopg2ResultContext(
+                _Cursor(batch), payload.metadata_row, stream=stream)
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    now = timeit.default_timer()
+    for row in payload.rows:
+        orders = _filter_row(row, ctx)[3]
+        while orders.fetchmany():
+            pass
+    elapsed = timeit.default_timer() - now
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        peak = None
+    return elapsed, peak
+
+
+def main(argv):
+    orders, batch = [
+        int(arg) for arg in (argv + [200000, 100][len(argv):])]
+    payload = payloads.large_groups(rows=1, orders=orders)
+    del payload.documents[:]
+    run(payload, False, batch, False)
+
+    print("one group of %d orders, %.1f MB of JSON, batches of %d" %
+            (orders, payload.nbytes / 1048576.0, batch))
+    print("%-8s %10s %14s" % ("mode", "seconds", "peak memory"))
+    for stream in (False, True):
+        elapsed = run(payload, stream, batch, False)[0]
+        peak = run(payload, stream, batch, True)[1]
+        print("%-8s %10.3f %11.1f MB" % (
+                "stream" if stream else "eager", elapsed,
+                peak / 1048576.0))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,295 @@
+"""Benchmark suite for the nested result decode pipeline.
+
+Feeds the synthetic payloads of :mod:`bench.payloads` through
+``_fields_from_row()``, ``_filter_row()``, the ``NestedCursor``
+fetch methods and ``Psycopg2ResultContext.typecast()``, without a
+server.  Requires psycopg2 for its typecasters.
+
+    python bench/suite.py [--scale 0.1] [--json results.json]
+                          [--compare baseline.json --threshold 0.2]
+
+Each benchmark reports rows (or calls) per second, and the peak
+memory allocated during a separate run where ``tracemalloc`` is
+available.  With ``--json``, results are written out; with ``--compare``, each
+benchmark is checked against a previous ``--json`` output, and the
+exit status is nonzero if any got slower than the threshold.
+
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from akiban import impl
+from akiban.api import NestedCursor
+from akiban.psycopg2 import Psycopg2ResultContext
+from bench import payloads
+
+SCENARIOS = [
+    (payloads.wide_rows, 5000),
+    (payloads.deep_nesting, 500),
+    (payloads.large_groups, 5),
+    (payloads.many_small_groups, 20000),
+]
+
+TYPECAST_VALUES = [
+    (payloads.INTEGER, 12345),
+    (payloads.VARCHAR, u"some order info"),
+    (payloads.DATE, u"1982-07-16"),
+    (payloads.TIMESTAMP, u"2012-09-05 17:24:12"),
+    (payloads.DECIMAL, u"9.99"),
+]
+
+
+class _Cursor(object):
+    arraysize = 10
+
+
+def _context(payload, loads):
+    return Psycopg2ResultContext(_Cursor(), payload.metadata_row,
+                                        loads=loads)
+
+
+def _measure(fn, arg, trace=False):
+    """Run fn(arg), returning (seconds, peak bytes allocated).
+
+    Tracing allocations slows things down considerably, so the peak
+    is only measured when ``trace`` is set, and the time is then
+    not meaningful.
+
+    """
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    now = timeit.default_timer()
+    try:
+        fn(arg)
+        elapsed = timeit.default_timer() - now
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+        else:
+            peak = None
+    finally:
+        if trace:
+            tracemalloc.stop()
+    return elapsed, peak
+
+
+def _drain(cursor, fetch):
+    for row in fetch(cursor):
+        for col in row:
+            if isinstance(col, NestedCursor):
+                _drain(col, fetch)
+
+_fetch_styles = {
+    'fetchall': lambda cursor: cursor.fetchall(),
+    'fetchmany': lambda cursor: iter(
+                    lambda: cursor.fetchmany(), []),
+    'fetchone': lambda cursor: iter(cursor.fetchone, None),
+}
+
+
+def _nothing():
+    return None
+
+
+def bench_fields(payload, loads):
+    calls = 1000
+
+    def go(arg):
+        for i in range(calls):
+            impl._fields_from_row(payload.metadata_row, loads=loads)
+    return calls, _nothing, go
+
+
+def bench_filter_row(payload, loads):
+    ctx = _context(payload, loads)
+    impl._filter_row(payload.rows[0], ctx)
+
+    def go(arg):
+        filter_row = impl._filter_row
+        for row in payload.rows:
+            filter_row(row, ctx)
+    return payload.nrows + payload.nested_rows, _nothing, go
+
+
+def _bench_fetch(style):
+    def bench(payload, loads):
+        ctx = _context(payload, loads)
+        fetch = _fetch_styles[style]
+
+        def setup():
+            return [impl._filter_row(row, ctx) for row in payload.rows]
+
+        def go(decoded):
+            for row in decoded:
+                for col in row:
+                    if isinstance(col, NestedCursor):
+                        _drain(col, fetch)
+        return payload.nested_rows, setup, go
+    bench.__name__ = "bench_%s" % style
+    return bench
+
+
+def _bench_typecast(ctx, oid, value, calls):
+    typecast = ctx.typecast
+    typecast(value, oid)
+
+    def go(arg):
+        for i in range(calls):
+            typecast(value, oid)
+    return "typecast_%d" % oid, calls, _nothing, go
+
+
+def bench_typecast(loads):
+    ctx = Psycopg2ResultContext(
+                _Cursor(), (json.dumps(
+                    [{"name": "x", "oid": payloads.INTEGER}]), ),
+                loads=loads)
+    return [
+        _bench_typecast(ctx, oid, value, 20000)
+        for oid, value in TYPECAST_VALUES
+    ]
+
+
+BENCHMARKS = [
+    bench_fields,
+    bench_filter_row,
+    _bench_fetch('fetchall'),
+    _bench_fetch('fetchmany'),
+    _bench_fetch('fetchone'),
+]
+
+
+def _run(name, count, setup, fn, repeat, memory):
+    elapsed = min(
+        _measure(fn, setup())[0]
+        for i in range(repeat)
+    )
+    if memory and tracemalloc is not None:
+        peak = _measure(fn, setup(), trace=True)[1]
+    else:
+        peak = None
+    return {
+        "name": name,
+        "count": count,
+        "seconds": elapsed,
+        "per_sec": count / elapsed if elapsed else None,
+        "peak_bytes": peak,
+    }
+
+
+def run(scale=1.0, repeat=3, only=None, backend=None, memory=True):
+    loads = impl.get_json_loads(backend)
+    for scenario, rows in SCENARIOS:
+        if only and scenario.__name__ not in only:
+            continue
+        payload = scenario(rows=max(1, int(rows * scale)))
+        for bench in BENCHMARKS:
+            count, setup, fn = bench(payload, loads)
+            if not count:
+                continue
+            name = "%s.%s" % (payload.name,
+                            bench.__name__[len("bench_"):])
+            result = _run(name, count, setup, fn, repeat, memory)
+            result["json_bytes"] = payload.nbytes
+            yield result
+
+    if not only or "typecast" in only:
+        for name, count, setup, fn in bench_typecast(loads):
+            yield _run(name, count, setup, fn, repeat, memory)
+
+
+def compare(results, baseline, threshold):
+    """Return the names of benchmarks which are more than ``threshold``
+    slower than in ``baseline``."""
+
+    previous = dict(
+        (result["name"], result) for result in baseline["results"])
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if before and before["per_sec"] and result["per_sec"]:
+            change = result["per_sec"] / before["per_sec"] - 1
+            result["change"] = change
+            if change < -threshold:
+                regressions.append(result["name"])
+    return regressions
+
+
+def _format(result):
+    if result["peak_bytes"] is not None:
+        peak = "%10.1f MB" % (result["peak_bytes"] / 1048576.0)
+    else:
+        peak = "%13s" % "-"
+    line = "%-40s %14.0f/s %s" % (result["name"], result["per_sec"], peak)
+    if "change" in result:
+        line += " %+7.1f%%" % (result["change"] * 100)
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scale", type=float, default=1.0,
+                help="multiply the number of rows in each scenario")
+    parser.add_argument("--repeat", type=int, default=3,
+                help="run each benchmark this many times, keeping the best")
+    parser.add_argument("--only", action="append",
+                help="run only the given scenario, or 'typecast'; "
+                    "may be given more than once")
+    parser.add_argument("--backend", help="JSON backend to use")
+    parser.add_argument("--no-memory", action="store_true",
+                help="don't measure peak memory")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare",
+                help="compare against results written by --json")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                help="slowdown, as a fraction, counted as a regression")
+    options = parser.parse_args(argv)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as file_:
+            baseline = json.load(file_)
+
+    print("%-40s %16s %13s" % ("benchmark", "rows or calls", "peak memory"))
+    results = []
+    for result in run(options.scale, options.repeat, options.only,
+                            options.backend, not options.no_memory):
+        if baseline:
+            compare([result], baseline, options.threshold)
+        print(_format(result))
+        results.append(result)
+
+    if options.json:
+        with open(options.json, "w") as file_:
+            json.dump({
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "backend": options.backend,
+                "scale": options.scale,
+                "results": results,
+            }, file_, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print("\nslower by more than %d%%: %s" %
+                    (options.threshold * 100, ", ".join(regressions)))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,395 @@
+"""A stand-in for Akiban Server, speaking just enough of the
+Postgresql wire protocol for psycopg2 to connect and run simple
+queries against canned results.
+
+    server = FakeAkibanServer()
+    server.add_result("select customer_id from customers",
+                [{"name": "customer_id", "oid": 23}],
+                [{"customer_id": 1}, {"customer_id": 2}])
+    server.start()
+    connection = psycopg2.connect(host="127.0.0.1", port=server.port,
+                            connection_factory=Connection)
+
+Like Akiban, results are delivered as JSON after
+``set OutputFormat='json_with_meta_data'``, and as ordinary rows in
+the default ``table`` format, where nested results are an error.
+The rows of a named cursor are in the format current at each FETCH.
+
+Registered statements may also be combined into one, as
+``execute_batch()`` does::
+
+    select (<statement>) as "0", (<statement>) as "1"
+
+whose result is one row, with each statement's result as a nested
+column.  If ``latency`` is given, each query message is answered
+that many seconds late, as if from across a network.
+
+For load testing, :meth:`.FakeAkibanServer.add_generated` registers
+a synthetic result of a given size and depth::
+
+    server = FakeAkibanServer(latency=.001)
+    server.add_generated("select groups", rows=10000, depth=2, fanout=5)
+
+Responses are encoded once per statement and output format, so that
+the server adds little to what's measured on the client.
+
+"""
+import json
+import re
+import socket
+import struct
+import threading
+import time
+
+_SSL_REQUEST = 80877103
+_CANCEL_REQUEST = 80877102
+
+_declare = re.compile(
+            r'DECLARE "(\w+)" CURSOR (?:WITH|WITHOUT) HOLD FOR (.*)$', re.S)
+_fetch = re.compile(r'FETCH FORWARD (\d+|ALL) FROM "(\w+)"$')
+_close = re.compile(r'CLOSE "(\w+)"$')
+_set_format = re.compile(r"set OutputFormat\s*=\s*'(\w+)'$", re.I)
+
+
+class FakeError(Exception):
+    pass
+
+
+class Result(object):
+    def __init__(self, tag, columns=None, rows=()):
+        self.tag = tag
+        self.columns = columns
+        self.rows = rows
+        self._messages = None
+
+    def messages(self):
+        if self._messages is None:
+            self._messages = b"".join(_result_messages(self))
+        return self._messages
+
+
+class Session(object):
+    """State for one client connection."""
+
+    def __init__(self):
+        self.output_format = 'table'
+        self.transaction = False
+        self.portals = {}
+
+
+class FakeAkibanServer(object):
+
+    def __init__(self, latency=0):
+        self.results = {}
+        self.statements = []
+        self.queries = 0
+        self.cancels = 0
+        self.latency = latency
+        self._sock = None
+        # encoded results, keyed on statement and output format
+        self._encoded = {}
+
+    def add_result(self, sql, metadata, documents):
+        """Register the result for a SQL string.
+
+        :param metadata: the Akiban metadata document; a list of
+         ``{"name": ..., "oid": ...}`` for plain columns and
+         ``{"name": ..., "columns": [...]}`` for nested ones.
+        :param documents: list of row documents, as dictionaries.
+
+        """
+        self.results[sql] = (metadata, documents)
+        self._encoded.clear()
+
+    def add_generated(self, sql, rows=100, depth=2, fanout=3, columns=4):
+        """Register a synthetic result for a SQL string, returning its
+        metadata and documents; see :func:`.generate`."""
+
+        metadata, documents = generate(rows, depth, fanout, columns)
+        self.add_result(sql, metadata, documents)
+        return metadata, documents
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(64)
+        self.port = self._sock.getsockname()[1]
+        self._spawn(self._accept)
+
+    def stop(self):
+        self._sock.close()
+
+    def _spawn(self, fn, *arg):
+        thread = threading.Thread(target=fn, args=arg)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, addr = self._sock.accept()
+            except Exception:
+                return
+            self._spawn(self._serve, conn)
+
+    def _serve(self, conn):
+        try:
+            if not self._startup(conn):
+                return
+            session = Session()
+            while True:
+                type_ = _recv(conn, 1)
+                length, = struct.unpack("!i", _recv(conn, 4))
+                body = _recv(conn, length - 4)
+                if type_ == b"X":
+                    return
+                elif type_ == b"Q":
+                    self.queries += 1
+                    if self.latency:
+                        time.sleep(self.latency)
+                    conn.sendall(self._query(
+                            session, body[:-1].decode('utf-8')))
+        except EOFError:
+            pass
+        finally:
+            conn.close()
+
+    def _startup(self, conn):
+        while True:
+            length, code = struct.unpack("!ii", _recv(conn, 8))
+            _recv(conn, length - 8)
+            if code == _SSL_REQUEST:
+                conn.sendall(b"N")
+            elif code == _CANCEL_REQUEST:
+                # counted, but the query runs to completion.  Note
+                # psycopg2's cancel() holds the GIL until answered,
+                # so needs the server to be in another process.
+                self.cancels += 1
+                return False
+            else:
+                break
+        out = [_message(b"R", struct.pack("!i", 0))]
+        for key, value in [
+                        ("server_version", "8.4.7"),
+                        ("client_encoding", "UTF8"),
+                        ("DateStyle", "ISO, MDY"),
+                        ("integer_datetimes", "on"),
+                        ("standard_conforming_strings", "on")]:
+            out.append(_message(b"S", _cstring(key) + _cstring(value)))
+        out.append(_message(b"K", struct.pack("!ii", 1, 1)))
+        out.append(_message(b"Z", b"I"))
+        conn.sendall(b"".join(out))
+        return True
+
+    def _query(self, session, sql):
+        out = []
+        for stmt in sql.split(";\n"):
+            stmt = stmt.strip()
+            if not stmt:
+                continue
+            self.statements.append(stmt)
+            try:
+                result = self._execute(session, stmt)
+            except FakeError as err:
+                out.append(_message(b"E",
+                            b"SERROR\0C42000\0M" + _cstring(str(err)) + b"\0"))
+                break
+            out.append(result.messages())
+        out.append(_message(b"Z", b"T" if session.transaction else b"I"))
+        return b"".join(out)
+
+    def _execute(self, session, stmt):
+        upper = stmt.upper()
+        if upper in ("BEGIN", "COMMIT", "ROLLBACK"):
+            session.transaction = upper == "BEGIN"
+            return Result(upper)
+
+        match = _set_format.match(stmt)
+        if match:
+            session.output_format = match.group(1)
+            return Result("SET")
+
+        match = _declare.match(stmt)
+        if match:
+            self._execute(session, match.group(2))
+            session.portals[match.group(1)] = [match.group(2), 0]
+            return Result("DECLARE CURSOR")
+
+        match = _fetch.match(stmt)
+        if match:
+            # like Akiban, rows are delivered in the output format
+            # current at each FETCH.  The position counts the metadata
+            # row of the JSON formats, which "table" counts as sent.
+            portal = session.portals[match.group(2)]
+            query, pos = portal
+            result = self._execute(session, query)
+            skipped = 0
+            if session.output_format == 'table':
+                skipped = 1
+                pos = max(pos - 1, 0)
+            if match.group(1) == "ALL":
+                end = len(result.rows)
+            else:
+                end = pos + int(match.group(1))
+            rows = result.rows[pos:end]
+            portal[1] = pos + len(rows) + skipped
+            return Result("FETCH %d" % len(rows), result.columns, rows)
+
+        match = _close.match(stmt)
+        if match:
+            del session.portals[match.group(1)]
+            return Result("CLOSE CURSOR")
+
+        if upper.startswith("INSERT"):
+            return Result("INSERT 0 1")
+
+        key = (stmt, session.output_format)
+        try:
+            return self._encoded[key]
+        except KeyError:
+            pass
+        try:
+            metadata, documents = self.results[stmt]
+        except KeyError:
+            metadata, documents = self._batch(stmt)
+
+        if session.output_format == 'table':
+            if any('columns' in col for col in metadata):
+                raise FakeError("nested result sets are not allowed "
+                                "in table output format")
+            rows = [
+                tuple(_text(doc[col['name']]) for col in metadata)
+                for doc in documents
+            ]
+            columns = [(col['name'], col['oid']) for col in metadata]
+        else:
+            # like Akiban, send non-ASCII text as UTF-8, not escaped
+            rows = [(json.dumps(metadata, ensure_ascii=False), )] + [
+                        (json.dumps(doc, ensure_ascii=False), )
+                        for doc in documents]
+            columns = [("JSON", 25)]
+        result = self._encoded[key] = Result(
+                            "SELECT %d" % len(rows), columns, rows)
+        return result
+
+
+    def _batch(self, stmt):
+        """Return the metadata and documents of a combined statement;
+        see the module docstring."""
+
+        pos = len("select ")
+        metadata, document = [], {}
+        candidates = sorted(self.results, key=len, reverse=True)
+        while stmt.startswith("select (") and pos < len(stmt):
+            for sql in candidates:
+                if stmt.startswith("(%s) as \"" % sql, pos):
+                    pos += len(sql) + 7
+                    break
+            else:
+                break
+            end = stmt.find('"', pos)
+            name = stmt[pos:end]
+            columns, documents = self.results[sql]
+            metadata.append({"name": name, "columns": columns})
+            document[name] = documents
+            pos = end + 1
+            if stmt.startswith(", ", pos):
+                pos += 2
+            elif pos == len(stmt):
+                return metadata, [document]
+        raise FakeError("no result registered for %r" % stmt)
+
+
+# INTEGER, VARCHAR, DATE, DECIMAL
+_generated_types = [
+    (23, lambda level, ident: ident),
+    (1043, lambda level, ident: u"l%d value %d" % (level, ident)),
+    (1082, lambda level, ident: u"2012-09-%02d" % (ident % 28 + 1)),
+    (1700, lambda level, ident: ident % 1000 + .25),
+]
+
+def generate(rows=100, depth=2, fanout=3, columns=4):
+    """Return the metadata and documents of a synthetic result.
+
+    There are ``rows`` top level rows, each of which has ``fanout``
+    rows nested under it, and so on ``depth`` levels down; with a
+    depth of 0 the result has no nested columns, so may also be
+    served in ``table`` format.   Each level has ``columns`` plain
+    columns, named ``l<level>_c<n>``, cycling through INTEGER,
+    VARCHAR, DATE and DECIMAL; the first numbers the rows of the
+    level from 0, across parents.  The nested column is
+    ``l<level>_children``.
+
+    """
+    counters = [0] * (depth + 1)
+
+    def level_metadata(level):
+        metadata = [
+            {"name": "l%d_c%d" % (level, num),
+                "oid": _generated_types[num % len(_generated_types)][0]}
+            for num in range(columns)
+        ]
+        if level < depth:
+            metadata.append({"name": "l%d_children" % level,
+                            "columns": level_metadata(level + 1)})
+        return metadata
+
+    def document(level):
+        ident = counters[level]
+        counters[level] += 1
+        doc = dict(
+            ("l%d_c%d" % (level, num),
+                _generated_types[num % len(_generated_types)][1](
+                                                    level, ident))
+            for num in range(columns)
+        )
+        if level < depth:
+            doc["l%d_children" % level] = [
+                document(level + 1) for i in range(fanout)]
+        return doc
+
+    return level_metadata(0), [document(0) for i in range(rows)]
+
+
+def _recv(conn, size):
+    buf = b""
+    while len(buf) < size:
+        chunk = conn.recv(size - len(buf))
+        if not chunk:
+            raise EOFError()
+        buf += chunk
+    return buf
+
+def _message(type_, payload):
+    return type_ + struct.pack("!i", len(payload) + 4) + payload
+
+def _cstring(value):
+    return value.encode('utf-8') + b"\0"
+
+def _text(value):
+    if value is None:
+        return None
+    elif value is True or value is False:
+        return value and 't' or 'f'
+    else:
+        return u"%s" % (value, )
+
+def _result_messages(result):
+    if result.columns is not None:
+        payload = [struct.pack("!h", len(result.columns))]
+        for name, oid in result.columns:
+            payload.append(_cstring(name) +
+                        struct.pack("!ihihih", 0, 0, oid, -1, -1, 0))
+        yield _message(b"T", b"".join(payload))
+
+        for row in result.rows:
+            payload = [struct.pack("!h", len(row))]
+            for value in row:
+                if value is None:
+                    payload.append(struct.pack("!i", -1))
+                else:
+                    value = value.encode('utf-8')
+                    payload.append(struct.pack("!i", len(value)) + value)
+            yield _message(b"D", b"".join(payload))
+    yield _message(b"C", _cstring(result.tag))
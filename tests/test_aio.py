@@ -0,0 +1,232 @@
+import sys
+import unittest
+import datetime
+import multiprocessing
+from nose import SkipTest
+from .fakeserver import FakeAkibanServer
+
+if sys.version_info < (3, 5):
+    raise SkipTest("asyncio support requires Python 3.5")
+
+try:
+    import psycopg2
+except ImportError:
+    raise SkipTest("psycopg2 is not installed")
+
+import asyncio
+import akiban
+from akiban import aio
+
+NESTED = "select customer_id, orders from customers"
+PLAIN = "select customer_id, name from customers"
+
+METADATA = [
+    {"name": "customer_id", "oid": 23},
+    {"name": "orders", "columns": [
+        {"name": "order_id", "oid": 23},
+        {"name": "order_date", "oid": 1114},
+    ]}
+]
+
+DOCUMENTS = [
+    {"customer_id": 1, "name": "David McFarlane", "orders": [
+        {"order_id": 101, "order_date": "2012-09-05 17:24:12"},
+        {"order_id": 102, "order_date": "2012-09-05 17:24:12"},
+    ]},
+    {"customer_id": 2, "name": "Ori Herrnstadt", "orders": [
+        {"order_id": 104, "order_date": "2012-09-05 17:24:12"},
+    ]},
+]
+
+DATE = datetime.datetime(2012, 9, 5, 17, 24, 12)
+
+
+def _server(latency=0):
+    server = FakeAkibanServer(latency=latency)
+    server.add_result(NESTED, METADATA, DOCUMENTS)
+    server.add_result(PLAIN,
+                [{"name": "customer_id", "oid": 23},
+                {"name": "name", "oid": 1043}],
+                DOCUMENTS)
+    return server
+
+def _serve(pipe, latency):
+    server = _server(latency)
+    server.start()
+    pipe.send(server.port)
+    # until the test is done
+    pipe.recv()
+    server.stop()
+
+
+class AsyncTest(unittest.TestCase):
+
+    @classmethod
+    def setup_class(cls):
+        cls.server = _server()
+        cls.server.start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def _connect(self):
+        return self._run(aio.connect(host="127.0.0.1",
+                            port=self.server.port, loop=self.loop))
+
+    def _collect(self, aiterable):
+        rows = []
+        iterator = aiterable.__aiter__()
+        while True:
+            try:
+                rows.append(self._run(iterator.__anext__()))
+            except StopAsyncIteration:
+                return rows
+
+    def test_fetchall_nested(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        self._run(cursor.execute(NESTED))
+        self.assertEquals(
+            cursor.description,
+            [
+                ('customer_id', 23, None, None, None, None, None),
+                ('orders', akiban.NESTED_CURSOR,
+                            None, None, None, None, None),
+            ]
+        )
+        rows = self._run(cursor.fetchall())
+        self.assertEquals(
+            [(row[0], row[1].fetchall()) for row in rows],
+            [
+                (1, [(101, DATE), (102, DATE)]),
+                (2, [(104, DATE)]),
+            ]
+        )
+        conn.close()
+
+    def test_typecaster(self):
+        # timestamptz has no fast converter, so goes to psycopg2
+        sql = "select customer_id, created from customers"
+        self.server.add_result(sql,
+                    [{"name": "customer_id", "oid": 23},
+                    {"name": "orders", "columns": [
+                        {"name": "created", "oid": 1184}]}],
+                    [{"customer_id": 1, "orders": [
+                        {"created": "2012-09-05 17:24:12+00"}]}])
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.arraysize = 5
+        self._run(cursor.execute(sql))
+        orders = self._run(cursor.fetchone())[1]
+        self.assertEquals(orders.arraysize, 5)
+        created, = orders.fetchone()
+        self.assertEquals(created.replace(tzinfo=None), DATE)
+        self.assertEquals(created.utcoffset(), datetime.timedelta(0))
+        conn.close()
+
+    def test_rowcount(self):
+        conn = self._connect()
+        for nested in (True, False):
+            cursor = conn.cursor(nested=nested)
+            self._run(cursor.execute(NESTED if nested else PLAIN))
+            self.assertEquals(cursor.rowcount, 2)
+        conn.close()
+
+    def test_cancelled_execute(self):
+        # psycopg2's cancel() holds the GIL until the server answers,
+        # so the server is run in another process
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_serve, args=(child, .3))
+        process.start()
+        try:
+            port = parent.recv()
+            conn = self._run(aio.connect(host="127.0.0.1", port=port,
+                                        loop=self.loop))
+            cursor = conn.cursor()
+            self.assertRaises(asyncio.TimeoutError, self._run,
+                        asyncio.wait_for(cursor.execute(NESTED), .1))
+            # waits for the cancelled statement, then runs
+            self._run(cursor.execute(NESTED))
+            self.assertEquals(
+                [row[0] for row in self._run(cursor.fetchall())], [1, 2])
+
+            plain = conn.cursor(nested=False)
+            self._run(plain.execute(PLAIN))
+            self.assertEquals(plain.rowcount, 2)
+            conn.close()
+        finally:
+            parent.send(None)
+            process.join()
+
+    def test_fetchone_fetchmany(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        self._run(cursor.execute(NESTED))
+        self.assertEquals(self._run(cursor.fetchone())[0], 1)
+        self.assertEquals(
+            [row[0] for row in self._run(cursor.fetchmany(5))], [2])
+        self.assertEquals(self._run(cursor.fetchone()), None)
+        conn.close()
+
+    def test_async_for(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        self._run(cursor.execute(NESTED))
+        self.assertEquals(
+            [(row[0], self._collect(row[1]))
+                for row in self._collect(cursor)],
+            [
+                (1, [(101, DATE), (102, DATE)]),
+                (2, [(104, DATE)]),
+            ]
+        )
+        conn.close()
+
+    def test_plain_cursor(self):
+        conn = self._connect()
+        nested = conn.cursor()
+        plain = conn.cursor(nested=False)
+        self._run(plain.execute(PLAIN))
+        self.assertEquals(self._run(plain.fetchall()),
+                    [(1, 'David McFarlane'), (2, 'Ori Herrnstadt')])
+        self._run(nested.execute(NESTED))
+        self.assertEquals(self._run(nested.fetchone())[0], 1)
+        self.assertEquals(conn.output_format_switches, 1)
+        conn.close()
+
+    def test_plain_cursor_rejects_nested(self):
+        conn = self._connect()
+        plain = conn.cursor(nested=False)
+        self.assertRaises(
+            psycopg2.ProgrammingError,
+            self._run, plain.execute(NESTED)
+        )
+        conn.close()
+
+    def test_concurrent(self):
+        conns = [self._connect() for i in range(5)]
+
+        # several statements on each connection, all at once
+        cursors = [conn.cursor() for conn in conns for i in range(4)]
+        self._run(asyncio.gather(*[
+                    cursor.execute(NESTED) for cursor in cursors]))
+        for cursor in cursors:
+            rows = self._run(cursor.fetchall())
+            self.assertEquals(
+                [row[1].fetchall() for row in rows],
+                [[(101, DATE), (102, DATE)], [(104, DATE)]]
+            )
+        for conn in conns:
+            conn.close()
@@ -5,6 +5,40 @@ from akiban import api
 NUMBER = object()
 STRING = object()
 
+class _CountingList(list):
+    """A list which counts the elements its slices copy, and its
+    deletions remove or move, along with lists sliced from it."""
+
+    def __init__(self, rows, moved):
+        super(_CountingList, self).__init__(rows)
+        self.moved = moved
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return list.__getitem__(self, index)
+        rows = _CountingList(list.__getitem__(self, index), self.moved)
+        self.moved[0] += len(rows)
+        return rows
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start = index.indices(len(self))[0]
+        else:
+            start = index % len(self)
+        self.moved[0] += len(self) - start
+        list.__delitem__(self, index)
+
+    def pop(self, index=-1):
+        self.moved[0] += len(self) - index % len(self)
+        return list.pop(self, index)
+
+    # Python 2 slices lists through these
+    def __getslice__(self, i, j):
+        return self.__getitem__(slice(i, j))
+
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(i, j))
+
 class NestedCursorTest(unittest.TestCase):
     def _fixture(self):
         from akiban.api import NestedCursor
@@ -23,7 +57,7 @@ class NestedCursorTest(unittest.TestCase):
         )
         cursor._rows.extend(
             [
-                (i, "row%d" % i) for i in xrange(20)
+                (i, "row%d" % i) for i in range(20)
             ]
         )
         return cursor
@@ -41,9 +75,9 @@ class NestedCursorTest(unittest.TestCase):
     def test_fetchone(self):
         cursor = self._fixture()
         self.assertEquals(
-            [cursor.fetchone() for i in xrange(22)],
+            [cursor.fetchone() for i in range(22)],
             [
-                (i, "row%d" % i) for i in xrange(20)
+                (i, "row%d" % i) for i in range(20)
             ] + [None, None]
         )
 
@@ -52,7 +86,7 @@ class NestedCursorTest(unittest.TestCase):
         self.assertEquals(
             cursor.fetchall(),
             [
-                (i, "row%d" % i) for i in xrange(20)
+                (i, "row%d" % i) for i in range(20)
             ]
         )
 
@@ -61,22 +95,71 @@ class NestedCursorTest(unittest.TestCase):
         self.assertEquals(
             cursor.fetchmany(5),
             [
-                (i, "row%d" % i) for i in xrange(5)
+                (i, "row%d" % i) for i in range(5)
             ]
         )
         self.assertEquals(
             cursor.fetchmany(),
             [
-                (i, "row%d" % i) for i in xrange(5, 17)
+                (i, "row%d" % i) for i in range(5, 17)
             ]
         )
         self.assertEquals(
             cursor.fetchmany(10),
             [
-                (i, "row%d" % i) for i in xrange(17, 20)
+                (i, "row%d" % i) for i in range(17, 20)
+            ]
+        )
+
+
+    def test_iterate(self):
+        cursor = self._fixture()
+        self.assertEquals(
+            list(cursor),
+            [
+                (i, "row%d" % i) for i in range(20)
             ]
         )
+        self.assertEquals(list(cursor), [])
+
+    def test_rownumber_rowcount(self):
+        cursor = self._fixture()
+        self.assertEquals(cursor.rowcount, 20)
+        self.assertEquals(cursor.rownumber, 0)
+        cursor.fetchone()
+        self.assertEquals(cursor.rownumber, 1)
+        cursor.fetchmany(5)
+        self.assertEquals(cursor.rownumber, 6)
+        next(cursor)
+        self.assertEquals(cursor.rownumber, 7)
+        cursor.fetchall()
+        self.assertEquals(cursor.rownumber, 20)
+        self.assertEquals(cursor.rowcount, 20)
+
+    def test_fetchmany_scales_linearly(self):
+        cursor = self._fixture()
+        moved = [0]
+        cursor._rows = _CountingList(
+                    ((i, "row") for i in range(50000)), moved)
+        while cursor.fetchmany(10):
+            pass
+        # each row is copied out once, and dropped once; a quadratic
+        # fetchmany() would move the remaining rows on every call
+        self.assertTrue(moved[0] <= 2 * 50000, moved[0])
 
+    def test_lazy_fetchmany(self):
+        cursor = self._fixture()
+        rows = list(cursor._rows)
+        del cursor._rows[:]
+        cursor._loader = lambda: rows
+        self.assertEquals(
+            cursor.fetchmany(5),
+            [
+                (i, "row%d" % i) for i in range(5)
+            ]
+        )
+        self.assertEquals(cursor._loader, None)
+        self.assertEquals(len(cursor.fetchall()), 15)
 
     def test_description(self):
         cursor = self._fixture()
@@ -0,0 +1,198 @@
+"""End to end tests of the psycopg2 Connection and Cursor, against
+generated results from the fake server in tests/fakeserver.py."""
+
+import unittest
+import datetime
+import decimal
+import threading
+import time
+from nose import SkipTest
+from akiban.api import NestedCursor
+
+try:
+    import psycopg2
+except ImportError:
+    raise SkipTest("psycopg2 is not installed")
+
+from .fakeserver import FakeAkibanServer
+
+_convert = {
+    23: int,
+    1043: lambda value: value,
+    1082: lambda value: datetime.date(*[int(part)
+                                        for part in value.split('-')]),
+    1700: lambda value: decimal.Decimal(repr(value)),
+}
+
+def _expected(metadata, documents):
+    return [
+        tuple(
+            _expected(col['columns'], doc[col['name']])
+            if 'columns' in col
+            else _convert[col['oid']](doc[col['name']])
+            for col in metadata
+        )
+        for doc in documents
+    ]
+
+def _expand(rows):
+    return [
+        tuple(
+            _expand(value.fetchall())
+            if isinstance(value, NestedCursor) else value
+            for value in row
+        )
+        for row in rows
+    ]
+
+
+class EndToEndTest(unittest.TestCase):
+
+    @classmethod
+    def setup_class(cls):
+        cls.server = FakeAkibanServer()
+        cls.deep = cls.server.add_generated("select deep",
+                                    rows=60, depth=3, fanout=3)
+        cls.flat = cls.server.add_generated("select flat",
+                                    rows=500, depth=0, columns=6)
+        cls.server.start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.connection = self._connect()
+
+    def tearDown(self):
+        self.server.latency = 0
+        self.connection.close()
+
+    def _connect(self):
+        from akiban.psycopg2 import Connection
+        return psycopg2.connect(host="127.0.0.1", port=self.server.port,
+                                connection_factory=Connection)
+
+    def _fetch(self, sql, **kw):
+        cursor = self.connection.cursor(**kw)
+        cursor.execute(sql)
+        return _expand(cursor.fetchall())
+
+    def test_nested(self):
+        expected = _expected(*self.deep)
+        self.assertEquals(len(expected), 60)
+        self.assertEquals(self._fetch("select deep"), expected)
+        self.assertEquals(self._fetch("select deep", lazy=True), expected)
+        self.assertEquals(self._fetch("select deep", stream=True),
+                        expected)
+
+    def test_flat(self):
+        expected = _expected(*self.flat)
+        self.assertEquals(self._fetch("select flat"), expected)
+        self.assertEquals(self._fetch("select flat", nested=False),
+                        expected)
+
+        self.connection.adaptive_output_format = True
+        for i in range(2):
+            self.assertEquals(self._fetch("select flat"), expected)
+
+    def test_fetch_columns(self):
+        cursor = self.connection.cursor()
+        cursor.execute("select deep")
+        levels = cursor.fetch_columns()
+        self.assertEquals(
+            [level.rowcount for level in levels.values()],
+            [60, 180, 540, 1620])
+        self.assertEquals(
+            list(levels[('l0_children', 'l1_children',
+                        'l2_children')].columns['l3_c0'][0:3]),
+            [0, 1, 2])
+
+    def test_named_cursor_round_trips(self):
+        self.server.latency = .02
+        cursor = self.connection.cursor(name="c")
+        cursor.itersize = 20
+        cursor.execute("select flat")
+        queries = self.server.queries
+        now = time.time()
+        rows = [row for row in cursor]
+        elapsed = time.time() - now
+        self.assertEquals(rows, _expected(*self.flat))
+        # 25 batches, and the empty one which ends them
+        self.assertEquals(self.server.queries - queries, 26)
+        self.assertTrue(elapsed >= 26 * .02, elapsed)
+
+    def _iterate_slowly(self, prefetch):
+        cursor = self.connection.cursor(name="c%d" % prefetch)
+        cursor.itersize = 50
+        cursor.execute("select flat")
+        cursor.prefetch(prefetch)
+        now = time.time()
+        for rows in iter(lambda: cursor.fetchmany(50), []):
+            time.sleep(.03)
+        elapsed = time.time() - now
+        cursor.close()
+        self.connection.rollback()
+        return elapsed
+
+    def test_prefetch_overlaps_latency(self):
+        self.server.latency = .03
+        sequential = self._iterate_slowly(0)
+        prefetched = self._iterate_slowly(2)
+        self.assertTrue(prefetched < sequential * .8,
+                        (prefetched, sequential))
+
+    def test_prefetch_with_plain_cursor(self):
+        # the named cursor's batches are fetched in "json" format from
+        # the prefetch thread, while this thread switches to "table"
+        self.server.latency = .005
+        expected = _expected(*self.flat)
+        cursor = self.connection.cursor(name="c")
+        cursor.itersize = 50
+        cursor.execute("select flat")
+        cursor.prefetch(2)
+        plain = self.connection.cursor(nested=False)
+        rows = []
+        for batch in iter(lambda: cursor.fetchmany(50), []):
+            rows.extend(batch)
+            plain.execute("select flat")
+            self.assertEquals(plain.fetchall(), expected)
+        self.assertEquals(rows, expected)
+        cursor.close()
+
+    def test_named_cursor_format_switched_before_fetch(self):
+        # another cursor switches to "table" between the DECLARE of
+        # the named cursor and its first FETCH
+        cursor = self.connection.cursor(name="c")
+        plain = self.connection.cursor(nested=False)
+        setup_description = cursor._setup_description
+
+        def switch_first(*arg):
+            plain.execute("select flat")
+            plain.fetchall()
+            return setup_description(*arg)
+        cursor._setup_description = switch_first
+        cursor.execute("select flat")
+        self.assertEquals(cursor.fetchall(), _expected(*self.flat))
+        cursor.close()
+
+    def test_concurrent_connections(self):
+        expected = _expected(*self.deep)
+        results = []
+
+        def fetch():
+            connection = self._connect()
+            try:
+                for i in range(3):
+                    cursor = connection.cursor()
+                    cursor.execute("select deep")
+                    results.append(_expand(cursor.fetchall()) == expected)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=fetch) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(results, [True] * 12)
@@ -0,0 +1,913 @@
+import unittest
+import json
+import time
+from nose import SkipTest
+from akiban import impl, api
+
+
+METADATA = [
+    {"name": "customer_id", "oid": 23},
+    {"name": "name", "oid": 1043},
+    {"name": "orders", "columns": [
+        {"name": "order_id", "oid": 23},
+        {"name": "order_info", "oid": 1043},
+        {"name": "items", "columns": [
+            {"name": "item_id", "oid": 23},
+            {"name": "price", "oid": 1700},
+        ]}
+    ]}
+]
+
+DOCUMENTS = [
+    {"customer_id": 1, "name": "David McFarlane", "orders": [
+        {"order_id": 101, "order_info": "apple related", "items": [
+            {"item_id": 1001, "price": 9.99},
+            {"item_id": 1002, "price": 19.99},
+        ]},
+        {"order_id": 102, "order_info": "apple related", "items": [
+            {"item_id": 1003, "price": 9.99},
+        ]},
+    ]},
+    {"customer_id": 2, "name": "Ori Herrnstadt", "orders": []},
+]
+
+
+class FakeCursor(object):
+    arraysize = 12
+
+
+class FakeResultContext(impl.AkibanResultContext):
+    """A result context which 'typecasts' by tagging decimal values,
+    counting calls."""
+
+    def __init__(self, metadata=METADATA, **kw):
+        super(FakeResultContext, self).__init__(
+                    FakeCursor(), (json.dumps(metadata),), **kw)
+        self.typecast_calls = 0
+
+    def gen_description(self, fields):
+        return [
+            (rec['name'], rec['type_oid'], None, None, None, None, None)
+            for rec in fields
+        ]
+
+    def typecast(self, value, oid):
+        self.typecast_calls += 1
+        if oid == 1700:
+            return ("decimal", value)
+        else:
+            return value
+
+
+class FakeStream(object):
+    """Produces raw JSON rows on demand via fetchmany(), tracking
+    how many have been handed out."""
+
+    def __init__(self, count):
+        self.count = count
+        self.fetched = 0
+
+    def fetchmany(self, size):
+        size = min(size, self.count - self.fetched)
+        self.fetched += size
+        return [
+            (json.dumps({"customer_id": i, "name": "c%d" % i, "orders": []}),)
+            for i in range(self.fetched - size, self.fetched)
+        ]
+
+
+def _rows(documents=DOCUMENTS):
+    return [(json.dumps(doc),) for doc in documents]
+
+def _expand(value):
+    if isinstance(value, api.NestedCursor):
+        return [_expand(row) for row in value.fetchall()]
+    elif isinstance(value, tuple):
+        return tuple(_expand(col) for col in value)
+    else:
+        return value
+
+
+class RowDecoderTest(unittest.TestCase):
+
+    def test_filter_row(self):
+        ctx = FakeResultContext()
+        rows = [_expand(impl._filter_row(row, ctx)) for row in _rows()]
+        self.assertEquals(
+            rows,
+            [
+                (1, "David McFarlane", [
+                    (101, "apple related", [
+                        (1001, ("decimal", 9.99)),
+                        (1002, ("decimal", 19.99)),
+                    ]),
+                    (102, "apple related", [
+                        (1003, ("decimal", 9.99)),
+                    ]),
+                ]),
+                (2, "Ori Herrnstadt", []),
+            ]
+        )
+
+    def test_filter_none(self):
+        ctx = FakeResultContext()
+        self.assertEquals(impl._filter_row(None, ctx), None)
+
+    def test_decoder_compiled_once(self):
+        ctx = FakeResultContext()
+        impl._filter_row(_rows()[0], ctx)
+        decoder = ctx.decoder
+        impl._filter_row(_rows()[1], ctx)
+        self.assertTrue(ctx.decoder is decoder)
+
+    def test_nested_cursor_description(self):
+        ctx = FakeResultContext()
+        row = impl._filter_row(_rows()[0], ctx)
+        orders = row[2]
+        self.assertEquals(orders.arraysize, 12)
+        self.assertEquals(
+            orders.description,
+            [
+                ("order_id", 23, None, None, None, None, None),
+                ("order_info", 1043, None, None, None, None, None),
+                ("items", api.NESTED_CURSOR, None, None, None, None, None),
+            ]
+        )
+        self.assertEquals(
+            orders.fetchone()[2].description,
+            [
+                ("item_id", 23, None, None, None, None, None),
+                ("price", 1700, None, None, None, None, None),
+            ]
+        )
+
+    def test_passthrough_converter(self):
+        class PassthroughContext(FakeResultContext):
+            def converter(self, oid):
+                if oid == 1700:
+                    return super(PassthroughContext, self).converter(oid)
+                return None
+
+        ctx = PassthroughContext()
+        rows = [_expand(impl._filter_row(row, ctx)) for row in _rows()]
+        self.assertEquals(rows[0][2][0][2], [
+                        (1001, ("decimal", 9.99)),
+                        (1002, ("decimal", 19.99)),
+                    ])
+        self.assertEquals(ctx.typecast_calls, 3)
+
+    def test_lazy_nested(self):
+        ctx = FakeResultContext()
+        ctx.lazy = True
+        row = impl._filter_row(_rows()[0], ctx)
+        # customer_id, name
+        self.assertEquals(ctx.typecast_calls, 2)
+
+        order = row[2].fetchone()
+        self.assertEquals(order[0:2], (101, "apple related"))
+        # order_id, order_info for two orders; no items yet
+        self.assertEquals(ctx.typecast_calls, 6)
+        self.assertEquals(
+            order[2].fetchall(),
+            [(1001, ("decimal", 9.99)), (1002, ("decimal", 19.99))]
+        )
+        self.assertEquals(ctx.typecast_calls, 10)
+
+    def test_lazy_matches_eager(self):
+        eager = FakeResultContext()
+        lazy = FakeResultContext()
+        lazy.lazy = True
+        self.assertEquals(
+            [_expand(impl._filter_row(row, lazy)) for row in _rows()],
+            [_expand(impl._filter_row(row, eager)) for row in _rows()],
+        )
+
+
+class RowFactoryTest(unittest.TestCase):
+
+    def _decode(self, row_factory, stream=False):
+        ctx = FakeResultContext(row_factory=row_factory, stream=stream)
+        return [impl._filter_row(row, ctx) for row in _rows()]
+
+    def test_namedtuple(self):
+        self.assertEquals(_expand(tuple(self._decode('namedtuple')[0])),
+                    _expand(self._decode(None)[0]))
+        row = self._decode('namedtuple')[0]
+        self.assertEquals((row.customer_id, row.name),
+                    (1, "David McFarlane"))
+        order = row.orders.fetchone()
+        self.assertEquals(order._fields, ("order_id", "order_info", "items"))
+        self.assertEquals(order.items.fetchone().price,
+                    ("decimal", 9.99))
+
+    def test_record(self):
+        for stream in (False, True):
+            row = self._decode('record', stream)[0]
+            self.assertTrue(isinstance(row, impl.Record))
+            self.assertFalse(hasattr(row, '__dict__'))
+            self.assertEquals(row.name, "David McFarlane")
+            self.assertEquals((row[0], len(row)), (1, 3))
+            item = row.orders.fetchone().items.fetchone()
+            self.assertEquals(item._asdict(),
+                        {"item_id": 1001, "price": ("decimal", 9.99)})
+            self.assertEquals(repr(item),
+                        "Row(item_id=1001, price=('decimal', 9.99))")
+
+    def test_dict(self):
+        row = self._decode('dict')[1]
+        self.assertEquals(row["name"], "Ori Herrnstadt")
+        self.assertEquals(row["orders"].fetchall(), [])
+        self.assertEquals(
+            self._decode('dict')[0]["orders"].fetchone()["order_id"], 101)
+
+    def test_class_cached(self):
+        names = ("customer_id", "name", "orders")
+        for row_factory in ('namedtuple', 'record'):
+            cls = impl.row_class(row_factory, list(names))
+            self.assertTrue(impl.row_class(row_factory, names) is cls)
+            self.assertTrue(type(self._decode(row_factory)[0]) is cls)
+        self.assertTrue(impl.row_class('tuple', names) is tuple)
+        self.assertRaises(ValueError, impl.row_class, 'list', names)
+
+    def test_invalid_names(self):
+        row = impl._row_maker('record', ("count(*)", "a", "a"))([1, 2, 3])
+        self.assertEquals(row._fields, ("_0", "a", "_2"))
+        self.assertEquals(list(row), [1, 2, 3])
+
+    def test_pickle(self):
+        import pickle
+        for row_factory in ('namedtuple', 'record'):
+            row = impl._row_maker(row_factory, ("a", "b c"))([1, 2])
+            self.assertEquals(pickle.loads(pickle.dumps(row)), row)
+
+
+class InternTest(unittest.TestCase):
+
+    def _orders(self, **kw):
+        ctx = FakeResultContext(**kw)
+        rows = [impl._filter_row(row, ctx) for row in _rows()]
+        return [order[1] for order in rows[0][2].fetchall()]
+
+    def test_off_by_default(self):
+        first, second = self._orders()
+        self.assertEquals(first, second)
+        self.assertFalse(first is second)
+
+    def test_text_columns(self):
+        first, second = self._orders(intern_strings=True)
+        self.assertEquals(first, "apple related")
+        self.assertTrue(first is second)
+
+    def test_column_names(self):
+        first, second = self._orders(intern_strings=["name"])
+        self.assertFalse(first is second)
+        first, second = self._orders(intern_strings=["order_info"])
+        self.assertTrue(first is second)
+
+    def test_typecast_values(self):
+        ctx = FakeResultContext(intern_strings=["price"])
+        orders = impl._filter_row(_rows()[0], ctx)[2].fetchall()
+        first, second = [order[2].fetchall()[0][1] for order in orders]
+        self.assertEquals(first, ("decimal", 9.99))
+        self.assertFalse(first is second)
+
+    def test_only_strings(self):
+        from decimal import Decimal
+        intern = impl._interning(None, 10)
+        values = [Decimal("1.1"), Decimal("1.10"), 1.0, 1, True]
+        for value in values:
+            self.assertTrue(intern(value) is value)
+        self.assertEquals([str(value) for value in map(intern, values)],
+                    ["1.1", "1.10", "1.0", "1", "True"])
+        a = u"".join([u"a", u"b"])
+        self.assertTrue(intern(a) is a)
+        self.assertTrue(intern(u"".join([u"a", u"b"])) is a)
+
+    def test_limit(self):
+        intern = impl._interning(None, 2)
+        a = "".join(["a", "b"])
+        self.assertTrue(intern(a) is a)
+        self.assertTrue(intern("".join(["a", "b"])) is a)
+        intern("c")
+        intern("d")
+        # over the limit; values now pass through
+        self.assertFalse(intern("".join(["a", "b"])) is a)
+
+    def test_streamed(self):
+        ctx = FakeResultContext(intern_strings=True, stream=True)
+        row = impl._filter_row(_rows()[0], ctx)
+        first, second = [order[1] for order in row[2].fetchall()]
+        self.assertTrue(first is second)
+
+
+class CompactCursorTest(unittest.TestCase):
+
+    def _decode(self, **kw):
+        ctx = FakeResultContext(**kw)
+        return [impl._filter_row(row, ctx) for row in _rows(
+                    DOCUMENTS + [{"customer_id": 3, "name": "x",
+                                "orders": []}])]
+
+    def test_no_dict(self):
+        orders = self._decode()[0][2]
+        self.assertFalse(hasattr(orders, '__dict__'))
+
+    def test_level_shared(self):
+        rows = self._decode()
+        orders = rows[0][2].fetchall()
+        self.assertTrue(orders[0][2]._level is orders[1][2]._level)
+        self.assertFalse(rows[0][2]._level is orders[0][2]._level)
+
+    def test_empty_shared(self):
+        for lazy in (False, True):
+            rows = self._decode(lazy=lazy)
+            self.assertTrue(rows[1][2] is rows[2][2])
+            empty = rows[1][2]
+            self.assertEquals(empty.fetchall(), [])
+            self.assertEquals(empty.fetchone(), None)
+            self.assertEquals((empty.rowcount, empty.rownumber), (0, 0))
+            self.assertEquals(empty.description, rows[0][2].description)
+
+    def test_rows_released(self):
+        cursor = self._decode()[0][2]
+        cursor.fetchone()
+        self.assertEquals((cursor.rowcount, cursor.rownumber), (2, 1))
+        cursor.fetchmany(5)
+        self.assertEquals(cursor._rows, [])
+        self.assertEquals((cursor.rowcount, cursor.rownumber), (2, 2))
+
+
+class StreamTest(unittest.TestCase):
+
+    def test_iter_rows(self):
+        ctx = FakeResultContext()
+        stream = FakeStream(25)
+        rows = [row[0:2] for row in impl._iter_rows(stream.fetchmany, 10, ctx)]
+        self.assertEquals(rows, [(i, "c%d" % i) for i in range(25)])
+
+    def test_iter_rows_memory_ceiling(self):
+        ctx = FakeResultContext()
+        stream = FakeStream(10000)
+        consumed = 0
+        buffered = 0
+        for row in impl._iter_rows(stream.fetchmany, 50, ctx):
+            consumed += 1
+            buffered = max(buffered, stream.fetched - consumed)
+        self.assertEquals(consumed, 10000)
+        # never more than one batch of raw rows outstanding
+        self.assertTrue(buffered < 50, buffered)
+
+
+class PrefetchTest(unittest.TestCase):
+
+    def _wait_for(self, condition):
+        deadline = time.time() + 5
+        while not condition():
+            self.assertTrue(time.time() < deadline, "timed out")
+            time.sleep(.005)
+
+    def test_rows(self):
+        ctx = FakeResultContext()
+        prefetcher = impl._Prefetcher(FakeStream(25).fetchmany, 10, ctx, 2)
+        self.assertEquals(prefetcher.fetchone()[0], 0)
+        self.assertEquals([row[0] for row in prefetcher.fetchmany(7)],
+                    list(range(1, 8)))
+        self.assertEquals([row[0] for row in prefetcher.fetchmany(15)],
+                    list(range(8, 23)))
+        self.assertEquals([row[0] for row in prefetcher],
+                    [23, 24])
+        self.assertEquals(prefetcher.fetchall(), [])
+        self.assertEquals(prefetcher.fetchone(), None)
+        prefetcher.close()
+
+    def test_fetchall(self):
+        ctx = FakeResultContext()
+        prefetcher = impl._Prefetcher(FakeStream(25).fetchmany, 10, ctx, 1)
+        self.assertEquals([row[0] for row in prefetcher.fetchall()],
+                    list(range(25)))
+        prefetcher.close()
+
+    def test_bounded(self):
+        ctx = FakeResultContext()
+        stream = FakeStream(10000)
+        prefetcher = impl._Prefetcher(stream.fetchmany, 10, ctx, 3)
+        self._wait_for(prefetcher._queue.full)
+        time.sleep(.05)
+        # three batches queued, and one waiting to be
+        self.assertEquals(stream.fetched, 40)
+
+        prefetcher.fetchmany(10)
+        self._wait_for(prefetcher._queue.full)
+        time.sleep(.05)
+        self.assertEquals(stream.fetched, 50)
+        prefetcher.close()
+
+    def test_error(self):
+        stream = FakeStream(100)
+
+        def fetchmany(size):
+            if stream.fetched >= 20:
+                raise KeyError("boom")
+            return stream.fetchmany(size)
+        prefetcher = impl._Prefetcher(fetchmany, 10, FakeResultContext(), 2)
+        self.assertEquals(len(prefetcher.fetchmany(20)), 20)
+        self.assertRaises(KeyError, prefetcher.fetchone)
+        self.assertEquals(prefetcher.fetchone(), None)
+        prefetcher.close()
+
+    def test_close_stops_thread(self):
+        stream = FakeStream(10000)
+        prefetcher = impl._Prefetcher(stream.fetchmany, 10,
+                        FakeResultContext(), 2)
+        self._wait_for(prefetcher._queue.full)
+        prefetcher.close()
+        self.assertFalse(prefetcher._thread.is_alive())
+        fetched = stream.fetched
+        time.sleep(.05)
+        self.assertEquals(stream.fetched, fetched)
+        self.assertEquals(prefetcher.fetchone(), None)
+
+    def test_overlaps_with_caller(self):
+        stream = FakeStream(100)
+
+        def fetchmany(size):
+            time.sleep(.02)
+            return stream.fetchmany(size)
+        now = time.time()
+        prefetcher = impl._Prefetcher(fetchmany, 10, FakeResultContext(), 2)
+        for row in iter(lambda: prefetcher.fetchmany(10), []):
+            time.sleep(.02)
+        elapsed = time.time() - now
+        prefetcher.close()
+        # one after the other would take .4 seconds
+        self.assertTrue(elapsed < .35, elapsed)
+
+
+def _decode_chunk(texts):
+    import pickle
+    ctx = FakeResultContext()
+    ctx.nested_cursor_cls = impl._DetachedRows
+    ctx.level_ids = dict((id(fields), level) for level, fields in
+                            enumerate(impl._nested_levels(ctx.fields)))
+    return pickle.dumps([impl._filter_row((text, ), ctx) for text in texts])
+
+
+class ParallelDecodeTest(unittest.TestCase):
+
+    def _executor(self):
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+        except ImportError:
+            raise SkipTest("concurrent.futures is not available")
+        executor = ThreadPoolExecutor(3)
+        self.addCleanup(executor.shutdown)
+        return executor
+
+    def _documents(self, count):
+        return [
+            {"customer_id": i, "name": "c%d" % i, "orders": [
+                {"order_id": i * 10 + o, "order_info": None, "items": [
+                    {"item_id": i * 100 + o * 10 + n, "price": 1.5}
+                    for n in range(o)
+                ]}
+                for o in range(i % 3)
+            ]}
+            for i in range(count)
+        ]
+
+    def test_same_rows_in_order(self):
+        rows = _rows(self._documents(50))
+        expected = [_expand(impl._filter_row(row, FakeResultContext()))
+                        for row in rows]
+        ctx = FakeResultContext()
+        decoded = impl._parallel_decode(
+                        rows, ctx, self._executor(), _decode_chunk, 7)
+        self.assertEquals([_expand(row) for row in decoded], expected)
+
+    def test_nested_cursors_rebuilt(self):
+        ctx = FakeResultContext()
+        decoded = impl._parallel_decode(
+                        _rows(), ctx, self._executor(), _decode_chunk, 1)
+        orders = decoded[0][2]
+        self.assertTrue(isinstance(orders, api.NestedCursor))
+        self.assertTrue(orders.ctx is ctx)
+        self.assertTrue(orders._fields is ctx.fields[2]['akiban.fields'])
+        self.assertTrue(isinstance(orders.fetchone()[2], api.NestedCursor))
+
+    def test_nested_levels(self):
+        ctx = FakeResultContext()
+        orders = ctx.fields[2]['akiban.fields']
+        self.assertEquals(impl._nested_levels(ctx.fields),
+                    [orders, orders[2]['akiban.fields']])
+
+
+class StreamingParserTest(unittest.TestCase):
+
+    def _big_group(self, count):
+        return json.dumps({"customer_id": 1, "name": "c1", "orders": [
+            {"order_id": i, "order_info": "o%d" % i, "items": []}
+            for i in range(count)
+        ]})
+
+    def test_same_rows(self):
+        expected = [_expand(impl._filter_row(row, FakeResultContext()))
+                        for row in _rows()]
+        ctx = FakeResultContext(stream=True)
+        self.assertEquals(
+            [_expand(impl._filter_row(row, ctx)) for row in _rows()],
+            expected)
+
+    def test_whitespace_and_bytes(self):
+        expected = [_expand(impl._filter_row(row, FakeResultContext()))
+                        for row in _rows()]
+        ctx = FakeResultContext(stream=True)
+        rows = [(json.dumps(doc, indent=2).encode('utf-8'), )
+                    for doc in DOCUMENTS]
+        self.assertEquals(
+            [_expand(impl._filter_row(row, ctx)) for row in rows],
+            expected)
+
+    def test_parsed_per_batch(self):
+        ctx = FakeResultContext(stream=True)
+        row = impl._filter_row((self._big_group(1000), ), ctx)
+        self.assertEquals(row[0:2], (1, "c1"))
+        # customer_id, name
+        self.assertEquals(ctx.typecast_calls, 2)
+
+        orders = row[2]
+        self.assertEquals(orders.rowcount, -1)
+        self.assertEquals(orders.fetchone()[0:2], (0, "o0"))
+        # one batch of arraysize orders, with order_id, order_info
+        self.assertEquals(ctx.typecast_calls, 2 + 12 * 2)
+
+        self.assertEquals([r[0] for r in orders.fetchmany(20)],
+                    list(range(1, 21)))
+        self.assertEquals(ctx.typecast_calls, 2 + 21 * 2)
+
+        self.assertEquals(len(orders.fetchall()), 979)
+        self.assertEquals(orders.rowcount, 1000)
+        self.assertEquals(orders.fetchone(), None)
+
+    def test_iterate(self):
+        ctx = FakeResultContext(stream=True)
+        row = impl._filter_row((self._big_group(30), ), ctx)
+        self.assertEquals([order[0] for order in row[2]], list(range(30)))
+        self.assertEquals(row[2].rowcount, 30)
+
+    def test_empty(self):
+        ctx = FakeResultContext(stream=True)
+        row = impl._filter_row((self._big_group(0), ), ctx)
+        self.assertEquals(row[2].fetchall(), [])
+        self.assertEquals(row[2].rowcount, 0)
+
+    def test_nested_not_last_is_buffered(self):
+        metadata = [METADATA[2], METADATA[0], METADATA[1]]
+        ctx = FakeResultContext(metadata, stream=True)
+        row = impl._filter_row(_rows()[0], ctx)
+        self.assertEquals(row[0].rowcount, 2)
+        self.assertEquals(row[1:], (1, "David McFarlane"))
+
+    def test_invalid(self):
+        ctx = FakeResultContext(stream=True)
+        row = impl._filter_row(
+                ('{"customer_id": 1, "name": "x", "orders": ['
+                    '{"order_id": 1, "order_info": "a", "items": []}; ]}', ),
+                ctx)
+        self.assertRaises(ValueError, row[2].fetchall)
+
+
+class FieldsCacheTest(unittest.TestCase):
+
+    def test_fields_shared(self):
+        cache = impl._LRUCache()
+        ctx1 = FakeResultContext(fields_cache=cache)
+        ctx2 = FakeResultContext(fields_cache=cache)
+        self.assertTrue(ctx1.fields is ctx2.fields)
+        self.assertEquals(len(cache), 1)
+
+    def test_no_cache(self):
+        ctx1 = FakeResultContext()
+        ctx2 = FakeResultContext()
+        self.assertFalse(ctx1.fields is ctx2.fields)
+        self.assertEquals(ctx1.fields, ctx2.fields)
+
+    def test_cache_skips_format_fields(self):
+        cache = impl._LRUCache()
+        FakeResultContext(fields_cache=cache)
+
+        format_fields = impl._format_fields
+        def fail(document):
+            assert False, "_format_fields was called"
+        impl._format_fields = fail
+        try:
+            ctx = FakeResultContext(fields_cache=cache)
+        finally:
+            impl._format_fields = format_fields
+        self.assertEquals(ctx.fields[0]['name'], 'customer_id')
+
+    def test_lru(self):
+        cache = impl._LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache['a']
+        cache['c'] = 3
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertTrue('c' in cache)
+        self.assertRaises(KeyError, lambda: cache['b'])
+
+
+class ColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._numpy = impl.numpy
+
+    def tearDown(self):
+        impl.numpy = self._numpy
+
+    def _fetch(self, documents=DOCUMENTS, metadata=METADATA):
+        ctx = FakeResultContext(metadata)
+        return impl._fetch_columns(_rows(documents), ctx)
+
+    def _assert_levels(self, levels):
+        self.assertEquals(list(levels),
+                    [(), ("orders", ), ("orders", "items")])
+        customers, orders, items = levels.values()
+
+        self.assertEquals(list(customers.columns), ["customer_id", "name"])
+        self.assertEquals(list(customers.columns["customer_id"]), [1, 2])
+        self.assertEquals(list(customers.columns["name"]),
+                    ["David McFarlane", "Ori Herrnstadt"])
+        self.assertEquals(customers.parent, None)
+        self.assertEquals(customers.rowcount, 2)
+
+        self.assertEquals(list(orders.columns["order_id"]), [101, 102])
+        self.assertEquals(list(orders.parent), [0, 0])
+
+        self.assertEquals(list(items.columns["item_id"]),
+                    [1001, 1002, 1003])
+        self.assertEquals(list(items.columns["price"]), [
+                    ("decimal", 9.99), ("decimal", 19.99),
+                    ("decimal", 9.99)])
+        self.assertEquals(list(items.parent), [0, 0, 1])
+
+    def test_array(self):
+        import array
+        impl.numpy = None
+        levels = self._fetch()
+        self._assert_levels(levels)
+        customers, orders, items = levels.values()
+        self.assertTrue(isinstance(customers.columns["customer_id"],
+                    array.array))
+        self.assertTrue(isinstance(customers.columns["name"], list))
+        self.assertTrue(isinstance(items.parent, array.array))
+
+    def test_numpy(self):
+        if impl.numpy is None:
+            raise SkipTest("NumPy is not installed")
+        levels = self._fetch()
+        self._assert_levels(levels)
+        customers, orders, items = levels.values()
+        self.assertEquals(customers.columns["customer_id"].dtype.kind, "i")
+        self.assertEquals(customers.columns["name"].dtype, object)
+
+    def test_nulls_untyped(self):
+        impl.numpy = None
+        levels = self._fetch([{"customer_id": None, "name": "x",
+                                    "orders": []}])
+        self.assertEquals(levels[()].columns["customer_id"], [None])
+
+    def test_no_per_row_objects(self):
+        # the decoder creates no row tuples or nested cursors
+        ctx = FakeResultContext()
+        ctx.nested_cursor_cls = None
+        levels = impl._fetch_columns(_rows(), ctx)
+        self.assertEquals(levels[("orders", "items")].rowcount, 3)
+
+    def test_synthetic(self):
+        documents = [
+            {"customer_id": c, "name": "c%d" % c, "orders": [
+                {"order_id": c * 10 + o, "order_info": None, "items": [
+                    {"item_id": c * 100 + o * 10 + i, "price": i}
+                    for i in range(o)
+                ]}
+                for o in range(c % 4)
+            ]}
+            for c in range(100)
+        ]
+        impl.numpy = None
+        customers, orders, items = self._fetch(documents).values()
+        self.assertEquals(customers.rowcount, 100)
+        self.assertEquals(orders.rowcount, sum(c % 4 for c in range(100)))
+
+        # walking the parent arrays recovers the nesting
+        for index, item_id in enumerate(items.columns["item_id"]):
+            order = items.parent[index]
+            customer = orders.parent[order]
+            self.assertEquals(orders.columns["order_id"][order],
+                        item_id // 10)
+            self.assertEquals(customers.columns["customer_id"][customer],
+                        item_id // 100)
+
+
+class JSONBackendTest(unittest.TestCase):
+
+    def test_stdlib_always_present(self):
+        self.assertEquals(impl.get_json_loads('json'),
+                            impl.json_decoder.decode)
+
+    def test_default(self):
+        self.assertTrue(impl.get_json_loads() in
+                            impl._json_backends.values())
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, impl.get_json_loads, 'nonexistent')
+
+    def test_backends_identical(self):
+        documents = DOCUMENTS + [
+            {"customer_id": 3, "name": u"dr\xf4le m\u2019a r\xe9veill\xe9",
+                "orders": [
+                    {"order_id": 103, "order_info": None, "items": [
+                        {"item_id": 1004, "price": 1234567.89},
+                        {"item_id": 123456789012345678901234,
+                            "price": 1e300},
+                        {"item_id": -9223372036854775809,
+                            "price": 12345678901234567890.5},
+                        {"item_id": 18446744073709551616, "price": 2.5},
+                    ]}
+                ]}
+        ]
+        expected = None
+        for name in sorted(impl._json_backends):
+            if name == 'decimal':
+                # parses floats differently, on purpose
+                continue
+            ctx = FakeResultContext(loads=impl.get_json_loads(name))
+            rows = [_expand(impl._filter_row(row, ctx))
+                            for row in _rows(documents)]
+            if expected is None:
+                expected = rows
+            else:
+                self.assertEquals(rows, expected, name)
+        items = expected[-1][2][0][2]
+        self.assertEquals([item[0] for item in items[-3:]], [
+                123456789012345678901234, -9223372036854775809,
+                18446744073709551616])
+
+    def test_decimal(self):
+        from decimal import Decimal
+        loads = impl.get_json_loads('decimal')
+        self.assertEquals(
+            loads('{"price": 12345678901234567.89, "qty": 3}'),
+            {"price": Decimal("12345678901234567.89"), "qty": 3}
+        )
+
+    def test_raw(self):
+        document = u'{"name": "dr\xf4le m\u2019a r\xe9veill\xe9"}'
+        for name in impl._json_backends:
+            loads = impl.get_json_loads(name, raw=True)
+            self.assertEquals(loads(document.encode('utf-8')),
+                    {"name": u"dr\xf4le m\u2019a r\xe9veill\xe9"}, name)
+
+    def test_long_integers(self):
+        document = u'[123456789012345678901234, -9223372036854775809]'
+        for name in impl._json_backends:
+            for raw in (False, True):
+                loads = impl.get_json_loads(name, raw=raw)
+                self.assertEquals(
+                    loads(document.encode('utf-8') if raw else document),
+                    [123456789012345678901234, -9223372036854775809],
+                    name)
+
+    def test_raw_decodes_for_str_backends(self):
+        received = []
+
+        def loads(value):
+            received.append(value)
+            return json.loads(value)
+        impl.register_json_backend('test', loads)
+        try:
+            self.assertEquals(impl.get_json_loads('test'), loads)
+            raw = impl.get_json_loads('test', raw=True)
+            self.assertEquals(raw(u'[1, "\xe9"]'.encode('utf-8')),
+                        [1, u"\xe9"])
+            self.assertEquals(received, [u'[1, "\xe9"]'])
+        finally:
+            del impl._json_backends['test']
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def _cache(self, **kw):
+        cache = impl.ResultCache(**kw)
+        self.now = 0
+        cache._clock = lambda: self.now
+        return cache
+
+    def test_hit_miss(self):
+        cache = self._cache()
+        self.assertEquals(cache.get("q1"), None)
+        cache.put("q1", ("meta", "row"), "select * from customers")
+        self.assertEquals(cache.get("q1"), ("meta", "row"))
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+    def test_lru(self):
+        cache = self._cache(capacity=2)
+        cache.put("q1", (1, ), "select 1")
+        cache.put("q2", (2, ), "select 2")
+        cache.get("q1")
+        cache.put("q3", (3, ), "select 3")
+        self.assertEquals(len(cache), 2)
+        self.assertEquals(cache.get("q2"), None)
+        self.assertEquals(cache.get("q1"), (1, ))
+        self.assertEquals(cache.get("q3"), (3, ))
+
+    def test_ttl(self):
+        cache = self._cache(ttl=10)
+        cache.put("q1", (1, ), "select 1")
+        self.now = 9
+        self.assertEquals(cache.get("q1"), (1, ))
+        self.now = 10
+        self.assertEquals(cache.get("q1"), None)
+        self.assertEquals(len(cache), 0)
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+    def test_invalidate(self):
+        cache = self._cache()
+        cache.put("q1", (1, ), "select c.name, (select o.* from orders o "
+                        "where o.cid = c.cid) from customers c")
+        cache.put("q2", (2, ), "SELECT * FROM test.Customers "
+                        "JOIN addresses ON 1 = 1")
+        cache.put("q3", (3, ), 'select * from "Items"')
+        cache.invalidate("TEST.ORDERS")
+        self.assertEquals(cache.get("q1"), None)
+        self.assertEquals(cache.get("q2"), (2, ))
+        cache.invalidate("addresses", "items")
+        self.assertEquals(len(cache), 0)
+
+    def test_table_names(self):
+        names = impl._table_names(
+                    'select * from a, b join "S"."C" on 1 = 1 '
+                    'where x in (select y from d) and z = \'e f\'')
+        self.assertTrue(set(["a", "b", "c", "d"]) <= names)
+        self.assertFalse(set(["e", "f"]) & names)
+        self.assertTrue('my "t"' in impl._table_names(
+                    'select * from "My ""T"""'))
+
+    def test_invalidate_comma_join(self):
+        cache = self._cache()
+        cache.put("q1", (1, ), "select * from customers c, orders o "
+                        "where o.cid = c.cid")
+        cache.put("q2", (2, ), "select * from customers c, orders")
+        cache.invalidate("orders")
+        self.assertEquals(len(cache), 0)
+
+    def test_invalidate_subqueries(self):
+        cache = self._cache()
+        cache.put("q1", (1, ), "select * from (select * from items) i")
+        cache.put("q2", (2, ), "select * from customers c where exists "
+                        "(select 1 from test.orders o where o.cid = c.cid)")
+        cache.put("q3", (3, ), "select * from customers")
+        cache.invalidate("items", "orders")
+        self.assertEquals(cache.get("q1"), None)
+        self.assertEquals(cache.get("q2"), None)
+        self.assertEquals(cache.get("q3"), (3, ))
+
+
+class ExecuteStatsTest(unittest.TestCase):
+
+    def _decode(self, **kw):
+        stats = impl.ExecuteStats("select")
+        ctx = FakeResultContext(stats=stats, **kw)
+        rows = [_expand(impl._filter_row(row, ctx)) for row in _rows()]
+        self.assertEquals(rows,
+                [_expand(impl._filter_row(row, FakeResultContext(**kw)))
+                    for row in _rows()])
+        return stats
+
+    def _assert_counts(self, stats):
+        self.assertEquals(stats.rows, 2)
+        self.assertEquals(stats.nested_rows, 5)
+        self.assertEquals(stats.json_bytes,
+                    sum(len(row[0]) for row in _rows()))
+        self.assertEquals(stats.typecasts, {23: 7, 1043: 4, 1700: 3})
+
+    def test_counts(self):
+        stats = self._decode()
+        self._assert_counts(stats)
+        self.assertTrue(stats.parse_time > 0)
+        self.assertTrue(stats.decode_time > 0)
+
+    def test_counts_lazy(self):
+        self._assert_counts(self._decode(lazy=True))
+
+    def test_stream(self):
+        stats = self._decode(stream=True)
+        self.assertEquals(stats.rows, 2)
+        self.assertEquals(stats.parse_time, 0)
+        self.assertTrue(stats.decode_time > 0)
+
+    def test_disabled(self):
+        ctx = FakeResultContext()
+        self.assertEquals(ctx.loads.__name__, 'decode')
+        self.assertEquals(ctx.decoder.__name__, 'decode')
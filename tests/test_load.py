@@ -0,0 +1,152 @@
+import unittest
+from akiban.load import GroupLoader, Table
+
+
+class StubCursor(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, params):
+        self.connection.log.append((statement, params))
+
+    def close(self):
+        pass
+
+
+class StubConnection(object):
+    def __init__(self):
+        self.log = []
+
+    def cursor(self, nested=True):
+        assert not nested
+        return StubCursor(self)
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+
+def _group():
+    return Table("customers", children=[
+                Table("orders", parent_columns=["customer_id"], children=[
+                    Table("items", parent_columns=["order_id"])
+                ])
+            ])
+
+def _documents(count):
+    return [
+        {"customer_id": c, "name": "c%d" % c, "orders": [
+            {"order_id": c * 10 + o, "items": [
+                {"item_id": c * 100 + o * 10 + i} for i in range(o)
+            ]} for o in range(2)
+        ]} for c in range(count)
+    ]
+
+
+class GroupLoaderTest(unittest.TestCase):
+
+    def test_grouping_order(self):
+        conn = StubConnection()
+        stats = GroupLoader(conn, _group()).load(_documents(2))
+        self.assertEquals(conn.log, [
+            ('INSERT INTO "customers" ("customer_id", "name") '
+                "VALUES (%s, %s), (%s, %s)", [0, "c0", 1, "c1"]),
+            ('INSERT INTO "orders" ("customer_id", "order_id") '
+                "VALUES (%s, %s), (%s, %s), (%s, %s), (%s, %s)",
+                [0, 0, 0, 1, 1, 10, 1, 11]),
+            ('INSERT INTO "items" ("item_id", "order_id") '
+                "VALUES (%s, %s), (%s, %s)", [10, 1, 110, 11]),
+            "COMMIT",
+        ])
+        self.assertEquals(stats.rows,
+                    {"customers": 2, "orders": 4, "items": 2})
+        self.assertEquals((stats.groups, stats.chunks, stats.statements),
+                    (2, 1, 3))
+
+    def test_chunks(self):
+        conn = StubConnection()
+        reported = []
+        GroupLoader(conn, _group(), chunk_size=2, rows_per_statement=3,
+                    progress=lambda stats: reported.append(
+                        (stats.groups, stats.total_rows))
+                    ).load(iter(_documents(5)))
+        self.assertEquals(reported, [(2, 8), (4, 16), (5, 20)])
+        self.assertEquals(conn.log.count("COMMIT"), 3)
+        # four orders per chunk of two customers, in two statements
+        self.assertEquals(
+            [len(params) for stmt, params in conn.log[0:4]],
+            [4, 6, 2, 4])
+
+    def test_no_commit(self):
+        conn = StubConnection()
+        GroupLoader(conn, _group(), chunk_size=1,
+                    commit_every_chunk=False).load(_documents(3))
+        self.assertFalse("COMMIT" in conn.log)
+
+    def test_explicit_columns_key(self):
+        conn = StubConnection()
+        group = Table("customers", columns=["customer_id"], children=[
+                    Table("orders", key="o", columns=["order_id"])])
+        GroupLoader(conn, group).load(
+                    [{"customer_id": 1, "o": [{"order_id": 5}]}])
+        self.assertEquals(conn.log[0:2], [
+            ('INSERT INTO "customers" ("customer_id") VALUES (%s)',
+                [1]),
+            ('INSERT INTO "orders" ("order_id") VALUES (%s)', [5]),
+        ])
+
+    def test_columns_per_chunk(self):
+        conn = StubConnection()
+        group = _group()
+        GroupLoader(conn, group, chunk_size=2).load([
+            {"customer_id": 1, "name": "a"},
+            {"customer_id": 2, "name": "b"},
+            {"customer_id": 3, "email": "c@d"},
+        ])
+        self.assertEquals(group.columns, None)
+        self.assertEquals([entry[0] for entry in conn.log
+                                if entry != "COMMIT"], [
+            'INSERT INTO "customers" ("customer_id", "name") '
+                "VALUES (%s, %s), (%s, %s)",
+            'INSERT INTO "customers" ("customer_id", "email") '
+                'VALUES (%s, %s)',
+        ])
+
+    def test_columns_union(self):
+        group = Table("customers", children=[
+                    Table("orders", parent_columns=["customer_id"])])
+        loader = GroupLoader(StubConnection(), group)
+        # "info" is inferred from the second order, not dropped
+        try:
+            loader.load([
+                {"customer_id": 1, "orders": [
+                    {"order_id": 1}, {"order_id": 2, "info": "x"}]},
+            ])
+        except KeyError as err:
+            self.assertTrue("'info'" in str(err))
+            self.assertTrue("'orders'" in str(err))
+        else:
+            self.fail("KeyError not raised")
+
+    def test_missing_value(self):
+        group = _group()
+        loader = GroupLoader(StubConnection(), group)
+        try:
+            loader.load([{"customer_id": 1, "name": "a"},
+                            {"customer_id": 2}])
+        except KeyError as err:
+            self.assertTrue("'name'" in str(err))
+            self.assertTrue("'customers'" in str(err))
+        else:
+            self.fail("KeyError not raised")
+
+    def test_quoted_names(self):
+        conn = StubConnection()
+        hostile = 'name) VALUES (1); DROP TABLE orders; --'
+        GroupLoader(conn, Table("test.Customers")).load([
+            {"customer_id": 1, "order": 2, hostile: 3, 'a"b': 4, "%s": 5},
+        ])
+        self.assertEquals(conn.log[0], (
+            'INSERT INTO "test"."Customers" ("%%s", "a""b", "customer_id", '
+                '"name) VALUES (1); DROP TABLE orders; --", "order") '
+                'VALUES (%s, %s, %s, %s, %s)',
+            [5, 4, 1, 3, 2]))
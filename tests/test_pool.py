@@ -0,0 +1,168 @@
+import unittest
+import threading
+import time
+from akiban.pool import Pool, PoolTimeout
+
+
+class StubConnection(object):
+    def __init__(self, nested=False):
+        self._nested = nested
+        self.closed = 0
+        self.rollbacks = 0
+
+    def rollback(self):
+        if self.closed:
+            raise Exception("connection closed")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class PoolTest(unittest.TestCase):
+
+    def _pool(self, **kw):
+        self.created = []
+        def creator():
+            conn = StubConnection()
+            self.created.append(conn)
+            return conn
+        return Pool(creator, **kw)
+
+    def test_min_size(self):
+        pool = self._pool(min_size=3)
+        self.assertEquals(len(self.created), 3)
+        self.assertEquals(pool.status()['idle'], 3)
+
+    def test_reuse(self):
+        pool = self._pool(min_size=0, max_size=2)
+        c1 = pool.checkout()
+        pool.checkin(c1)
+        c2 = pool.checkout()
+        self.assertTrue(c1 is c2)
+        self.assertEquals(len(self.created), 1)
+        self.assertEquals(c1.rollbacks, 1)
+
+    def test_prefer_output_format(self):
+        pool = self._pool(min_size=3)
+        self.created[0]._nested = True
+        nested = pool.checkout(nested=True)
+        self.assertTrue(nested is self.created[0])
+        plain = pool.checkout(nested=False)
+        self.assertTrue(plain._nested is False)
+
+    def test_prefer_output_format_fallback(self):
+        pool = self._pool(min_size=1)
+        conn = pool.checkout(nested=True)
+        # no nested connection available; gets the plain one
+        self.assertTrue(conn is self.created[0])
+
+    def test_overflow(self):
+        pool = self._pool(min_size=0, max_size=1, max_overflow=1)
+        c1 = pool.checkout()
+        c2 = pool.checkout()
+        status = pool.status()
+        self.assertEquals(status['overflow'], 1)
+        self.assertEquals(status['utilisation'], 1.0)
+
+        pool.checkin(c2)
+        self.assertTrue(c2.closed)
+        pool.checkin(c1)
+        self.assertFalse(c1.closed)
+        status = pool.status()
+        self.assertEquals(status['size'], 1)
+        self.assertEquals(status['idle'], 1)
+        self.assertEquals(status['checked_out'], 0)
+
+    def test_timeout(self):
+        pool = self._pool(min_size=0, max_size=1, timeout=.1)
+        pool.checkout()
+        try:
+            pool.checkout()
+        except PoolTimeout as err:
+            self.assertTrue("after 0.1 seconds" in str(err), str(err))
+        else:
+            self.fail("PoolTimeout not raised")
+
+    def test_wait_for_checkin(self):
+        pool = self._pool(min_size=1, max_size=1, timeout=5)
+        conn = pool.checkout()
+
+        def release():
+            time.sleep(.1)
+            pool.checkin(conn)
+        t = threading.Thread(target=release)
+        t.start()
+        self.assertTrue(pool.checkout() is conn)
+        t.join()
+        self.assertTrue(pool.status()['max_wait_time'] >= .05)
+
+    def test_health_check(self):
+        pool = self._pool(min_size=2, max_size=2)
+        self.created[1].closed = 1
+        conn = pool.checkout()
+        self.assertTrue(conn is self.created[0])
+        self.assertEquals(pool.status()['health_check_failures'], 1)
+        self.assertEquals(pool.status()['size'], 1)
+
+    def test_health_check_raises(self):
+        def health_check(conn):
+            if conn is self.created[1]:
+                raise Exception("connection lost")
+            return True
+        pool = self._pool(min_size=2, max_size=2, health_check=health_check)
+        conn = pool.checkout()
+        self.assertTrue(conn is self.created[0])
+        self.assertEquals(self.created[1].closed, 1)
+        status = pool.status()
+        self.assertEquals(status['health_check_failures'], 1)
+        self.assertEquals(status['size'], 1)
+        self.assertEquals(status['checked_out'], 1)
+
+    def test_closed_on_checkin_discarded(self):
+        pool = self._pool(min_size=0, max_size=2)
+        conn = pool.checkout()
+        conn.close()
+        pool.checkin(conn)
+        self.assertEquals(pool.status()['size'], 0)
+
+    def test_context_manager(self):
+        pool = self._pool(min_size=1)
+        with pool.connection() as conn:
+            self.assertEquals(pool.status()['checked_out'], 1)
+        self.assertEquals(pool.status()['checked_out'], 0)
+        self.assertEquals(conn.rollbacks, 1)
+
+    def test_threads(self):
+        pool = self._pool(min_size=0, max_size=3, max_overflow=2, timeout=5)
+        in_use = set()
+        errors = []
+        lock = threading.Lock()
+
+        def work():
+            for i in range(50):
+                with pool.connection() as conn:
+                    with lock:
+                        if conn in in_use:
+                            errors.append(conn)
+                        in_use.add(conn)
+                    time.sleep(.0005)
+                    with lock:
+                        in_use.discard(conn)
+
+        threads = [threading.Thread(target=work) for i in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEquals(errors, [])
+        status = pool.status()
+        self.assertEquals(status['checkouts'], 500)
+        self.assertEquals(status['checked_out'], 0)
+        self.assertTrue(status['size'] <= 3)
+
+    def test_dispose(self):
+        pool = self._pool(min_size=2)
+        pool.dispose()
+        self.assertTrue(all(conn.closed for conn in self.created))
+        self.assertEquals(pool.status()['size'], 0)
@@ -4,6 +4,7 @@ from nose import SkipTest
 from . import fixtures, fails
 import akiban
 import datetime
+import time
 
 try:
     import psycopg2
@@ -11,6 +12,505 @@ try:
 except ImportError:
     raise SkipTest("psycopg2 is not installed")
 
+class Psycopg2ResultContextTest(unittest.TestCase):
+    """Tests for the result context which don't need a server."""
+
+    metadata = (
+        '[{"name": "customer_id", "oid": 23}, '
+        '{"name": "orders", "columns": [{"name": "order_id", "oid": 23}]}]',
+    )
+
+    def _ctx(self, **kw):
+        from akiban.psycopg2 import Psycopg2ResultContext
+
+        class Cursor(object):
+            arraysize = 1
+        return Psycopg2ResultContext(Cursor(), self.metadata, **kw)
+
+    def test_description_reused(self):
+        ctx = self._ctx()
+        self.assertTrue(ctx.description is ctx.description)
+        self.assertTrue(ctx.akiban_description is ctx.akiban_description)
+        self.assertEquals(
+            ctx.akiban_description,
+            [
+                ('customer_id', 23, None, None, None, None, None, None),
+                ('orders', akiban.NESTED_CURSOR,
+                        None, None, None, None, None,
+                    [('order_id', 23, None, None, None, None, None, None)])
+            ]
+        )
+
+    def test_nested_description_shared(self):
+        from akiban.impl import _filter_row
+        ctx = self._ctx()
+        n1 = _filter_row(('{"customer_id": 1, "orders": []}', ), ctx)[1]
+        n2 = _filter_row(('{"customer_id": 2, "orders": []}', ), ctx)[1]
+        self.assertTrue(n1.description is n2.description)
+        self.assertEquals(n1.description,
+                [('order_id', 23, None, None, None, None, None)])
+
+    def _decode(self, fields, document, **kw):
+        import json
+        from akiban.psycopg2 import Psycopg2ResultContext
+        from akiban.impl import _filter_row
+
+        class Cursor(object):
+            arraysize = 1
+        ctx = Psycopg2ResultContext(Cursor(), (json.dumps(fields), ), **kw)
+        if isinstance(document, dict):
+            document = json.dumps(document)
+        return _filter_row((document, ), ctx)
+
+    def test_fast_converters(self):
+        from decimal import Decimal
+        fields = [
+            {"name": "id", "oid": 23},
+            {"name": "name", "oid": 1043},
+            {"name": "birthdate", "oid": 1082},
+            {"name": "order_date", "oid": 1114},
+            {"name": "price", "oid": 1700},
+            {"name": "flag", "oid": 16},
+            {"name": "missing", "oid": 1082},
+        ]
+        row = self._decode(fields, {
+            "id": 5, "name": u"Peter Beaman", "birthdate": "1982-07-16",
+            "order_date": "2012-09-05 17:24:12", "price": 9.99,
+            "flag": True, "missing": None})
+        self.assertEquals(row, (
+            5, u"Peter Beaman", datetime.date(1982, 7, 16),
+            datetime.datetime(2012, 9, 5, 17, 24, 12), Decimal("9.99"),
+            True, None))
+        self.assertEquals(type(row[4]), Decimal)
+
+    def test_fast_converter_fallback(self):
+        # values the fast converters don't accept go to psycopg2
+        fields = [
+            {"name": "order_date", "oid": 1114},
+            {"name": "ship_date", "oid": 1114},
+        ]
+        row = self._decode(fields, {"order_date": "infinity",
+                                    "ship_date": "2012-09-05 17:24:12.5"})
+        self.assertEquals(row, (datetime.datetime.max,
+                    datetime.datetime(2012, 9, 5, 17, 24, 12, 500000)))
+
+    def test_converters_per_connection(self):
+        fields = [{"name": "id", "oid": 23}, {"name": "n", "oid": 701}]
+        row = self._decode(fields, {"id": 5, "n": 1.5},
+                    converters={23: str, 701: None})
+        self.assertEquals(row, ("5", 1.5))
+
+    def test_decimal_backend_precision(self):
+        from decimal import Decimal
+        from akiban.impl import get_json_loads
+        row = self._decode([{"name": "price", "oid": 1700}],
+                    '{"price": 12345678901234567.89}',
+                    loads=get_json_loads('decimal'))
+        self.assertEquals(row, (Decimal("12345678901234567.89"), ))
+
+    def test_exact_decimals(self):
+        from decimal import Decimal
+        fields = [
+            {"name": "price", "oid": 1700},
+            {"name": "weight", "oid": 701},
+            {"name": "lines", "columns": [
+                {"name": "amount", "oid": 1700},
+                {"name": "ratio", "oid": 700},
+            ]},
+        ]
+        document = ('{"price": 1.10, "weight": 2.5, "lines": '
+                    '[{"amount": 12345678901234567890.123, "ratio": 3}]}')
+        for stream in (False, True):
+            row = self._decode(fields, document, exact_decimals=True,
+                                stream=stream)
+            self.assertEquals(str(row[0]), "1.10")
+            self.assertEquals(type(row[1]), float)
+            self.assertEquals(row[2].fetchall(),
+                    [(Decimal("12345678901234567890.123"), 3.0)])
+
+        # explicitly chosen backends parse DECIMAL values as floats
+        row = self._decode(fields, document)
+        self.assertEquals(str(row[0]), "1.1")
+
+    def test_exact_decimals_without_decimal_columns(self):
+        from akiban.psycopg2 import Psycopg2ResultContext
+        from akiban.impl import json_decoder
+
+        class Cursor(object):
+            arraysize = 1
+        ctx = Psycopg2ResultContext(Cursor(), self.metadata,
+                                    exact_decimals=True)
+        self.assertTrue(ctx.json_decoder is json_decoder)
+        self.assertEquals(ctx.loads, json_decoder.decode)
+
+    def test_decode_chunk_in_process_pool(self):
+        self._test_decode_chunk_in_process_pool(None)
+
+    def test_decode_chunk_in_process_pool_row_factory(self):
+        self._test_decode_chunk_in_process_pool('record')
+
+    def _test_decode_chunk_in_process_pool(self, row_factory):
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+        except ImportError:
+            raise SkipTest("concurrent.futures is not available")
+        import functools
+        import json
+        from akiban.impl import _filter_row, _parallel_decode
+        from akiban.psycopg2 import _decode_chunk, fast_converters
+
+        documents = [
+            {"customer_id": i, "orders": [{"order_id": i * 10 + o}
+                                            for o in range(i % 3)]}
+            for i in range(20)
+        ]
+        rows = [(json.dumps(doc), ) for doc in documents]
+        ctx = self._ctx(row_factory=row_factory)
+        spec = (self.metadata[0], None, False,
+                    tuple(sorted(fast_converters.items())), row_factory,
+                    False, 10000)
+        with ProcessPoolExecutor(2) as executor:
+            decoded = _parallel_decode(rows, ctx, executor,
+                            functools.partial(_decode_chunk, spec), 6)
+        self.assertEquals(
+            [(row[0], row[1].fetchall()) for row in decoded],
+            [(row[0], row[1].fetchall())
+                for row in (_filter_row(row, ctx) for row in rows)])
+        self.assertEquals(
+            set(type(row) for row in decoded),
+            set([type(_filter_row(rows[0], ctx))]))
+
+    def test_decode_chunk_defers_typecasters(self):
+        import json
+        import io
+        from akiban.impl import _DetachedUnpickler
+        from akiban.psycopg2 import Psycopg2ResultContext, _decode_chunk
+
+        class Cursor(object):
+            arraysize = 1
+        metadata = json.dumps([{"name": "created", "oid": 1184}])
+        # no converter in the worker; a psycopg2 typecaster there
+        # would be handed the stub cursor
+        data = _decode_chunk((metadata, None, False, (), None, False, 10),
+                    [json.dumps({"created": "2012-09-05 17:24:12+00"}),
+                    json.dumps({"created": None})])
+        ctx = Psycopg2ResultContext(Cursor(), (metadata, ),
+                    converters={1184: lambda value: value.upper()})
+        self.assertEquals(
+            _DetachedUnpickler(io.BytesIO(data), ctx).load(),
+            [("2012-09-05 17:24:12+00".upper(), ), (None, )])
+
+
+NESTED = "select customer_id, orders from customers where customer_id = 1"
+PLAIN = "select customer_id, name from customers"
+
+class FakeServerTest(unittest.TestCase):
+    """Tests of the connection against tests/fakeserver.py."""
+
+    @classmethod
+    def setup_class(cls):
+        from .fakeserver import FakeAkibanServer
+        cls.server = FakeAkibanServer()
+        cls.server.add_result(NESTED,
+                    [{"name": "customer_id", "oid": 23},
+                    {"name": "orders", "columns": [
+                        {"name": "order_id", "oid": 23},
+                        {"name": "order_date", "oid": 1082}]}],
+                    [{"customer_id": 1, "orders": [
+                        {"order_id": 101, "order_date": "2012-09-05"}]}])
+        cls.server.add_result(PLAIN,
+                    [{"name": "customer_id", "oid": 23},
+                    {"name": "name", "oid": 1043}],
+                    [{"customer_id": 1, "name": u"dr\xf4le"},
+                    {"customer_id": 2, "name": u"Ori Herrnstadt"}])
+        cls.server.start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        from akiban.psycopg2 import Connection
+        self.connection = psycopg2.connect(host="127.0.0.1",
+                                port=self.server.port,
+                                connection_factory=Connection)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def _execute(self, **kw):
+        cursor = self.connection.cursor(**kw)
+        cursor.execute("select customer_id, orders from customers "
+                        "where customer_id = %s", (1, ))
+        return cursor
+
+    def test_result_cache(self):
+        from akiban.psycopg2 import ResultCache
+        cache = self.connection.result_cache = ResultCache()
+        expected = [(1, [(101, datetime.date(2012, 9, 5))])]
+        first = self._execute()
+        statements = len(self.server.statements)
+        for cursor in (first, self._execute(), self._execute()):
+            self.assertEquals(cursor.rowcount, 2)
+            self.assertEquals(
+                [(row[0], row[1].fetchall()) for row in cursor],
+                expected)
+            self.assertEquals(cursor.fetchone(), None)
+        self.assertEquals(len(self.server.statements), statements)
+        self.assertEquals((cache.hits, cache.misses), (2, 1))
+
+        cursor = self._execute()
+        self.assertEquals(cursor.description, first.description)
+        self.assertEquals(cursor.akiban_description,
+                        first.akiban_description)
+
+        cache.invalidate("customers")
+        self._execute()
+        self.assertEquals(self.server.statements[-1], NESTED)
+        self.assertEquals((cache.hits, cache.misses), (3, 2))
+
+    def _statements(self, fn):
+        start = len(self.server.statements)
+        fn()
+        return self.server.statements[start:]
+
+    def test_adaptive_output_format(self):
+        self.connection.adaptive_output_format = True
+        cursor = self.connection.cursor()
+        expected = [(1, u"dr\xf4le"), (2, u"Ori Herrnstadt")]
+
+        cursor.execute(PLAIN)
+        description = cursor.description
+        akiban_description = cursor.akiban_description
+        self.assertEquals(cursor.fetchall(), expected)
+        self.assertFalse(cursor._akiban_flat)
+
+        # one round trip, with the switch to "table" pipelined
+        self.assertEquals(
+            self._statements(lambda: cursor.execute(PLAIN)),
+            ["set OutputFormat='table'", PLAIN])
+        self.assertTrue(cursor._akiban_flat)
+        self.assertEquals(cursor.description, description)
+        self.assertEquals(cursor.akiban_description, akiban_description)
+        self.assertEquals(cursor.fetchone(), expected[0])
+        self.assertEquals(list(cursor), expected[1:])
+
+        # nested results are unaffected
+        self.assertEquals(
+            self._statements(lambda: self._execute().fetchall()),
+            ["set OutputFormat='json_with_meta_data'", NESTED])
+        cursor.execute(PLAIN)
+        columns = cursor.fetch_columns()[()].columns
+        self.assertEquals(list(columns['name']),
+                    [u"dr\xf4le", u"Ori Herrnstadt"])
+
+    def test_adaptive_output_format_cached(self):
+        from akiban.psycopg2 import ResultCache
+        self.connection.adaptive_output_format = True
+        self.connection.result_cache = ResultCache()
+        cursor = self.connection.cursor()
+        results = []
+        for i in range(3):
+            cursor.execute(PLAIN)
+            results.append((cursor._akiban_flat, cursor.rowcount,
+                            cursor.fetchall()))
+        self.assertEquals([result[0:2] for result in results],
+                    [(False, 3), (True, 2), (True, 2)])
+        self.assertEquals(results[0][2], results[1][2])
+        self.assertEquals(results[1][2], results[2][2])
+        self.assertEquals(
+            (self.connection.result_cache.hits,
+                self.connection.result_cache.misses), (1, 2))
+
+    def test_listener(self):
+        reported = []
+        self.connection.add_listener(reported.append)
+        cursor = self._execute()
+        self.assertEquals(reported, [])
+        cursor.fetchone()
+        self.assertEquals(cursor.fetchone(), None)
+        stats, = reported
+        self.assertEquals(stats.statement, NESTED.replace("1", "%s"))
+        self.assertEquals(
+            (stats.rows, stats.nested_rows, stats.output_format_switches,
+                stats.typecasts, stats.cached),
+            (1, 1, 1, {1082: 1}, False))
+        self.assertTrue(stats.statement_time > 0)
+        self.assertTrue(stats.json_bytes > 0)
+
+        # reported when executed again, or closed, before the end
+        cursor.execute(NESTED)
+        cursor.execute(NESTED)
+        cursor.close()
+        self.assertEquals(len(reported), 3)
+        self.assertEquals(reported[-1].output_format_switches, 0)
+        self.assertEquals(reported[-1].rows, 0)
+
+        self.connection.remove_listener(reported.append)
+        self._execute().fetchall()
+        self.assertEquals(len(reported), 3)
+
+    def test_listener_iterate_cached(self):
+        from akiban.psycopg2 import ResultCache
+        reported = []
+        self.connection.add_listener(reported.append)
+        self.connection.result_cache = ResultCache()
+        for i in range(2):
+            for row in self._execute():
+                pass
+        self.assertEquals([stats.cached for stats in reported],
+                    [False, True])
+        self.assertEquals([stats.rows for stats in reported], [1, 1])
+
+    def test_result_cache_keyed_on_params(self):
+        from akiban.psycopg2 import ResultCache
+        cache = self.connection.result_cache = ResultCache()
+        self._execute().fetchall()
+        cursor = self.connection.cursor()
+        self.assertRaises(psycopg2.Error, cursor.execute,
+                    "select customer_id, orders from customers "
+                    "where customer_id = %s", (2, ))
+        self.assertEquals((cache.hits, cache.misses), (0, 2))
+
+    def test_parallel_decode_typecasters(self):
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+        except ImportError:
+            raise SkipTest("concurrent.futures is not available")
+        sql = "select customer_id, created from customers"
+        self.server.add_result(sql,
+                    [{"name": "customer_id", "oid": 23},
+                    {"name": "created", "oid": 1184}],
+                    [{"customer_id": i, "created": "2012-09-05 17:24:12+00"}
+                        for i in range(5)])
+        cursor = self.connection.cursor()
+        cursor.execute(sql)
+        expected = cursor.fetchall()
+        self.assertTrue(isinstance(expected[0][1], datetime.datetime))
+
+        with ProcessPoolExecutor(2) as executor:
+            cursor.parallel_decode(executor, chunksize=2)
+            cursor.execute(sql)
+            self.assertEquals(cursor.fetchall(), expected)
+
+    def test_row_factory(self):
+        self.connection.adaptive_output_format = True
+        for row_factory in ('namedtuple', 'record'):
+            cursor = self.connection.cursor(row_factory=row_factory)
+            cursor.execute(NESTED)
+            row = cursor.fetchone()
+            self.assertEquals(row.customer_id, 1)
+            order = row.orders.fetchone()
+            self.assertEquals((order.order_id, order.order_date),
+                        (101, datetime.date(2012, 9, 5)))
+            self.assertEquals(tuple(order), order[:])
+
+            # flat rows are converted as well, from the second
+            # execution on
+            for i in range(2):
+                cursor.execute(PLAIN)
+                self.assertEquals(cursor._akiban_flat,
+                            i == 1 or row_factory == 'record')
+                self.assertEquals(
+                    [(row.customer_id, row.name) for row in cursor],
+                    [(1, u"dr\xf4le"), (2, u"Ori Herrnstadt")])
+            self.assertEquals(cursor.fetchone(), None)
+
+        cursor = self.connection.cursor(row_factory='dict')
+        cursor.execute(NESTED)
+        row, = cursor.fetchall()
+        self.assertEquals(row['orders'].fetchall(),
+                    [{"order_id": 101,
+                        "order_date": datetime.date(2012, 9, 5)}])
+        cursor.execute(PLAIN)
+        self.assertEquals(cursor.fetchone(),
+                    {"customer_id": 1, "name": u"dr\xf4le"})
+
+        self.assertRaises(ValueError, self.connection.cursor,
+                    row_factory='list')
+
+    def test_intern_strings(self):
+        self.connection.intern_strings = True
+        cursor = self.connection.cursor()
+        cursor.execute(PLAIN)
+        ctx = cursor._akiban_ctx
+        self.assertTrue(ctx.interns(ctx.fields[1]))
+        self.assertFalse(ctx.interns(ctx.fields[0]))
+        self.assertEquals(cursor.fetchall(),
+                    [(1, u"dr\xf4le"), (2, u"Ori Herrnstadt")])
+
+    def test_execute_batch(self):
+        batch = [("select customer_id, orders from customers "
+                        "where customer_id = %s", (1, )), PLAIN + ";"]
+        nested, plain = self._execute(), self.connection.cursor()
+        plain.execute(PLAIN)
+        queries = self.server.queries
+        results = self.connection.execute_batch(batch)
+        self.assertEquals(self.server.queries - queries, 1)
+        self.assertEquals(len(results), 2)
+
+        for result, cursor in zip(results, (nested, plain)):
+            self.assertEquals(result.description, cursor.description)
+            self.assertEquals(result.akiban_description,
+                            cursor.akiban_description)
+        self.assertEquals(
+            [(row[0], row[1].fetchall()) for row in results[0]],
+            [(row[0], row[1].fetchall()) for row in nested])
+        self.assertEquals(results[1].fetchall(), plain.fetchall())
+
+        self.assertEquals(self.connection.execute_batch([]), [])
+        self.assertRaises(psycopg2.ProgrammingError,
+                    self.connection.execute_batch,
+                    [PLAIN, "delete from customers"])
+
+    def test_execute_batch_stats(self):
+        reported = []
+        self.connection.add_listener(reported.append)
+        try:
+            results = self.connection.execute_batch([PLAIN, PLAIN],
+                                                    lazy=True)
+        finally:
+            self.connection.remove_listener(reported.append)
+        self.assertEquals([stats.statement for stats in reported],
+                    ['select (%s) as "0", (%s) as "1"' % (PLAIN, PLAIN)])
+        self.assertEquals(reported[0].rows, 1)
+        self.assertEquals([len(result.fetchall()) for result in results],
+                    [2, 2])
+
+    def test_execute_batch_latency(self):
+        from akiban.psycopg2 import Connection
+        from .fakeserver import FakeAkibanServer
+        server = FakeAkibanServer(latency=.05)
+        server.results.update(self.server.results)
+        server.start()
+        try:
+            connection = psycopg2.connect(host="127.0.0.1",
+                                port=server.port,
+                                connection_factory=Connection)
+            connection.pipeline_output_format = True
+            connection.execute_batch([PLAIN])
+            queries = server.queries
+
+            now = time.time()
+            for i in range(5):
+                cursor = connection.cursor()
+                cursor.execute(PLAIN)
+                cursor.fetchall()
+            sequential = time.time() - now
+            self.assertEquals(server.queries - queries, 5)
+
+            now = time.time()
+            results = connection.execute_batch([PLAIN] * 5)
+            batched = time.time() - now
+            self.assertEquals(server.queries - queries, 6)
+            self.assertEquals([len(result.fetchall()) for result in results],
+                        [2] * 5)
+            self.assertTrue(batched < sequential / 2)
+            connection.close()
+        finally:
+            server.stop()
+
+
 class Psycopg2Test(unittest.TestCase):
 
     @classmethod
@@ -108,6 +608,66 @@ class Psycopg2Test(unittest.TestCase):
     def test_fetchall_nested(self):
         self._test_nested_fetch(lambda cursor: cursor.fetchall())
 
+    def test_fetchall_nested_lazy(self):
+        cursor = self.connection.cursor(lazy=True)
+        cursor.execute(
+                "select "
+                "(select order_id, order_info, order_date from orders "
+                    "where customer_id=customers.customer_id) from customers "
+                " where customer_id in (5, 6)"
+                "order by customer_id")
+        rows = cursor.fetchall()
+        self.assertEquals(rows[1][0].fetchall(),
+         [
+            (116, 'some order info',
+                    datetime.datetime(2012, 9, 5, 17, 24, 12)),
+            (117, 'some order info',
+                    datetime.datetime(2012, 9, 5, 17, 24, 12)),
+            (118, 'some order info',
+                    datetime.datetime(2012, 9, 5, 17, 24, 12)),
+          ]
+        )
+
+    def test_named_cursor_iter(self):
+        cursor = self.connection.cursor(name="akiban_named")
+        cursor.itersize = 2
+        cursor.execute(
+                "select customer_id, "
+                "(select order_id from orders "
+                    "where customer_id=customers.customer_id) as orders "
+                "from customers where customer_id in (5, 6, 7)"
+                "order by customer_id")
+        self.assertEquals(
+            cursor.description,
+            [
+                ('customer_id', psycopg2.extensions.INTEGER, None, None,
+                        None, None, None),
+                ('orders', akiban.NESTED_CURSOR, None, None, None, None, None),
+            ]
+        )
+        self.assertEquals(
+            [(row[0], row[1].fetchall()) for row in cursor],
+            [
+                (5, [(113, ), (114, ), (115, )]),
+                (6, [(116, ), (117, ), (118, )]),
+                (7, [(119, ), (120, ), (121, )]),
+            ]
+        )
+        cursor.close()
+
+    def test_named_cursor_fetchmany(self):
+        cursor = self.connection.cursor(name="akiban_named")
+        cursor.execute(
+                "select customer_id, name from customers where "
+                "customer_id in (5, 6, 7) order by customer_id")
+        self.assertEquals(cursor.fetchmany(2),
+            [(5, 'Peter Beaman'), (6, u'Thomas Jones-Low')]
+        )
+        self.assertEquals(cursor.fetchmany(2),
+            [(7, u'Mike McMahon')]
+            )
+        cursor.close()
+
     def test_none_cursor(self):
         cursor = self.connection.cursor()
         cursor.execute("insert into items VALUES (%s, %s, %s, %s)",
@@ -224,6 +784,22 @@ class Psycopg2Test(unittest.TestCase):
         cursor.execute(u"select 'drôle m’a réveillé'")
         self.assertEquals(cursor.fetchone()[0], u'drôle m’a réveillé')
 
+    def test_raw_json(self):
+        cursor = self.connection.cursor()
+        self.assertTrue(cursor._akiban_raw)
+        cursor.execute(u"select 'drôle m’a réveillé'")
+        self.assertEquals(cursor.fetchone()[0], u'drôle m’a réveillé')
+
+    def test_raw_json_disabled(self):
+        self.connection.raw_json = False
+        try:
+            cursor = self.connection.cursor()
+        finally:
+            del self.connection.raw_json
+        self.assertFalse(cursor._akiban_raw)
+        cursor.execute(u"select 'drôle m’a réveillé'")
+        self.assertEquals(cursor.fetchone()[0], u'drôle m’a réveillé')
+
     def test_fetchone_plain(self):
         cursor = self.connection.cursor()
         cursor.execute(
@@ -267,6 +843,48 @@ class Psycopg2Test(unittest.TestCase):
             "select customer_id, (select order_id from orders) from customers"
         )
 
+    def test_mixed_cursors(self):
+        nested = self.connection.cursor()
+        plain = self.connection.cursor(nested=False)
+
+        nested.execute("select customer_id, (select order_id from orders "
+                    "where customer_id=customers.customer_id) "
+                    "from customers where customer_id=5")
+        plain.execute("select customer_id from customers "
+                    "where customer_id=5")
+        self.assertEquals(plain.fetchall(), [(5, )])
+
+        switches = self.connection.output_format_switches
+        nested.execute("select customer_id, (select order_id from orders "
+                    "where customer_id=customers.customer_id) "
+                    "from customers where customer_id=5")
+        nested.execute("select customer_id, (select order_id from orders "
+                    "where customer_id=customers.customer_id) "
+                    "from customers where customer_id=5")
+        self.assertEquals(nested.fetchone()[1].fetchall(),
+                    [(113, ), (114, ), (115, )])
+
+        # only one switch back to nested
+        self.assertEquals(self.connection.output_format_switches,
+                    switches + 1)
+
+    def test_pipelined_output_format(self):
+        self.connection.pipeline_output_format = True
+        try:
+            plain = self.connection.cursor(nested=False)
+            plain.execute("select customer_id from customers "
+                        "where customer_id=5")
+            nested = self.connection.cursor()
+            nested.execute(
+                    "select customer_id, name from customers where "
+                    "customer_id=%s", (5, ))
+            self.assertEquals(nested.fetchall(), [(5, 'Peter Beaman')])
+            plain.execute("select customer_id from customers "
+                        "where customer_id=5")
+            self.assertEquals(plain.fetchall(), [(5, )])
+        finally:
+            self.connection.pipeline_output_format = False
+
     def test_non_nested_returns_rows(self):
         cursor = self.connection.cursor(nested=False)
         cursor.execute("select customer_id, name from customers "